@@ -0,0 +1,114 @@
+"""
+Micro-benchmarks du service LCA-Lite : imputation CO₂, détection des
+ingrédients et calcul ACV complet (base SQLite et MinIO en mémoire)
+"""
+
+import os
+
+import pytest
+
+from ecolabel_common.testing import load_service
+
+FACTORS = [
+    ("tomato", "ingredient", 1.5, 50.0, 2.0),
+    ("onion", "ingredient", 0.3, 20.0, 0.5),
+    ("huile_d'olive_bio", "ingredient", 2.5, 90.0, 7.0),
+    ("sel_de_mer", "ingredient", 0.2, 5.0, 0.5),
+    ("cheese", "ingredient", 8.0, 500.0, 20.0),
+    ("beef", "ingredient", 25.0, 1500.0, 50.0),
+    ("glass", "packaging", 0.9, 5.0, 15.0),
+    ("plastic", "packaging", 6.0, 30.0, 80.0),
+    ("transport_km", "transport", 0.0001, 0.0, 0.005),
+]
+
+
+@pytest.fixture(scope="module")
+def lca(tmp_path_factory, monkeypatch_module, fake_minio):
+    main = load_service("lca-lite")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import ml_imputer
+    from app.models import Base, EmissionFactor
+
+    if not os.path.exists(ml_imputer.MODEL_PATH):
+        ml_imputer.train_co2_model(verbose=False)
+    monkeypatch_module.setattr(main, "minio_client", fake_minio)
+    monkeypatch_module.setattr(main, "ml_model_loaded", True)
+    monkeypatch_module.setattr(main, "ml_model_bundle", ml_imputer.load_co2_model())
+
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('lca') / 'lca.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([
+            EmissionFactor(name=name, category=category, co2_factor=co2, water_factor=water, energy_factor=energy)
+            for name, category, co2, water, energy in FACTORS
+        ])
+        db.commit()
+    yield main, ml_imputer, Session
+    engine.dispose()
+
+
+def request(main, ingredients):
+    return main.LCACalculationRequest(
+        product_name="Sauce Tomate Bio",
+        ingredients=[main.IngredientInput(name=name, quantity_kg=qty) for name, qty in ingredients],
+        packaging=main.PackagingInput(material="glass", weight_kg=0.3),
+        transport=main.TransportInput(distance_km=450, mode="truck"),
+    )
+
+
+def test_estimate_co2(benchmark, lca):
+    """estimate_co2 : une imputation (chargement du modèle compris)"""
+    _, ml_imputer, _ = lca
+    result = benchmark(
+        ml_imputer.estimate_co2, num_ingredients=4, total_weight_kg=0.8, has_vegetables=True,
+        packaging_type="glass", packaging_weight_kg=0.3, transport_km=450,
+    )
+    assert result["co2_kg"] >= 0
+
+
+def test_estimate_co2_loaded_bundle(benchmark, lca):
+    """estimate_co2 avec le bundle déjà chargé (chemin du service)"""
+    main, ml_imputer, _ = lca
+    result = benchmark(
+        ml_imputer.estimate_co2, num_ingredients=4, total_weight_kg=0.8, has_vegetables=True,
+        packaging_type="glass", packaging_weight_kg=0.3, transport_km=450, model_bundle=main.ml_model_bundle,
+    )
+    assert result["co2_kg"] >= 0
+
+
+def test_detect_ingredient_types(benchmark, lca):
+    main, _, Session = lca
+    with Session() as db:
+        factors = {f.name: f for f in db.query(main.EmissionFactor).all()}
+    ingredients = request(main, [("tomato", 0.4), ("viande_hachee", 0.2), ("lait_entier", 0.1),
+                                 ("carotte", 0.1), ("sel_de_mer", 0.01)]).ingredients
+    result = benchmark(main.detect_ingredient_types, ingredients, factors)
+    assert result == {"has_meat": True, "has_dairy": True, "has_vegetables": True}
+
+
+def test_calculate_lca_known_ingredients(benchmark, lca):
+    """calculate_lca : tous les facteurs connus (requête, DataFrame, rapport, insertion)"""
+    main, _, Session = lca
+    payload = request(main, [("tomato", 0.4), ("onion", 0.05), ("huile_d'olive_bio", 0.05), ("sel_de_mer", 0.01)])
+
+    def run():
+        with Session() as db:
+            return main.calculate_lca(payload, db)
+
+    result = benchmark(run)
+    assert not result.ml_imputation_used
+
+
+def test_calculate_lca_ml_imputation(benchmark, lca):
+    """calculate_lca : un ingrédient inconnu déclenche l'imputation ML"""
+    main, _, Session = lca
+    payload = request(main, [("tomato", 0.4), ("poivron_grille", 0.1), ("sel_de_mer", 0.01)])
+
+    def run():
+        with Session() as db:
+            return main.calculate_lca(payload, db)
+
+    result = benchmark(run)
+    assert result.ml_imputation_used
@@ -0,0 +1,48 @@
+"""
+Micro-benchmarks du service ParserProduit : extraction du texte HTML et texte brut
+"""
+
+import os
+
+import pytest
+
+from ecolabel_common.testing import ROOT, load_service
+
+INGREDIENTS = ["tomates bio", "huile d'olive", "sel de mer", "basilic frais", "ail", "oignon", "sucre de canne"]
+
+
+def product_page(rows: int = 40) -> bytes:
+    """Fiche produit HTML de taille réaliste (navigation, tableau nutritionnel, pied de page)"""
+    nav = "".join(f'<li><a href="/rayon/{i}">Rayon {i}</a></li>' for i in range(30))
+    table = "".join(f"<tr><td>Nutriment {i}</td><td>{i * 1.5:.1f} g</td></tr>" for i in range(rows))
+    ingredients = ", ".join(INGREDIENTS)
+    return (
+        "<!DOCTYPE html><html><head><title>Sauce Tomate Bio</title>"
+        "<script>window.dataLayer = [];</script><style>body { margin: 0 }</style></head><body>"
+        f"<nav><ul>{nav}</ul></nav>"
+        '<main><h1>Sauce Tomate Bio</h1><p class="gtin">Code-barres : 3017620422003</p>'
+        f"<section><h2>Ingrédients</h2><p>{ingredients}</p></section>"
+        f"<section><h2>Valeurs nutritionnelles</h2><table>{table}</table></section>"
+        "<section><h2>Emballage</h2><p>Bocal en verre 350 g, transport 450 km</p></section></main>"
+        "<footer><p>Mentions légales</p></footer></body></html>"
+    ).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return load_service("parser-produit")
+
+
+def test_extract_text_html(benchmark, parser):
+    content = product_page()
+    text, source_type = benchmark(parser.extract_text, content, "text/html", "fiche.html")
+    assert source_type == "html"
+    assert "huile d'olive" in text
+
+
+def test_extract_text_plain(benchmark, parser):
+    with open(os.path.join(ROOT, "test_produit.txt"), "rb") as f:
+        content = f.read()
+    text, source_type = benchmark(parser.extract_text, content, "text/plain", "fiche.txt")
+    assert source_type == "pdf"
+    assert text
@@ -0,0 +1,95 @@
+"""
+Micro-benchmarks du service Scoring : prédiction ML et scoring par règles
+"""
+
+import os
+
+import numpy as np
+
+import pytest
+
+from ecolabel_common.testing import load_service
+
+
+@pytest.fixture(scope="module")
+def scoring():
+    main = load_service("scoring")
+    from app import ml_trainer
+    if not os.path.exists(ml_trainer.MODEL_PATH):
+        ml_trainer.train_models(verbose=False)
+    return main, ml_trainer
+
+
+def test_ml_predict(benchmark, scoring):
+    """ml_trainer.predict : un produit (chargement du modèle compris)"""
+    _, ml_trainer = scoring
+    result = benchmark(
+        ml_trainer.predict, co2_kg=2.5, water_l=120.0, energy_mj=8.0, packaging_type="glass",
+        packaging_weight_kg=0.4, transport_km=300, has_bio_label=1, category="processed",
+    )
+    assert result["grade"] in "ABCDE"
+
+
+def test_ml_predict_loaded_bundle(benchmark, scoring):
+    """ml_trainer.predict avec le bundle déjà chargé (chemin du service)"""
+    _, ml_trainer = scoring
+    bundle = ml_trainer.load_model()
+    result = benchmark(
+        ml_trainer.predict, co2_kg=2.5, water_l=120.0, energy_mj=8.0, packaging_type="glass",
+        packaging_weight_kg=0.4, transport_km=300, has_bio_label=1, category="processed",
+        model_bundle=bundle,
+    )
+    assert result["grade"] in "ABCDE"
+
+
+def test_compiled_predict_one(benchmark, scoring):
+    """Évaluateur compilé seul : un produit (objectif < 50 µs)"""
+    _, ml_trainer = scoring
+    compiled = ml_trainer.load_model()["compiled"]
+    features = np.array([2.5, 120.0, 8.0, 0.4, 300, 1, 0, 0, 1, 5], dtype=np.float64)
+    probabilities = benchmark(compiled.predict_one, features)
+    assert abs(probabilities.sum() - 1) < 1e-6
+
+
+def test_rule_based_predict(benchmark, scoring):
+    main, _ = scoring
+    request = main.ScoreRequest(
+        product_name="Sauce Tomate Bio", total_co2=2.5, total_water=120.0, total_energy=8.0, has_bio_label=1,
+    )
+    result = benchmark(main.rule_based_predict, request)
+    assert result["letter"] in "ABCDE"
+
+
+@pytest.fixture(scope="module")
+def requests_1000(scoring):
+    main, _ = scoring
+    rng = np.random.default_rng(0)
+    return [
+        main.ScoreRequest(product_name=f"P{i}", total_co2=rng.uniform(0, 15), total_water=rng.uniform(0, 700),
+                          total_energy=rng.uniform(0, 70), has_bio_label=int(rng.integers(0, 2)))
+        for i in range(1000)
+    ]
+
+
+def test_rule_based_predict_1000(benchmark, scoring, requests_1000):
+    """rule_based_predict appelé 1 000 fois"""
+    main, _ = scoring
+    results = benchmark(lambda: [main.rule_based_predict(r) for r in requests_1000])
+    assert len(results) == 1000
+
+
+def test_rule_based_predict_batch_1000(benchmark, scoring, requests_1000):
+    """rule_based_predict_batch sur 1 000 produits"""
+    main, _ = scoring
+    results = benchmark(main.rule_based_predict_batch, requests_1000)
+    assert len(results) == 1000
+
+
+def test_rule_based_scores_1000(benchmark, scoring):
+    """Cœur vectorisé seul (tableaux numpy de 1 000 produits)"""
+    main, _ = scoring
+    rng = np.random.default_rng(0)
+    co2, water, energy = rng.uniform(0, 15, 1000), rng.uniform(0, 700, 1000), rng.uniform(0, 70, 1000)
+    labels = rng.integers(0, 2, (3, 1000))
+    scores, letters = benchmark(main.rule_based_scores, co2, water, energy, *labels)
+    assert len(letters) == 1000
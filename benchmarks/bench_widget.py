@@ -0,0 +1,70 @@
+"""
+Micro-benchmarks du service Widget-API : lecture des scores sur une base SQLite (aiosqlite)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ecolabel_common.testing import load_service
+
+PRODUCTS = 1000
+SCORES_PER_PRODUCT = 3
+LOOKUP_SIZE = 50
+
+
+@pytest.fixture(scope="module")
+def widget(tmp_path_factory):
+    main = load_service("widget-api")
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.models import Base, ProductScore
+
+    db_path = tmp_path_factory.mktemp("widget") / "widget.db"
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=sync_engine)
+    start = datetime(2025, 12, 1)
+    with sessionmaker(bind=sync_engine)() as db:
+        db.add_all([
+            ProductScore(
+                product_name=f"Produit {i}", score_numerical=50.0 + version, score_letter="ABCDE"[i % 5],
+                confidence_level=0.9, created_at=start + timedelta(minutes=i * SCORES_PER_PRODUCT + version),
+            )
+            for i in range(PRODUCTS) for version in range(SCORES_PER_PRODUCT)
+        ])
+        db.commit()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[main.get_db] = override_get_db
+    try:
+        # One event loop for the whole module, as in production
+        with TestClient(main.app) as client:
+            yield client
+    finally:
+        main.app.dependency_overrides.pop(main.get_db, None)
+        sync_engine.dispose()
+
+
+def test_product_score(benchmark, widget):
+    response = benchmark(widget.get, "/public/product/Produit 42")
+    assert response.status_code == 200
+
+
+def test_bulk_lookup(benchmark, widget):
+    """POST /public/products/lookup : 50 noms, dont 5 inconnus"""
+    names = [f"Produit {i * 17}" for i in range(LOOKUP_SIZE - 5)] + [f"Inconnu {i}" for i in range(5)]
+    response = benchmark(widget.post, "/public/products/lookup", json={"names": names})
+    assert response.json()["count"] == LOOKUP_SIZE - 5
+
+
+def test_products_page(benchmark, widget):
+    response = benchmark(widget.get, "/public/products", params={"limit": 50})
+    assert response.json()["count"] == 50
@@ -0,0 +1,22 @@
+"""
+Fixtures partagées des micro-benchmarks EcoLabel-MS
+
+Chaque service expose un paquet nommé ``app`` : load_service() (ecolabel_common.testing)
+retire le précédent de sys.modules avant d'importer celui demandé, d'où un fichier de
+benchmarks par service et des fixtures de portée module.
+"""
+
+import pytest
+
+from ecolabel_common.testing import MemoryObjectStore
+
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as mp:
+        yield mp
+
+
+@pytest.fixture(scope="module")
+def fake_minio():
+    return MemoryObjectStore()
@@ -0,0 +1,32 @@
+"""
+Shared helpers of the EcoLabel-MS services: database engines, sessions, query timing
+and service instrumentation
+"""
+
+from ecolabel_common.db import (
+    build_async_engine,
+    build_engine,
+    connect_args,
+    database_url,
+    pool_options,
+    pool_status,
+    session_dependency,
+    session_factory,
+)
+from ecolabel_common.instrumentation import instrument
+from ecolabel_common.timing import QueryMetrics, instrument_engine, query_metrics
+
+__all__ = [
+    "build_async_engine",
+    "build_engine",
+    "connect_args",
+    "database_url",
+    "pool_options",
+    "pool_status",
+    "session_dependency",
+    "session_factory",
+    "instrument",
+    "QueryMetrics",
+    "instrument_engine",
+    "query_metrics",
+]
@@ -0,0 +1,144 @@
+"""
+Database engines and sessions shared by the EcoLabel services
+
+Settings are read from the environment when an engine is built. A service
+passes its own defaults; deployments override them the same way everywhere:
+
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+    DB_CONNECT_TIMEOUT, DB_STATEMENT_TIMEOUT, DB_APPLICATION_NAME
+    DB_COMMAND_TIMEOUT, DB_STATEMENT_CACHE_SIZE (asyncpg only)
+"""
+
+import os
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from ecolabel_common.timing import QueryMetrics, instrument_engine
+
+# Connection pool per engine and per worker process
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+POOL_TIMEOUT = 10.0     # seconds waiting for a free connection before failing
+POOL_RECYCLE = 1800     # seconds, below the usual proxy/firewall idle cut-offs
+CONNECT_TIMEOUT = 5     # seconds to open a connection
+STATEMENT_TIMEOUT = 30.0  # server-side limit per statement in seconds, 0 disables it
+
+
+def env(name: str, default, cast=str):
+    value = os.getenv(name)
+    return default if value in (None, "") else cast(value)
+
+
+def database_url(driver: str = "postgresql", host: Optional[str] = None, port: Optional[str] = None) -> str:
+    """URL from the DB_* variables; ``host``/``port`` select another server (read replica)"""
+    return (
+        f"{driver}://{env('DB_USER', 'eco')}:{env('DB_PASSWORD', 'eco_pass')}"
+        f"@{host or env('DB_HOST', 'postgres')}:{port or env('DB_PORT', '5432')}/{env('DB_NAME', 'eco_db')}"
+    )
+
+
+def pool_options(pool_size: int = POOL_SIZE, max_overflow: int = MAX_OVERFLOW,
+                 pool_timeout: float = POOL_TIMEOUT, pool_recycle: int = POOL_RECYCLE) -> dict:
+    return {
+        "pool_size": env("DB_POOL_SIZE", pool_size, int),
+        "max_overflow": env("DB_MAX_OVERFLOW", max_overflow, int),
+        "pool_timeout": env("DB_POOL_TIMEOUT", pool_timeout, float),
+        "pool_recycle": env("DB_POOL_RECYCLE", pool_recycle, int),
+        # Replaces connections closed server-side (restart, idle timeout) before use
+        "pool_pre_ping": True,
+    }
+
+
+def statement_timeout_ms(default: float = STATEMENT_TIMEOUT) -> int:
+    return int(env("DB_STATEMENT_TIMEOUT", default, float) * 1000)
+
+
+def connect_args(application_name: str, statement_timeout: float = STATEMENT_TIMEOUT) -> dict:
+    """libpq (psycopg2) parameters of every pooled connection"""
+    return {
+        # Shown in pg_stat_activity and the server logs
+        "application_name": env("DB_APPLICATION_NAME", application_name),
+        "connect_timeout": env("DB_CONNECT_TIMEOUT", CONNECT_TIMEOUT, int),
+        "options": f"-c statement_timeout={statement_timeout_ms(statement_timeout)} -c client_encoding=utf8",
+    }
+
+
+def build_engine(application_name: str, url: Optional[str] = None, metrics: Optional[QueryMetrics] = None,
+                 statement_timeout: float = STATEMENT_TIMEOUT, **pool) -> Engine:
+    """
+    Pooled engine for ``application_name``, timed by ``metrics`` (default
+    ``query_metrics``). ``pool`` overrides the pool_options defaults; SQLite
+    URLs (tests) get a plain engine.
+    """
+    url = url or database_url()
+    if url.startswith("sqlite"):
+        engine = create_engine(url)
+    else:
+        engine = create_engine(
+            url,
+            **pool_options(**pool),
+            connect_args=connect_args(application_name, statement_timeout),
+        )
+    return instrument_engine(engine, metrics)
+
+
+def build_async_engine(application_name: str, url: Optional[str] = None, metrics: Optional[QueryMetrics] = None,
+                       statement_timeout: float = STATEMENT_TIMEOUT, command_timeout: float = 5.0,
+                       statement_cache_size: int = 500, **pool):
+    """
+    asyncpg counterpart of build_engine. ``command_timeout`` bounds each call
+    client-side; the prepared statement cache must be 0 behind pgbouncer in
+    transaction mode (DB_STATEMENT_CACHE_SIZE=0).
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    cache_size = env("DB_STATEMENT_CACHE_SIZE", statement_cache_size, int)
+    url = url or database_url("postgresql+asyncpg")
+    if url.startswith("sqlite"):
+        return instrument_engine(create_async_engine(url), metrics)
+    engine = create_async_engine(
+        f"{url}?prepared_statement_cache_size={cache_size}",
+        **pool_options(**pool),
+        connect_args={
+            "statement_cache_size": cache_size,
+            "command_timeout": env("DB_COMMAND_TIMEOUT", command_timeout, float),
+            "timeout": env("DB_CONNECT_TIMEOUT", CONNECT_TIMEOUT, int),
+            "server_settings": {
+                "application_name": env("DB_APPLICATION_NAME", application_name),
+                "statement_timeout": str(statement_timeout_ms(statement_timeout)),
+            },
+        },
+    )
+    return instrument_engine(engine, metrics)
+
+
+def pool_status(engine) -> dict:
+    """Configured size and current use of an engine's pool (zeros for unpooled engines)"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    if not hasattr(pool, "checkedout"):
+        return {"size": 0, "max_overflow": 0, "checked_out": 0, "overflow": 0}
+    return {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+def session_factory(engine: Engine) -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def session_dependency(factory: Callable) -> Callable:
+    """FastAPI dependency yielding a session from ``factory``, closed after the request"""
+    def get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    return get_db
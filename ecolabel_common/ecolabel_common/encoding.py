@@ -0,0 +1,17 @@
+"""
+Categorical feature encoding shared by the scoring model and the lca-lite CO₂ imputer
+"""
+
+# Key of the bucket used for categories unseen at training time
+UNKNOWN_CATEGORY = '__unknown__'
+
+
+def encoding_table(encoder, unknown_code: int = 0) -> dict:
+    """Plain dict lookup of a fitted LabelEncoder, with an explicit unknown bucket
+
+    Unknown values keep the historical fallback code (0, the first category)
+    the models were always fed, so predictions are unchanged.
+    """
+    table = {str(value): code for code, value in enumerate(encoder.classes_)}
+    table[UNKNOWN_CATEGORY] = unknown_code
+    return table
@@ -0,0 +1,261 @@
+"""
+Optional event bus over Redis Streams (EVENTS_ENABLED=true)
+
+Each event type is a stream: product.parsed -> ingredients.extracted ->
+lca.computed -> product.scored. A service reads a stream through its own
+consumer group, so replicas of a service share its messages while every
+service still sees every event. A message is acknowledged once its handler
+returns; failed ones stay pending, are reclaimed after EVENT_CLAIM_IDLE_MS and
+moved to "<stream>.dead" after EVENT_MAX_DELIVERIES attempts.
+
+Delivery is at least once, so handlers subscribed with a session factory run
+at most once per event and consumer group: the event is recorded in
+processed_events in the same transaction as the handler's writes, and a
+redelivery republishes the stored result instead of running the handler
+again. Every event carries an event_id, kept by the results published from
+it, so downstream groups recognize a republished result as well.
+
+Disabled by default: nothing is published and services are only called over HTTP.
+Used by parser-produit, nlp-ingredients, lca-lite and scoring; requires the
+``events`` extra (redis) once enabled.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Optional
+
+from sqlalchemy import JSON, Column, DateTime, MetaData, String, Table, delete, select, update
+from sqlalchemy.orm import sessionmaker
+
+from ecolabel_common.metrics import set_queue_depth
+from ecolabel_common.tracing import inject_context, span
+
+EVENTS_ENABLED = os.getenv("EVENTS_ENABLED", "false").lower() in ("1", "true", "yes")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+# Unique per replica; the hostname is the container id under docker-compose
+EVENT_CONSUMER = os.getenv("EVENT_CONSUMER", socket.gethostname())
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "10"))
+EVENT_BLOCK_MS = int(os.getenv("EVENT_BLOCK_MS", "5000"))
+EVENT_CLAIM_IDLE_MS = int(os.getenv("EVENT_CLAIM_IDLE_MS", "60000"))
+EVENT_MAX_DELIVERIES = int(os.getenv("EVENT_MAX_DELIVERIES", "5"))
+# Seconds between two queue_depth{queue="<stream>/<group>"} refreshes per subscription
+EVENT_DEPTH_INTERVAL = float(os.getenv("EVENT_DEPTH_INTERVAL", "5"))
+# processed_events rows older than this are deleted when a bus starts (well past stream trimming)
+EVENT_DEDUPE_RETENTION_DAYS = float(os.getenv("EVENT_DEDUPE_RETENTION_DAYS", "7"))
+
+DEAD_LETTER_SUFFIX = ".dead"
+
+metadata = MetaData()
+
+# One row per event handled by a consumer group, with the result it published
+processed_events = Table(
+    "processed_events",
+    metadata,
+    Column("consumer_group", String(100), primary_key=True),
+    Column("event_id", String(200), primary_key=True),
+    Column("result", JSON, nullable=True),
+    Column("processed_at", DateTime, nullable=False, index=True),
+)
+
+
+def setup_processed_events(engine):
+    """Create processed_events if missing and delete rows past the retention"""
+    metadata.create_all(bind=engine, tables=[processed_events], checkfirst=True)
+    cutoff = datetime.utcnow() - timedelta(days=EVENT_DEDUPE_RETENTION_DAYS)
+    with engine.begin() as conn:
+        conn.execute(delete(processed_events).where(processed_events.c.processed_at < cutoff))
+
+
+def insert_ignore(conn, values: dict) -> bool:
+    """INSERT ... ON CONFLICT DO NOTHING into processed_events, True if the row is new"""
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return conn.execute(insert(processed_events).values(**values).on_conflict_do_nothing()).rowcount == 1
+
+
+def run_once(sessions: sessionmaker, group: str, handler: Callable, payload: dict) -> Optional[dict]:
+    """
+    ``handler(payload, db)`` at most once per (group, payload["event_id"]).
+
+    The session is joined to a transaction that first inserts the event into
+    processed_events, so the handler's commit() only releases a savepoint and
+    its writes, the row and the result are committed together. A concurrent
+    delivery of the same event waits on that row (PostgreSQL) and gets the
+    stored result; if the handler raises, everything is rolled back and the
+    message is retried.
+    """
+    event_id = payload["event_id"]
+    with sessions.kw["bind"].connect() as conn, conn.begin():
+        if not insert_ignore(conn, {"consumer_group": group, "event_id": event_id,
+                                    "processed_at": datetime.utcnow()}):
+            print(f"[{payload.get('correlation_id')}] {group}: event {event_id} already processed")
+            return conn.execute(
+                select(processed_events.c.result).where(
+                    processed_events.c.consumer_group == group, processed_events.c.event_id == event_id
+                )
+            ).scalar()
+        with sessions(bind=conn, join_transaction_mode="create_savepoint") as db:
+            result = handler(payload, db)
+        if result is not None:
+            # As published (dates and decimals as strings)
+            result = json.loads(json.dumps(result, default=str))
+            conn.execute(
+                update(processed_events)
+                .where(processed_events.c.consumer_group == group, processed_events.c.event_id == event_id)
+                .values(result=result)
+            )
+    return result
+
+
+class EventBus:
+    """Publishes events and runs one consumer task per subscription"""
+
+    def __init__(self, url: str = REDIS_URL, consumer: str = EVENT_CONSUMER, client=None,
+                 block_ms: int = EVENT_BLOCK_MS, claim_idle_ms: int = EVENT_CLAIM_IDLE_MS,
+                 max_deliveries: int = EVENT_MAX_DELIVERIES):
+        if client is None:
+            import redis.asyncio as redis  # only required when events are enabled
+            # Blocking reads must return before the socket times out
+            client = redis.from_url(url, decode_responses=True, socket_timeout=block_ms / 1000 + 5)
+        self.client = client
+        self.consumer = consumer
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.subscriptions = []
+        # Databases holding the processed_events of the subscriptions
+        self.engines = []
+        self.tasks = []
+        self.depth_checked_at = {}
+
+    def subscribe(self, stream: str, group: str, handler: Callable[..., Optional[dict]],
+                  publish_to: Optional[str] = None, sessions: Optional[sessionmaker] = None):
+        """
+        Consume ``stream`` as ``group``. ``handler(payload)`` runs in a worker
+        thread (handlers use sync DB sessions); a returned dict is published to
+        ``publish_to``, None means there is nothing to pass on.
+
+        With a session factory, ``handler(payload, db)`` runs at most once per
+        event (``run_once``) with a session from ``sessions``.
+        """
+        if sessions is not None:
+            handler = partial(run_once, sessions, group, handler)
+            if sessions.kw["bind"] not in self.engines:
+                self.engines.append(sessions.kw["bind"])
+        self.subscriptions.append((stream, group, handler, publish_to))
+
+    async def start(self):
+        for engine in self.engines:
+            try:
+                await asyncio.to_thread(setup_processed_events, engine)
+            except Exception as e:
+                # Handlers fail, and their messages stay pending, until the table exists
+                print(f"✗ processed_events not set up: {e}")
+        # No connection here: consumers retry until the broker is reachable
+        for subscription in self.subscriptions:
+            self.tasks.append(asyncio.create_task(self.consume(*subscription)))
+        print(f"✓ Events enabled as {self.consumer}: {[s[0] for s in self.subscriptions]}")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.client.aclose()
+
+    async def publish(self, stream: str, payload: dict) -> str:
+        if "event_id" not in payload:
+            payload = {**payload, "event_id": uuid.uuid4().hex}
+        # traceparent (when tracing) lets the consumer continue the producer's trace
+        return await self.client.xadd(
+            stream, {"data": json.dumps(payload, default=str), **inject_context()},
+            maxlen=EVENT_STREAM_MAXLEN, approximate=True
+        )
+
+    async def ensure_group(self, stream: str, group: str):
+        from redis.exceptions import ResponseError
+        try:
+            await self.client.xgroup_create(stream, group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def consume(self, stream: str, group: str, handler, publish_to: Optional[str]):
+        ready = False
+        while True:
+            try:
+                if not ready:
+                    await self.ensure_group(stream, group)
+                    ready = True
+                await self.reclaim(stream, group, handler, publish_to)
+                await self.report_depth(stream, group)
+                response = await self.client.xreadgroup(
+                    group, self.consumer, {stream: ">"}, count=EVENT_BATCH_SIZE, block=self.block_ms
+                )
+                for _, messages in response or []:
+                    for message_id, fields in messages:
+                        await self.handle(stream, group, handler, publish_to, message_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"✗ Event consumer {stream}/{group}: {e}")
+                # The group is gone if the broker restarted without persistence
+                ready = False
+                await asyncio.sleep(1)
+
+    async def report_depth(self, stream: str, group: str):
+        """Pending (delivered, not acked) plus not yet delivered messages of the group"""
+        now = time.monotonic()
+        if now - self.depth_checked_at.get((stream, group), float("-inf")) < EVENT_DEPTH_INTERVAL:
+            return
+        self.depth_checked_at[(stream, group)] = now
+        for info in await self.client.xinfo_groups(stream):
+            if info["name"] == group:
+                # lag is unknown (None) after some trims; pending is still meaningful
+                set_queue_depth(f"{stream}/{group}", info["pending"] + (info.get("lag") or 0))
+
+    async def reclaim(self, stream: str, group: str, handler, publish_to: Optional[str]):
+        """Retry messages left pending by a failed handler or a dead replica"""
+        claimed = await self.client.xautoclaim(
+            stream, group, self.consumer, min_idle_time=self.claim_idle_ms,
+            start_id="0-0", count=EVENT_BATCH_SIZE
+        )
+        for message_id, fields in claimed[1]:
+            if fields is None:  # trimmed from the stream meanwhile
+                await self.client.xack(stream, group, message_id)
+                continue
+            pending = await self.client.xpending_range(stream, group, min=message_id, max=message_id, count=1)
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            if deliveries > self.max_deliveries:
+                await self.client.xadd(stream + DEAD_LETTER_SUFFIX, {**fields, "group": group, "source_id": message_id})
+                await self.client.xack(stream, group, message_id)
+                print(f"✗ {stream} {message_id} moved to {stream + DEAD_LETTER_SUFFIX} after {deliveries - 1} attempts")
+                continue
+            await self.handle(stream, group, handler, publish_to, message_id, fields)
+
+    async def handle(self, stream: str, group: str, handler, publish_to: Optional[str],
+                     message_id: str, fields: dict):
+        try:
+            with span(f"{stream} process", carrier=fields, kind="consumer",
+                      **{"messaging.destination.name": stream, "messaging.message.id": message_id}):
+                payload = json.loads(fields["data"])
+                # Events published before event_id existed: the message id is stable across redeliveries
+                payload.setdefault("event_id", f"{stream}/{message_id}")
+                result = await asyncio.to_thread(handler, payload)
+                if result is not None and publish_to:
+                    # The result keeps the id of its event: republished, it is recognized downstream
+                    await self.publish(publish_to, {**result, "event_id": payload["event_id"]})
+        except Exception as e:
+            # Left pending: reclaimed once idle for claim_idle_ms
+            print(f"✗ {stream} {message_id}: {e}")
+            return
+        await self.client.xack(stream, group, message_id)
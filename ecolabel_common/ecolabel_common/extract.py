@@ -0,0 +1,104 @@
+"""
+Product sheet extraction shared by the orchestrator pipeline and the event pipeline (nlp-ingredients)
+Same rules as the frontend LCA page (front/src/components/pages/LCALitePage.tsx)
+"""
+
+import re
+from typing import Optional
+
+INGREDIENT_RE = re.compile(r"^(.+?)\s*\(?\s*(\d+(?:\.\d+)?)\s*%?\s*\)?$")
+WEIGHT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(g|kg)\b", re.IGNORECASE)
+DISTANCE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(km|kilometre)", re.IGNORECASE)
+
+DEFAULT_INGREDIENT_KG = 0.1
+DEFAULT_PACKAGING = {"material": "plastic", "weight_kg": 0.5}
+DEFAULT_TRANSPORT = {"distance_km": 250.0, "mode": "truck"}
+
+
+def section(lines: list, *titles: str) -> list:
+    """Bullet lines ("- ...") following the first line containing one of ``titles``"""
+    start = next((i for i, line in enumerate(lines) if any(t in line for t in titles)), None)
+    if start is None:
+        return []
+    items = []
+    for line in lines[start + 1:]:
+        if line.startswith("-"):
+            items.append(line[1:].strip())
+        elif items and (line == "" or ":" in line):
+            break
+    return items
+
+
+def product_name(lines: list) -> Optional[str]:
+    first = next((line for line in lines if "FICHE PRODUIT" in line), None)
+    if first:
+        return first.replace("FICHE PRODUIT", "").replace("-", "").strip() or None
+    return None
+
+
+def ingredient_key(name: str) -> str:
+    """Emission factor key used by lca-lite ("Basilic frais" -> "basilic_frais")"""
+    return re.sub(r"\s+", "_", name.strip().lower())
+
+
+def parse_ingredient(item: str) -> dict:
+    """"Tomates bio (92%)" -> {"name": "tomates_bio", "quantity_kg": 0.92}"""
+    match = INGREDIENT_RE.match(item.strip())
+    if match:
+        return {"name": ingredient_key(match.group(1)), "quantity_kg": float(match.group(2)) / 100}
+    return {"name": ingredient_key(item), "quantity_kg": DEFAULT_INGREDIENT_KG}
+
+
+def parse_packaging(text: str) -> dict:
+    lower = text.lower()
+    material = DEFAULT_PACKAGING["material"]
+    if "verre" in lower or "glass" in lower:
+        material = "glass"
+    elif "papier" in lower or "paper" in lower:
+        material = "paper"
+    elif "plastique" in lower or "plastic" in lower:
+        material = "plastic"
+    elif "carton" in lower:
+        material = "cardboard"
+
+    weight = DEFAULT_PACKAGING["weight_kg"]
+    match = WEIGHT_RE.search(text)
+    if match:
+        weight = float(match.group(1))
+        if match.group(2).lower() == "g":
+            weight /= 1000
+    return {"material": material, "weight_kg": weight}
+
+
+def parse_transport(text: str) -> dict:
+    distance = DEFAULT_TRANSPORT["distance_km"]
+    match = DISTANCE_RE.search(text)
+    if match:
+        distance = float(match.group(1))
+
+    lower = text.lower()
+    mode = DEFAULT_TRANSPORT["mode"]
+    if "avion" in lower or "air" in lower:
+        mode = "air"
+    elif "bateau" in lower or "ship" in lower:
+        mode = "ship"
+    elif "vélo" in lower or "bike" in lower:
+        mode = "bike"
+    return {"distance_km": distance, "mode": mode}
+
+
+def extract_sheet(text: str) -> dict:
+    """Product name, ingredients, packaging, transport and labels found in a product sheet"""
+    lines = [line.strip() for line in text.split("\n")]
+    ingredients = section(lines, "INGRÉDIENTS", "INGREDIENTS")
+    packaging = section(lines, "EMBALLAGE")
+    transport = section(lines, "TRANSPORT")
+    labels = " ".join(section(lines, "LABELS")).lower()
+    return {
+        "product_name": product_name(lines),
+        "ingredients": [parse_ingredient(item) for item in ingredients],
+        "packaging": parse_packaging(" - ".join(packaging)) if packaging else dict(DEFAULT_PACKAGING),
+        "transport": parse_transport(" - ".join(transport)) if transport else dict(DEFAULT_TRANSPORT),
+        "has_bio_label": int("bio" in labels or "(ab)" in labels),
+        "has_recyclable": int("recyclable" in labels or "recyclable" in " ".join(packaging).lower()),
+    }
@@ -0,0 +1,25 @@
+"""
+Observability of a FastAPI service in one call: metrics, traces and profiles
+"""
+
+
+def instrument(app, service: str, engines: dict = None):
+    """
+    Instrument ``app``, to be called before declaring its routes:
+
+    - request latency, DB, inference, cache and queue metrics at GET /metrics
+      (``engines`` maps names to the pools to report, see install_metrics);
+    - OpenTelemetry request spans when TRACING_ENABLED;
+    - per-request profiles (X-Profile header or sampling) when
+      PROFILING_ENABLED; installed before the routes so sync handlers are
+      profiled in their worker thread.
+    """
+    # Imported here: FastAPI and the exporters are not needed by engine-only users of the package
+    from ecolabel_common.metrics import install_metrics
+    from ecolabel_common.profiling import install_profiling
+    from ecolabel_common.tracing import setup_tracing
+
+    install_metrics(app, engines)
+    setup_tracing(app, service)
+    install_profiling(app, service)
+    return app
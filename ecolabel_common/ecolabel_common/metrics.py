@@ -0,0 +1,154 @@
+"""
+Prometheus metrics shared by the EcoLabel services
+
+install_metrics(app) adds the request middleware and serves GET /metrics:
+
+    http_requests_total, http_request_duration_seconds   per method, route template, status
+    http_requests_in_flight                               per method
+    db_query_duration_seconds                             per query name (query_metrics)
+    db_pool_connections                                   per engine and state (track_engine)
+    model_inference_duration_seconds                      per model (time_inference)
+    cache_requests_total                                  per cache and result (record_cache)
+    queue_depth                                           per queue (set_queue_depth)
+"""
+
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, HistogramMetricFamily
+
+from ecolabel_common.db import pool_status
+from ecolabel_common.timing import QueryMetrics, query_metrics
+from ecolabel_common.tracing import span
+
+METRICS_PATH = "/metrics"
+# Requests that match no route share one label value, so scans cannot blow up the series count
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Seconds, up to 30 s for model inference and streamed exports
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is fully sent",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+http_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method"]
+)
+inference_latency = Histogram(
+    "model_inference_duration_seconds", "Model inference latency", ["model"], buckets=LATENCY_BUCKETS
+)
+cache_requests = Counter(
+    "cache_requests_total", "Cache lookups", ["cache", "result"]
+)
+queue_depth = Gauge(
+    "queue_depth", "Messages waiting to be processed", ["queue"]
+)
+
+
+class DatabaseCollector:
+    """Exports query_metrics and the pool of tracked engines at scrape time"""
+
+    def __init__(self, metrics: QueryMetrics = query_metrics):
+        self.metrics = metrics
+        self.engines = {}
+
+    def collect(self):
+        queries = HistogramMetricFamily(
+            "db_query_duration_seconds", "Database statement latency", labels=["query"]
+        )
+        for name, buckets, total in self.metrics.histograms():
+            queries.add_metric([name], buckets, total)
+        yield queries
+
+        pools = GaugeMetricFamily(
+            "db_pool_connections", "Connections of the engine pool", labels=["engine", "state"]
+        )
+        for name, engine in self.engines.items():
+            status = pool_status(engine)
+            pools.add_metric([name, "size"], status["size"])
+            pools.add_metric([name, "checked_out"], status["checked_out"])
+            pools.add_metric([name, "overflow"], status["overflow"])
+        yield pools
+
+
+database_collector = DatabaseCollector()
+REGISTRY.register(database_collector)
+
+
+def track_engine(name: str, engine):
+    """Report the pool of ``engine`` as db_pool_connections{engine=name}"""
+    database_collector.engines[name] = engine
+
+
+@contextmanager
+def time_inference(model: str):
+    """Times the block in model_inference_duration_seconds, traced as an ``inference <model>`` span"""
+    start = time.perf_counter()
+    try:
+        with span(f"inference {model}", model=model):
+            yield
+    finally:
+        inference_latency.labels(model).observe(time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.labels(cache, "hit" if hit else "miss").inc()
+
+
+def set_queue_depth(queue: str, depth: int):
+    queue_depth.labels(queue).set(depth)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each request until its last body chunk is sent,
+    so streamed responses (exports) count their full duration.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.labels(method).dec()
+            # Set by the router once a route matched
+            route = scope.get("route")
+            route = getattr(route, "path", UNMATCHED_ROUTE)
+            http_latency.labels(method, route).observe(time.perf_counter() - start)
+            http_requests.labels(method, route, str(status)).inc()
+
+
+def metrics_endpoint(request):
+    from starlette.responses import Response
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def install_metrics(app, engines: dict = None):
+    """Add the request middleware and GET /metrics to a FastAPI app; ``engines`` maps names to pools to report"""
+    app.add_middleware(MetricsMiddleware)
+    app.add_route(METRICS_PATH, metrics_endpoint, include_in_schema=False)
+    for name, engine in (engines or {}).items():
+        if engine is not None:
+            track_engine(name, engine)
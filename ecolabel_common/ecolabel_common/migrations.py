@@ -0,0 +1,85 @@
+"""
+Schema migrations applied by the services on startup
+
+create_all() only creates missing tables, so columns, indexes and constraints
+added to existing tables are declared by each service as a list of
+(id, dialect, statements) and recorded in its own <service>_schema_migrations table.
+"""
+
+import re
+from datetime import datetime
+from sqlalchemy import text
+
+# Index built by a CREATE INDEX CONCURRENTLY statement
+CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+INVALID_INDEX_SQL = text("""
+    SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+    WHERE c.relname = :name AND pg_table_is_visible(c.oid) AND NOT i.indisvalid
+""")
+
+
+def drop_invalid_indexes(conn, statements: list):
+    """
+    Drop the INVALID indexes left by an interrupted CREATE INDEX CONCURRENTLY
+    of ``statements``: IF NOT EXISTS would skip them and the migration would be
+    recorded without a usable index.
+    """
+    for statement in statements:
+        match = CONCURRENT_INDEX.search(statement)
+        if match and conn.execute(INVALID_INDEX_SQL, {"name": match.group(1)}).first():
+            print(f"Dropping invalid index {match.group(1)} before rebuilding it")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}"))
+
+
+def run_migrations(engine, migrations: list, table: str) -> list:
+    """
+    Apply the pending ``migrations`` for the engine's dialect, recorded in
+    ``table``, and return the ids applied.
+
+    Statements run in autocommit mode so indexes can be built CONCURRENTLY
+    without blocking the services writing to the tables. On PostgreSQL an
+    advisory lock on ``table`` serializes the replicas starting together.
+    """
+    postgresql = engine.dialect.name == "postgresql"
+    applied_now = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if postgresql:
+            # Index builds outlast the per-statement timeout set on the pool
+            conn.execute(text("SET statement_timeout = 0"))
+            conn.execute(text("SELECT pg_advisory_lock(hashtext(:table))"), {"table": table})
+        try:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id VARCHAR(100) PRIMARY KEY,
+                    applied_at TIMESTAMP NOT NULL
+                )
+            """))
+            applied = {row[0] for row in conn.execute(text(f"SELECT id FROM {table}"))}
+
+            for migration_id, dialect, statements in migrations:
+                if migration_id in applied or dialect != engine.dialect.name:
+                    continue
+                try:
+                    if postgresql:
+                        drop_invalid_indexes(conn, statements)
+                    for statement in statements:
+                        conn.execute(text(statement))
+                    conn.execute(
+                        text(f"INSERT INTO {table} (id, applied_at) VALUES (:id, :at)"),
+                        {"id": migration_id, "at": datetime.utcnow()}
+                    )
+                except Exception as e:
+                    # Left unrecorded so the next startup retries it
+                    print(f"✗ Migration {migration_id} failed: {e}")
+                    continue
+                applied_now.append(migration_id)
+                print(f"✓ Migration applied: {migration_id}")
+        finally:
+            if postgresql:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:table))"), {"table": table})
+                # Back to the connect-time value before the connection returns to the pool
+                conn.execute(text("RESET statement_timeout"))
+    return applied_now
@@ -0,0 +1,254 @@
+"""
+Opt-in per-request profiling (PROFILING_ENABLED=true)
+
+A request is profiled when it carries ``X-Profile: 1`` (or ``X-Profile:
+<PROFILE_TOKEN>`` when a token is set) or is drawn by PROFILE_SAMPLE_RATE.
+The profile is stored under an id returned in the ``X-Profile-Id`` response
+header: pyinstrument HTML + speedscope JSON when pyinstrument is installed,
+cProfile stats (.prof, readable with pstats/snakeviz) + a text summary
+otherwise.
+
+The middleware profiles the event loop part of the request (async handlers,
+middlewares). Sync handlers run in the threadpool, out of its reach, so
+install_profiling() also sets a route class profiling them in their worker
+thread: it must be called before the routes are declared.
+
+    PROFILING_ENABLED      false, nothing is installed otherwise
+    PROFILE_SAMPLE_RATE    0.0, fraction of requests profiled without the header
+    PROFILE_TOKEN          unset; when set, the X-Profile value must match it
+    PROFILER               auto | pyinstrument | cprofile
+    PROFILE_STORE          local | minio
+    PROFILE_DIR            /tmp/profiles (local store)
+    PROFILE_MINIO_BUCKET   profiles (minio store, MINIO_ENDPOINT / MINIO_ACCESS_KEY / MINIO_SECRET_KEY)
+"""
+
+import asyncio
+import cProfile
+import functools
+import inspect
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from fastapi.routing import APIRoute
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILER = os.getenv("PROFILER", "auto")
+PROFILE_STORE = os.getenv("PROFILE_STORE", "local")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")
+PROFILE_MINIO_BUCKET = os.getenv("PROFILE_MINIO_BUCKET", "profiles")
+# Sampling interval of pyinstrument, in seconds
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+SUMMARY_LINES = 60
+
+# Profile of the request being handled, seen by sync handlers through the copied context
+current_profile: ContextVar = ContextVar("current_profile", default=None)
+
+
+def resolve_profiler(name: str = PROFILER) -> str:
+    if name == "auto":
+        try:
+            import pyinstrument  # noqa: F401
+            return "pyinstrument"
+        except ImportError:
+            return "cprofile"
+    return name
+
+
+class RequestProfile:
+    """Profiles of one request: its event loop part and each sync handler run in a worker thread"""
+
+    def __init__(self, profiler: str):
+        self.profiler = profiler
+        self.parts = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def record(self, async_mode: bool = False):
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled" if async_mode else "disabled")
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with self.lock:
+                    self.parts.append(profiler.last_session)
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                with self.lock:
+                    self.parts.append(profiler)
+
+    def render(self) -> dict:
+        """{file suffix: (content, content type)}"""
+        if self.profiler == "pyinstrument":
+            from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+            from pyinstrument.session import Session
+            session = functools.reduce(Session.combine, self.parts)
+            return {
+                "html": (HTMLRenderer().render(session).encode("utf-8"), "text/html"),
+                "speedscope.json": (SpeedscopeRenderer().render(session).encode("utf-8"), "application/json"),
+            }
+        summary = io.StringIO()
+        stats = pstats.Stats(*self.parts, stream=summary)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        return {
+            # Same content as Stats.dump_stats, without a temporary file
+            "prof": (marshal.dumps(stats.stats), "application/octet-stream"),
+            "txt": (summary.getvalue().encode("utf-8"), "text/plain"),
+        }
+
+
+class LocalProfileStore:
+    def __init__(self, directory: str = PROFILE_DIR):
+        self.directory = directory
+
+    def save(self, name: str, content: bytes, content_type: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+
+class MinioProfileStore:
+    def __init__(self, bucket: str = PROFILE_MINIO_BUCKET, client=None):
+        if client is None:
+            from minio import Minio
+            client = Minio(
+                os.getenv("MINIO_ENDPOINT", "minio:9000"),
+                access_key=os.getenv("MINIO_ACCESS_KEY", "minio"),
+                secret_key=os.getenv("MINIO_SECRET_KEY", "minio123"),
+                secure=False,
+            )
+        self.client = client
+        self.bucket = bucket
+        self.bucket_ready = False
+
+    def save(self, name: str, content: bytes, content_type: str) -> str:
+        if not self.bucket_ready:
+            if not self.client.bucket_exists(self.bucket):
+                self.client.make_bucket(self.bucket)
+            self.bucket_ready = True
+        self.client.put_object(self.bucket, name, io.BytesIO(content), len(content), content_type=content_type)
+        return f"s3://{self.bucket}/{name}"
+
+
+def build_store(kind: str = PROFILE_STORE):
+    if kind == "minio":
+        try:
+            return MinioProfileStore()
+        except ImportError:
+            print("✗ PROFILE_STORE=minio but the minio package is not installed, profiles kept locally")
+    return LocalProfileStore()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the selected requests, one at a time: cProfile allows a single
+    profiler per thread and concurrent profiles would skew each other.
+    """
+
+    def __init__(self, app, service: str, store, profiler: str,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, token: Optional[str] = PROFILE_TOKEN):
+        self.app = app
+        self.service = service
+        self.store = store
+        self.profiler = profiler
+        self.sample_rate = sample_rate
+        self.token = token
+        self.active = False
+
+    def requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                if self.token:
+                    return value.decode("latin-1") == self.token
+                return value.lower() in (b"1", b"true", b"yes")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.active or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.active = True
+        profile_id = f"{self.service}-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        profile = RequestProfile(self.profiler)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        context_token = current_profile.set(profile)
+        try:
+            with profile.record(async_mode=True):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(context_token)
+            # Rendered once the response is sent; the client does not wait for it
+            try:
+                await asyncio.to_thread(self.save, profile_id, profile, scope["path"])
+            finally:
+                self.active = False
+
+    def save(self, profile_id: str, profile: RequestProfile, path: str):
+        try:
+            for suffix, (content, content_type) in profile.render().items():
+                location = self.store.save(f"{profile_id}.{suffix}", content, content_type)
+            print(f"✓ Profile of {path} saved: {location}")
+        except Exception as e:
+            print(f"✗ Profile {profile_id} not saved: {e}")
+
+
+def profile_sync(endpoint):
+    """Runs a sync endpoint under the request's profiler, in its worker thread"""
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        with profile.record():
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        # functools.wraps keeps the signature FastAPI reads parameters from
+        if inspect.isfunction(endpoint) and not asyncio.iscoroutinefunction(endpoint):
+            endpoint = profile_sync(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def install_profiling(app, service: str, enabled: Optional[bool] = None, store=None, **options):
+    """Profile requests of a FastAPI app when enabled; call before declaring its routes"""
+    if not (PROFILING_ENABLED if enabled is None else enabled):
+        return
+    profiler = resolve_profiler(options.pop("profiler", PROFILER))
+    app.router.route_class = ProfiledRoute
+    app.add_middleware(
+        ProfilingMiddleware, service=service, store=store or build_store(), profiler=profiler, **options
+    )
+    print(f"✓ Profiling enabled for {service} ({profiler})")
@@ -0,0 +1,156 @@
+"""
+Read replica routing shared by the EcoLabel services
+
+Read-only work goes to the replica unless it is marked down after a
+connection failure (retried after ``retry_after`` seconds) or, with a
+staleness bound set, its replay lag exceeds ``max_lag`` seconds (measured at
+most every ``check_interval`` seconds). It falls back to the primary otherwise.
+
+    DB_READ_HOST                unset: no replica, reads go to the primary
+    DB_READ_PORT                DB_PORT
+    DB_MAX_REPLICA_LAG          0, no staleness bound
+    DB_REPLICA_CHECK_INTERVAL   5
+    DB_REPLICA_RETRY_AFTER      30
+
+ReplicaRouter serves sync engines (provenance), AsyncReplicaRouter async
+engines (widget-api); both share the state and the lag cache.
+"""
+
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from ecolabel_common.db import database_url, env
+
+# Zero when the replica has replayed everything it received (or on a primary)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def replica_url(driver: str = "postgresql") -> Optional[str]:
+    """URL of the read replica (DB_READ_HOST, DB_READ_PORT), None when no replica is configured"""
+    host = env("DB_READ_HOST", None)
+    if host is None:
+        return None
+    return database_url(driver, host, env("DB_READ_PORT", env("DB_PORT", "5432")))
+
+
+class ReplicaRouter:
+    """Chooses the connection of read-only work between a primary and an optional replica"""
+
+    def __init__(self, primary, replica=None, max_lag: Optional[float] = None,
+                 check_interval: Optional[float] = None, retry_after: Optional[float] = None):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = env("DB_MAX_REPLICA_LAG", 0.0, float) if max_lag is None else max_lag
+        self.check_interval = env("DB_REPLICA_CHECK_INTERVAL", 5.0, float) if check_interval is None else check_interval
+        self.retry_after = env("DB_REPLICA_RETRY_AFTER", 30.0, float) if retry_after is None else retry_after
+        self.down_until = 0.0
+        self.lag_checked_at = None
+        self.lag_ok = True
+
+    def mark_down(self, error: Optional[BaseException] = None):
+        if error is not None:
+            print(f"Read replica unavailable, falling back to primary: {error}")
+        self.down_until = time.monotonic() + self.retry_after
+
+    def replica_available(self) -> bool:
+        return self.replica is not None and time.monotonic() >= self.down_until
+
+    def lag_check_due(self) -> bool:
+        if self.max_lag <= 0:
+            return False
+        return self.lag_checked_at is None or time.monotonic() - self.lag_checked_at >= self.check_interval
+
+    def record_lag(self, lag: float):
+        self.lag_ok = lag <= self.max_lag
+        self.lag_checked_at = time.monotonic()
+
+    def measure_lag(self, conn) -> float:
+        return float(conn.execute(REPLICA_LAG_SQL).scalar() or 0)
+
+    def replica_fresh(self, conn) -> bool:
+        if self.lag_check_due():
+            self.record_lag(self.measure_lag(conn))
+        return self.max_lag <= 0 or self.lag_ok
+
+    @contextmanager
+    def read_connection(self, query_name: Optional[str] = None):
+        """
+        Connection for read-only queries, on the replica when usable.
+        Statements run on it are reported under ``query_name`` in the query metrics.
+        """
+        conn = None
+        if self.replica_available():
+            try:
+                conn = self.replica.connect()
+                if not self.replica_fresh(conn):
+                    conn.close()
+                    conn = None
+            except (OSError, DBAPIError) as e:
+                self.mark_down(e)
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is None:
+            conn = self.primary.connect()
+        if query_name:
+            conn.execution_options(query_name=query_name)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def dispose(self):
+        self.primary.dispose()
+        if self.replica is not None:
+            self.replica.dispose()
+
+
+class AsyncReplicaRouter(ReplicaRouter):
+    """ReplicaRouter over AsyncEngines"""
+
+    async def measure_lag(self, conn) -> float:
+        result = await conn.execute(REPLICA_LAG_SQL)
+        return float(result.scalar() or 0)
+
+    async def replica_fresh(self, conn) -> bool:
+        if self.lag_check_due():
+            self.record_lag(await self.measure_lag(conn))
+        return self.max_lag <= 0 or self.lag_ok
+
+    @asynccontextmanager
+    async def read_connection(self, query_name: Optional[str] = None):
+        conn = None
+        if self.replica_available():
+            try:
+                conn = await self.replica.connect()
+                if not await self.replica_fresh(conn):
+                    await conn.close()
+                    conn = None
+            except (OSError, DBAPIError) as e:
+                self.mark_down(e)
+                if conn is not None:
+                    await conn.close()
+                conn = None
+        if conn is None:
+            conn = await self.primary.connect()
+        if query_name:
+            await conn.execution_options(query_name=query_name)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    async def dispose(self):
+        await self.primary.dispose()
+        if self.replica is not None:
+            await self.replica.dispose()
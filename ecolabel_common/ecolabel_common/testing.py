@@ -0,0 +1,50 @@
+"""
+Test support shared by the benchmarks and the load test harness
+
+Every service names its package ``app``: load_service() drops the previously
+loaded one from sys.modules before importing the requested service, so a
+process holds one service at a time.
+"""
+
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+COMMON_DIR = os.path.join(ROOT, "ecolabel_common")
+
+SERVICE_DIRS = {
+    "parser-produit": os.path.join(ROOT, "parser-produit"),
+    "lca-lite": os.path.join(ROOT, "lca-lite"),
+    "scoring": os.path.join(ROOT, "scoring"),
+    "widget-api": os.path.join(ROOT, "widget-api", "backend"),
+    "provenance": os.path.join(ROOT, "provenance"),
+}
+
+
+def load_service(name: str):
+    """app.main of the service ``name``, in place of the service loaded before it"""
+    for module in [m for m in sys.modules if m == "app" or m.startswith("app.")]:
+        del sys.modules[module]
+    sys.path[:] = [p for p in sys.path if p not in SERVICE_DIRS.values()]
+    sys.path.insert(0, SERVICE_DIRS[name])
+    # From the repository root, the ecolabel_common/ project folder would shadow the package
+    if COMMON_DIR not in sys.path:
+        sys.path.insert(1, COMMON_DIR)
+    return importlib.import_module("app.main")
+
+
+class MemoryObjectStore:
+    """Stands in for MinIO: keeps the size of the uploaded objects"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def bucket_exists(self, bucket):
+        return True
+
+    def make_bucket(self, bucket):
+        pass
+
+    def put_object(self, bucket, name, data, length, content_type=None):
+        self.objects[(bucket, name)] = length
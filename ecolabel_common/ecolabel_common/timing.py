@@ -0,0 +1,130 @@
+"""
+Per-query database timing
+SQLAlchemy cursor events time every statement, grouped by a query name
+"""
+
+import threading
+import time
+from sqlalchemy import event
+
+from ecolabel_common.tracing import MAX_STATEMENT_LENGTH, end_span, start_span
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def statement_name(statement: str) -> str:
+    """Fallback name for untagged statements: the first 80 chars of the normalized SQL"""
+    return " ".join(statement.split())[:80]
+
+
+class QueryMetrics:
+    """Count, total, max and latency histogram per query name (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    def record(self, name: str, seconds: float, rows: int = None):
+        with self._lock:
+            entry = self._queries.get(name)
+            if entry is None:
+                entry = self._queries[name] = {
+                    "count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                    "rows": 0, "buckets": [0] * (len(BUCKETS) + 1)
+                }
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            if rows is not None and rows >= 0:
+                entry["rows"] += rows
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            else:
+                entry["buckets"][-1] += 1
+
+    def snapshot(self) -> list:
+        """Queries sorted by total time spent, heaviest first"""
+        with self._lock:
+            items = [(name, dict(entry, buckets=list(entry["buckets"]))) for name, entry in self._queries.items()]
+        total = sum(entry["total_seconds"] for _, entry in items) or 1.0
+        queries = []
+        for name, entry in sorted(items, key=lambda item: item[1]["total_seconds"], reverse=True):
+            queries.append({
+                "query": name,
+                "count": entry["count"],
+                "total_ms": round(entry["total_seconds"] * 1000, 2),
+                "avg_ms": round(entry["total_seconds"] * 1000 / entry["count"], 3),
+                "max_ms": round(entry["max_seconds"] * 1000, 2),
+                "share": round(entry["total_seconds"] / total, 3),
+                "rows": entry["rows"],
+                "histogram": {
+                    **{f"le_{bound}": count for bound, count in zip(BUCKETS, entry["buckets"])},
+                    "le_inf": entry["buckets"][-1]
+                }
+            })
+        return queries
+
+    def histograms(self) -> list:
+        """(name, cumulative [(upper bound, count)], total seconds) per query, Prometheus layout"""
+        with self._lock:
+            items = [(name, list(entry["buckets"]), entry["total_seconds"]) for name, entry in self._queries.items()]
+        histograms = []
+        for name, buckets, total in items:
+            cumulative, running = [], 0
+            for bound, count in zip(BUCKETS + (float("inf"),), buckets):
+                running += count
+                cumulative.append(("+Inf" if bound == float("inf") else str(bound), running))
+            histograms.append((name, cumulative, total))
+        return histograms
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+def query_name(context, statement: str) -> str:
+    return (context.execution_options.get("query_name") if context is not None else None) \
+        or statement_name(statement)
+
+
+def instrument_engine(engine, metrics: QueryMetrics = None):
+    """
+    Time every statement run through ``engine``, traced as a ``db <name>``
+    span when tracing is enabled.
+
+    The name comes from the ``query_name`` execution option, set with
+    ``conn.execution_options(query_name=...)``, or from the SQL text.
+    """
+    metrics = metrics or query_metrics
+    # Async engines emit their events on the underlying sync engine
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_spans", []).append(start_span(
+            f"db {query_name(context, statement)}",
+            **{"db.system": conn.dialect.name, "db.statement": statement[:MAX_STATEMENT_LENGTH]}
+        ))
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        metrics.record(query_name(context, statement), time.perf_counter() - started, getattr(cursor, "rowcount", None))
+        end_span(conn.info["query_spans"].pop())
+
+    @event.listens_for(target, "handle_error")
+    def _error(exception_context):
+        # Failed statements never reach after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+            end_span(conn.info["query_spans"].pop(), exception_context.original_exception)
+
+    return engine
@@ -0,0 +1,171 @@
+"""
+OpenTelemetry tracing shared by the EcoLabel services (TRACING_ENABLED=true)
+
+setup_tracing(app, service) configures the SDK once per process and traces
+incoming requests (W3C traceparent honoured). Outbound httpx calls carry the
+trace context, statements of engines timed by ``timing.instrument_engine`` become
+``db <query name>`` child spans and ``span()`` opens manual spans (model
+inference, MinIO, ...). Everything is a no-op when tracing is disabled or the
+SDK is missing (pip install "ecolabel-common[tracing]").
+
+    TRACING_ENABLED               false
+    TRACING_EXPORTER              otlp | console | file | none
+    OTEL_EXPORTER_OTLP_ENDPOINT   http://localhost:4318 (read by the OTLP exporter)
+    TRACING_FILE                  traces.ndjson, one JSON span per line (file exporter)
+    TRACING_SAMPLE_RATIO          1.0, fraction of new traces kept
+"""
+
+import json
+import os
+import threading
+from contextlib import nullcontext
+from typing import Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "otlp")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.ndjson")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+
+TRACER_NAME = "ecolabel"
+# Probes and scrapes would drown the interesting traces
+EXCLUDED_URLS = "health,metrics"
+# Longer statements are cut in the db.statement attribute
+MAX_STATEMENT_LENGTH = 2000
+
+provider = None
+
+
+class FileSpanExporter:
+    """Appends finished spans to ``path`` as NDJSON (tests, local debugging)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        lines = [json.dumps(json.loads(span.to_json())) + "\n" for span in spans]
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def span_processor(exporter: str, path: str):
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return BatchSpanProcessor(OTLPSpanExporter())
+    if exporter == "console":
+        return SimpleSpanProcessor(ConsoleSpanExporter())
+    if exporter == "file":
+        # Synchronous so spans are on disk when the request returns
+        return SimpleSpanProcessor(FileSpanExporter(path))
+    return None
+
+
+def configure_tracing(service: str, enabled: Optional[bool] = None, exporter: Optional[str] = None,
+                      path: Optional[str] = None):
+    """Install the tracer provider of this process once; None when tracing is off"""
+    global provider
+    if provider is not None:
+        return provider
+    if not (TRACING_ENABLED if enabled is None else enabled):
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        print("✗ TRACING_ENABLED but opentelemetry-sdk is not installed")
+        return None
+
+    exporter = exporter or TRACING_EXPORTER
+    # ParentBased: a request keeps the sampling decision of its caller
+    tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": service}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    processor = span_processor(exporter, path or TRACING_FILE)
+    if processor is not None:
+        tracer_provider.add_span_processor(processor)
+    trace.set_tracer_provider(tracer_provider)
+
+    try:
+        from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+        HTTPXClientInstrumentor().instrument(tracer_provider=tracer_provider)
+    except ImportError:
+        pass
+
+    provider = tracer_provider
+    print(f"✓ Tracing enabled for {service} ({exporter})")
+    return provider
+
+
+def setup_tracing(app, service: str, **options):
+    """Configure tracing (see configure_tracing) and trace the requests of a FastAPI app"""
+    tracer_provider = configure_tracing(service, **options)
+    if tracer_provider is None:
+        return
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except ImportError:
+        print("✗ opentelemetry-instrumentation-fastapi is not installed, requests are not traced")
+        return
+    # The per-message ASGI receive/send spans add nothing to the request span
+    FastAPIInstrumentor.instrument_app(
+        app, tracer_provider=tracer_provider, excluded_urls=EXCLUDED_URLS, exclude_spans=["receive", "send"]
+    )
+
+
+def tracing_enabled() -> bool:
+    return provider is not None
+
+
+def span(name: str, carrier: Optional[dict] = None, kind: str = "internal", **attributes):
+    """
+    Context manager opening ``name`` as the current span. ``carrier`` holds
+    propagated headers (traceparent) of a message to continue its trace.
+    """
+    if provider is None:
+        return nullcontext()
+    from opentelemetry import propagate, trace
+
+    context = propagate.extract(carrier) if carrier is not None else None
+    return trace.get_tracer(TRACER_NAME).start_as_current_span(
+        name, context=context, kind=getattr(trace.SpanKind, kind.upper()), attributes=attributes
+    )
+
+
+def start_span(name: str, **attributes):
+    """Child span of the current one, ended by the caller; None when tracing is off"""
+    if provider is None:
+        return None
+    from opentelemetry import trace
+    return trace.get_tracer(TRACER_NAME).start_span(name, kind=trace.SpanKind.CLIENT, attributes=attributes)
+
+
+def end_span(span, error: Optional[BaseException] = None):
+    if span is None:
+        return
+    if error is not None:
+        from opentelemetry.trace import Status, StatusCode
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+    span.end()
+
+
+def inject_context() -> dict:
+    """Headers carrying the current trace (empty when tracing is off), for messages"""
+    carrier = {}
+    if provider is not None:
+        from opentelemetry import propagate
+        propagate.inject(carrier)
+    return carrier
@@ -0,0 +1 @@
+# Tests ecolabel_common
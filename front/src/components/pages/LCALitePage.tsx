@@ -203,7 +203,8 @@ export function LCALitePage({ onNavigate }: LCALitePageProps) {
         product_name: data.product_name,
         total_co2_kg: data.total_co2_kg,
         total_water_l: data.total_water_l,
-        total_energy_mj: data.total_energy_mj
+        total_energy_mj: data.total_energy_mj,
+        lca_result_id: data.lca_result_id
       });
       setCurrentStep('scoring');
     } catch (e) {
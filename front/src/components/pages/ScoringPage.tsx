@@ -57,7 +57,11 @@ export function ScoringPage() {
       total_energy: energy,
       max_co2_ref: 10,
       max_water_ref: 500,
-      max_energy_ref: 50
+      max_energy_ref: 50,
+      // Link the score to the LCA it comes from, unless the values were edited by hand
+      lca_result_id: lcaResult && lcaResult.product_name === productName && lcaResult.total_co2_kg === co2
+        ? lcaResult.lca_result_id
+        : undefined
     };
 
     try {
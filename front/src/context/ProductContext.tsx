@@ -23,6 +23,7 @@ export interface LCAResult {
     total_co2_kg: number;
     total_water_l: number;
     total_energy_mj: number;
+    lca_result_id?: number;
 }
 
 export interface ScoreResult {
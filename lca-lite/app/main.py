@@ -1,13 +1,18 @@
 from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
+from typing import Optional
 from sqlalchemy.orm import Session
 import pandas as pd
 import json
 import io
 import datetime
 import os
-from app.database import SessionLocal, engine, minio_client
+from app.database import SessionLocal, engine, get_db, minio_client
+from ecolabel_common import instrument
+from ecolabel_common.metrics import time_inference
+from ecolabel_common.tracing import span
 from app.models import Base, EmissionFactor, LCAResult
+from app.migrations import run_migrations
 
 # Try to import ML imputer
 try:
@@ -37,6 +42,7 @@ class LCACalculationRequest(BaseModel):
     transport: TransportInput
 
 class LCACalculationResponse(BaseModel):
+    lca_result_id: Optional[int] = None  # pass to /score/compute for an exact audit trail
     product_name: str
     total_co2_kg: float
     total_water_l: float
@@ -67,8 +73,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+instrument(app, "lca-lite", {"primary": engine})
+
 # ML state
 ml_model_loaded = False
+ml_model_bundle = None
 imputer_metrics = None
 
 @app.get("/health")
@@ -80,13 +89,6 @@ def health_check():
         "version": "2.0.0"
     }
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def ensure_minio_bucket():
     bucket_name = "lca-reports"
     if not minio_client.bucket_exists(bucket_name):
@@ -95,7 +97,7 @@ def ensure_minio_bucket():
 
 def load_ml_imputer():
     """Load the ML imputer model"""
-    global ml_model_loaded, imputer_metrics
+    global ml_model_loaded, ml_model_bundle, imputer_metrics
     
     if not ML_AVAILABLE:
         print("✗ ML imputer module not available")
@@ -110,8 +112,8 @@ def load_ml_imputer():
             print("Training new CO₂ imputer model...")
             train_co2_model(verbose=False)
         
-        # Load model to verify
-        load_co2_model()
+        # Loaded once, passed to estimate_co2 on every request
+        ml_model_bundle = load_co2_model()
         ml_model_loaded = True
         
         if os.path.exists(metrics_path):
@@ -129,6 +131,10 @@ def load_ml_imputer():
 @app.on_event("startup")
 def startup():
     Base.metadata.create_all(bind=engine)
+    try:
+        run_migrations(engine)
+    except Exception as e:
+        print(f"Warning: migrations not applied: {e}")
     
     # Seed data if empty
     db = SessionLocal()
@@ -283,16 +289,18 @@ def calculate_lca(request: LCACalculationRequest, db: Session = Depends(get_db))
             try:
                 ingredient_types = detect_ingredient_types(request.ingredients, factors)
                 
-                ml_result = estimate_co2(
-                    num_ingredients=len(request.ingredients),
-                    total_weight_kg=total_weight + request.packaging.weight_kg,
-                    has_meat=ingredient_types['has_meat'],
-                    has_dairy=ingredient_types['has_dairy'],
-                    has_vegetables=ingredient_types['has_vegetables'],
-                    packaging_type=request.packaging.material,
-                    packaging_weight_kg=request.packaging.weight_kg,
-                    transport_km=request.transport.distance_km
-                )
+                with time_inference("co2_imputer"):
+                    ml_result = estimate_co2(
+                        num_ingredients=len(request.ingredients),
+                        total_weight_kg=total_weight + request.packaging.weight_kg,
+                        has_meat=ingredient_types['has_meat'],
+                        has_dairy=ingredient_types['has_dairy'],
+                        has_vegetables=ingredient_types['has_vegetables'],
+                        packaging_type=request.packaging.material,
+                        packaging_weight_kg=request.packaging.weight_kg,
+                        transport_km=request.transport.distance_km,
+                        model_bundle=ml_model_bundle
+                    )
                 
                 # Calculate how much CO₂ we've already accounted for
                 known_co2 = sum(item['co2'] for item in ing_data if item['source'] == 'database')
@@ -348,23 +356,25 @@ def calculate_lca(request: LCACalculationRequest, db: Session = Depends(get_db))
             "source": "database"
         })
         
-        df = pd.DataFrame(ing_data)
-        
-        # Aggregates
-        totals = df[["co2", "water", "energy"]].sum()
-        
-        # 6. Save Report to MinIO
-        report_content = df.to_csv(index=False)
+        with span("lca.dataframe", ingredients=len(ing_data)):
+            df = pd.DataFrame(ing_data)
+            
+            # Aggregates
+            totals = df[["co2", "water", "energy"]].sum()
+            
+            # 6. Save Report to MinIO
+            report_content = df.to_csv(index=False)
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         filename = f"{request.product_name}_{timestamp}.csv"
         try:
-            minio_client.put_object(
-                "lca-reports",
-                filename,
-                io.BytesIO(report_content.encode('utf-8')),
-                len(report_content),
-                content_type="text/csv"
-            )
+            with span("minio.put_object", kind="client", bucket="lca-reports", object=filename):
+                minio_client.put_object(
+                    "lca-reports",
+                    filename,
+                    io.BytesIO(report_content.encode('utf-8')),
+                    len(report_content),
+                    content_type="text/csv"
+                )
         except Exception as e:
             print(f"Failed to save to MinIO: {e}")
 
@@ -381,6 +391,7 @@ def calculate_lca(request: LCACalculationRequest, db: Session = Depends(get_db))
         db.commit()
         
         return LCACalculationResponse(
+            lca_result_id=result_db.id,
             product_name=request.product_name,
             total_co2_kg=float(totals["co2"]),
             total_water_l=float(totals["water"]),
@@ -424,8 +435,8 @@ async def train_imputer():
         raise HTTPException(status_code=500, detail="ML imputer module not available")
     
     try:
-        global ml_model_loaded, imputer_metrics
-        _, imputer_metrics = train_co2_model(verbose=False)
+        global ml_model_loaded, ml_model_bundle, imputer_metrics
+        ml_model_bundle, imputer_metrics = train_co2_model(verbose=False)
         ml_model_loaded = True
         
         return {
@@ -438,3 +449,59 @@ async def train_imputer():
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+
+
+# ============ EVENTS ============
+
+from ecolabel_common.events import EVENTS_ENABLED, EventBus
+
+event_bus: Optional[EventBus] = None
+
+
+def lca_event(event: dict, db: Session) -> dict:
+    """ingredients.extracted -> lca.computed, same calculation as /lca/calc"""
+    request = LCACalculationRequest(
+        product_name=event["product_name"],
+        ingredients=event["ingredients"],
+        packaging=event["packaging"],
+        transport=event["transport"],
+    )
+    result = calculate_lca(request, db)
+    # Sheet data the scoring step needs travels with the event
+    return {
+        "correlation_id": event.get("correlation_id"),
+        "product_id": event.get("product_id"),
+        "gtin": event.get("gtin"),
+        "lca_result_id": result.lca_result_id,
+        "product_name": result.product_name,
+        "total_co2_kg": result.total_co2_kg,
+        "total_water_l": result.total_water_l,
+        "total_energy_mj": result.total_energy_mj,
+        "packaging": event["packaging"],
+        "transport": event["transport"],
+        "has_bio_label": event.get("has_bio_label", 0),
+        "has_recyclable": event.get("has_recyclable", 0),
+    }
+
+
+def on_ingredients_extracted(event: dict, db: Session) -> dict:
+    result = lca_event(event, db)
+    print(f"[{event.get('correlation_id')}] ✓ LCA {result['product_name']}: {result['total_co2_kg']:.2f} kg CO₂")
+    return result
+
+
+@app.on_event("startup")
+async def start_events():
+    global event_bus
+    if EVENTS_ENABLED:
+        event_bus = EventBus()
+        # At most once per event: a redelivered ingredients.extracted republishes the same LCA
+        event_bus.subscribe("ingredients.extracted", "lca-lite", on_ingredients_extracted,
+                            publish_to="lca.computed", sessions=SessionLocal)
+        await event_bus.start()
+
+
+@app.on_event("shutdown")
+async def stop_events():
+    if event_bus is not None:
+        await event_bus.stop()
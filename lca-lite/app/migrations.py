@@ -0,0 +1,27 @@
+"""
+Schema migrations applied by the LCA service on startup
+create_all() only creates missing tables, so columns and indexes added to
+existing tables are declared here and recorded in lca_schema_migrations
+"""
+
+from ecolabel_common.migrations import run_migrations as apply_migrations
+
+# (id, dialect, statements), run in autocommit mode
+MIGRATIONS = [
+    # No backfill: the calculation time of older rows is unknown, they stay NULL
+    ("001_lca_results_created_at", "postgresql", [
+        "ALTER TABLE lca_results ADD COLUMN IF NOT EXISTS created_at TIMESTAMP",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lca_results_created_at
+           ON lca_results (created_at)""",
+    ]),
+    # Latest LCA per product name (provenance audit fallback for unlinked scores)
+    ("002_lca_results_name_id_index", "postgresql", [
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lca_results_name_id
+           ON lca_results (product_name, id)""",
+    ]),
+]
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations for the engine's dialect, return the ids applied"""
+    return apply_migrations(engine, MIGRATIONS, "lca_schema_migrations")
@@ -14,6 +14,9 @@ import json
 import os
 from datetime import datetime
 
+from ecolabel_common.encoding import UNKNOWN_CATEGORY, encoding_table
+from ecolabel_common.tracing import span
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_PATH = os.path.join(BASE_DIR, 'data', 'co2_training.csv')
@@ -115,6 +118,8 @@ def train_co2_model(verbose=True):
     model_bundle = {
         'model': model,
         'packaging_encoder': packaging_encoder,
+        # Inference encodes with this instead of LabelEncoder.transform
+        'packaging_codes': encoding_table(packaging_encoder),
         'feature_cols': feature_cols
     }
     
@@ -165,7 +170,12 @@ def load_co2_model():
         print("No CO₂ model found. Training new model...")
         train_co2_model()
     
-    return joblib.load(MODEL_PATH)
+    with span("model.load", model="co2_imputer"):
+        model_bundle = joblib.load(MODEL_PATH)
+    # Bundles saved before the lookup tables existed
+    if 'packaging_codes' not in model_bundle:
+        model_bundle['packaging_codes'] = encoding_table(model_bundle['packaging_encoder'])
+    return model_bundle
 
 
 def estimate_co2(num_ingredients: int, total_weight_kg: float,
@@ -173,22 +183,23 @@ def estimate_co2(num_ingredients: int, total_weight_kg: float,
                  has_vegetables: bool = False,
                  packaging_type: str = 'plastic', 
                  packaging_weight_kg: float = 0.2,
-                 transport_km: float = 200) -> dict:
+                 transport_km: float = 200,
+                 model_bundle: dict = None) -> dict:
     """
     Estimate CO₂ emissions when ingredient factors are unknown.
     
+    The model is loaded from disk unless model_bundle is given.
+    
     Returns:
         dict with 'co2_kg', 'confidence', and 'is_estimated'
     """
-    model_bundle = load_co2_model()
+    if model_bundle is None:
+        model_bundle = load_co2_model()
     model = model_bundle['model']
-    packaging_encoder = model_bundle['packaging_encoder']
+    packaging_codes = model_bundle['packaging_codes']
     
     # Encode packaging
-    try:
-        packaging_encoded = packaging_encoder.transform([packaging_type])[0]
-    except ValueError:
-        packaging_encoded = 0  # Default to first category
+    packaging_encoded = packaging_codes.get(packaging_type, packaging_codes[UNKNOWN_CATEGORY])
     
     # Prepare features
     features = np.array([[
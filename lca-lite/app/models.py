@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, JSON
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, Index
 from sqlalchemy.orm import declarative_base
+from datetime import datetime
 
 Base = declarative_base()
 
@@ -22,3 +23,10 @@ class LCAResult(Base):
     total_water = Column(Float)
     total_energy = Column(Float)
     details = Column(JSON) # Store breakdown
+    # Added by migration 001 on existing databases, NULL for rows written before it
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Provenance looks up the latest LCA of a product for scores without lca_result_id
+        Index("ix_lca_results_name_id", "product_name", "id"),
+    )
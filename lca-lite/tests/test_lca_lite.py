@@ -143,6 +143,20 @@ class TestMLImputer:
             assert model is not None
         except (ImportError, FileNotFoundError):
             pytest.skip("Model not available")
+    
+    def test_packaging_lookup_table(self):
+        """Test que la table d'encodage du bundle reproduit le LabelEncoder (inconnu -> 0)"""
+        from app.ml_imputer import UNKNOWN_CATEGORY, estimate_co2, load_co2_model
+        bundle = load_co2_model()
+        encoder, codes = bundle['packaging_encoder'], bundle['packaging_codes']
+        
+        for value in encoder.classes_:
+            assert codes[value] == encoder.transform([value])[0]
+        assert codes[UNKNOWN_CATEGORY] == 0
+        
+        features = dict(num_ingredients=3, total_weight_kg=0.6, has_vegetables=True, model_bundle=bundle)
+        assert estimate_co2(packaging_type="bois", **features) == \
+            estimate_co2(packaging_type=encoder.classes_[0], **features)
 
 
 class TestPackagingImpact:
@@ -172,5 +186,29 @@ class TestPackagingImpact:
         assert response.status_code == 200
 
 
+class TestEvents:
+    """Tests du mode événementiel : ingredients.extracted -> lca.computed"""
+
+    def test_lca_event(self):
+        from app.main import SessionLocal, lca_event
+        event = {
+            "correlation_id": "evt-1", "product_id": 3, "gtin": "123",
+            "product_name": "Sauce Tomate Bio",
+            "ingredients": [{"name": "tomato", "quantity_kg": 0.5}],
+            "packaging": {"material": "glass", "weight_kg": 0.3},
+            "transport": {"distance_km": 200, "mode": "truck"},
+            "has_bio_label": 1, "has_recyclable": 0
+        }
+        with SessionLocal() as db:
+            result = lca_event(event, db)
+        assert result["correlation_id"] == "evt-1"
+        assert result["product_id"] == 3
+        assert result["lca_result_id"] is not None
+        assert result["total_co2_kg"] > 0
+        # Données nécessaires au scoring transmises telles quelles
+        assert result["packaging"] == event["packaging"]
+        assert result["has_bio_label"] == 1
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,3 @@
+"""
+Load tests of the EcoLabel services (python -m loadtest), replacing the JMeter plan
+"""
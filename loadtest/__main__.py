@@ -0,0 +1,80 @@
+"""
+Headless load test with SLO assertions
+
+    python -m loadtest                              # every scenario against docker-compose
+    python -m loadtest scoring lca --target inprocess
+    python -m loadtest widget --users 20 --p95-ms 300 --report widget.json
+
+Exits with 1 when a scenario breaches its SLO (or cannot run), 0 otherwise.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import sys
+
+from loadtest.runner import SetupError, format_report, run_scenario
+from loadtest.scenarios import SCENARIOS
+from loadtest.targets import TARGETS
+
+
+async def run_all(args) -> list:
+    reports = []
+    for name in args.scenarios:
+        scenario = copy.copy(SCENARIOS[name])
+        for field in ("users", "iterations", "ramp_up_s"):
+            if getattr(args, field) is not None:
+                setattr(scenario, field, getattr(args, field))
+        slo = scenario.slo.override(
+            p50_ms=args.p50_ms, p95_ms=args.p95_ms, p99_ms=args.p99_ms, mean_ms=args.mean_ms,
+            min_rps=args.min_rps, max_error_rate=args.max_error_rate,
+        )
+        try:
+            async with TARGETS[args.target](scenario.service) as client:
+                report = await run_scenario(scenario, client, slo)
+        except SetupError as e:
+            report = {"scenario": name, "passed": False, "breaches": [f"setup: {e}"]}
+            print(f"[{name}] ✗ {e}")
+        else:
+            print(format_report(report))
+        reports.append(report)
+    return reports
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Load test the EcoLabel services")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS),
+                        help=f"scenarios to run, in order (default: {' '.join(SCENARIOS)})")
+    parser.add_argument("--target", choices=TARGETS, default="compose",
+                        help="compose: running stack over HTTP; inprocess: ASGI apps in this process")
+    parser.add_argument("--users", type=int, help="virtual users (scenario default otherwise)")
+    parser.add_argument("--iterations", type=int, help="iterations per user")
+    parser.add_argument("--ramp-up", dest="ramp_up_s", type=float, help="seconds to start every user")
+    slo = parser.add_argument_group("SLO overrides")
+    slo.add_argument("--p50-ms", type=float)
+    slo.add_argument("--p95-ms", type=float)
+    slo.add_argument("--p99-ms", type=float)
+    slo.add_argument("--mean-ms", type=float)
+    slo.add_argument("--min-rps", type=float, help="minimum throughput (requests/s)")
+    slo.add_argument("--max-error-rate", type=float, help="e.g. 0.01 for 1 %%")
+    parser.add_argument("--report", help="also write the reports as JSON to this file")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    reports = asyncio.run(run_all(args))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+    failed = [r["scenario"] for r in reports if not r["passed"]]
+    if failed:
+        print(f"✗ SLO breached: {', '.join(failed)}")
+        return 1
+    print(f"✓ All SLOs met ({len(reports)} scenarios)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Load generation, latency statistics and SLO checks
+
+Each scenario runs ``users`` virtual users, started evenly over ``ramp_up_s``
+(JMeter thread group semantics). A user runs every step of the scenario
+``iterations`` times, back to back. Any transport error or HTTP status >= 400
+counts as an error.
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+# A step sends one request: (client, context) -> response
+StepFunction = Callable[[httpx.AsyncClient, dict], Awaitable[httpx.Response]]
+
+
+class SetupError(Exception):
+    """The target cannot run the scenario (missing data, service down)"""
+
+
+class SLO:
+    """Thresholds of a scenario run; None disables a check"""
+
+    def __init__(self, p50_ms: Optional[float] = None, p95_ms: Optional[float] = None,
+                 p99_ms: Optional[float] = None, mean_ms: Optional[float] = None,
+                 min_rps: Optional[float] = None, max_error_rate: Optional[float] = None):
+        self.p50_ms = p50_ms
+        self.p95_ms = p95_ms
+        self.p99_ms = p99_ms
+        self.mean_ms = mean_ms
+        self.min_rps = min_rps
+        self.max_error_rate = max_error_rate
+
+    def override(self, **thresholds) -> "SLO":
+        values = {**vars(self), **{k: v for k, v in thresholds.items() if v is not None}}
+        return SLO(**values)
+
+    def check(self, summary: dict) -> List[str]:
+        """Breached thresholds, as readable messages"""
+        if not summary["count"]:
+            return ["no request completed"]
+        breaches = []
+        for field, limit in (("p50_ms", self.p50_ms), ("p95_ms", self.p95_ms),
+                             ("p99_ms", self.p99_ms), ("mean_ms", self.mean_ms)):
+            if limit is not None and summary[field] > limit:
+                breaches.append(f"{field} {summary[field]} > {limit}")
+        if self.min_rps is not None and summary["rps"] < self.min_rps:
+            breaches.append(f"rps {summary['rps']} < {self.min_rps}")
+        if self.max_error_rate is not None and summary["error_rate"] > self.max_error_rate:
+            breaches.append(f"error_rate {summary['error_rate']} > {self.max_error_rate}")
+        return breaches
+
+    def as_dict(self) -> dict:
+        return {k: v for k, v in vars(self).items() if v is not None}
+
+
+class Scenario:
+    def __init__(self, name: str, service: str, steps: Dict[str, StepFunction], slo: SLO,
+                 users: int = 10, iterations: int = 100, ramp_up_s: float = 10.0,
+                 setup: Optional[Callable[[httpx.AsyncClient], Awaitable[dict]]] = None):
+        self.name = name
+        self.service = service
+        self.steps = steps
+        self.slo = slo
+        self.users = users
+        self.iterations = iterations
+        self.ramp_up_s = ramp_up_s
+        self.setup = setup
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.errors = 0
+        self.statuses = {}
+
+    def record(self, ms: float, status: Optional[int]):
+        self.latencies_ms.append(ms)
+        key = str(status) if status is not None else "transport_error"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+
+    def merge(self, other: "StepStats"):
+        self.latencies_ms.extend(other.latencies_ms)
+        self.errors += other.errors
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self, elapsed_s: float) -> dict:
+        count = len(self.latencies_ms)
+        if not count:
+            return {"count": 0, "errors": 0, "error_rate": 0.0, "rps": 0.0, "statuses": {}}
+        return {
+            "count": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4),
+            "rps": round(count / elapsed_s, 2) if elapsed_s else 0.0,
+            "mean_ms": round(sum(self.latencies_ms) / count, 2),
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(max(self.latencies_ms), 2),
+            "statuses": self.statuses,
+        }
+
+
+async def run_user(scenario: Scenario, client: httpx.AsyncClient, context: dict, stats: Dict[str, StepStats],
+                   delay_s: float, seed: int):
+    await asyncio.sleep(delay_s)
+    # Each user draws its own products, reproducibly
+    user_context = {**context, "random": random.Random(seed)}
+    for _ in range(scenario.iterations):
+        for name, step in scenario.steps.items():
+            started = time.perf_counter()
+            try:
+                status = (await step(client, user_context)).status_code
+            except httpx.HTTPError:
+                status = None
+            stats[name].record((time.perf_counter() - started) * 1000, status)
+
+
+async def run_scenario(scenario: Scenario, client: httpx.AsyncClient, slo: Optional[SLO] = None) -> dict:
+    """Run ``scenario`` against ``client`` and return its report, SLO verdict included"""
+    slo = slo or scenario.slo
+    context = await scenario.setup(client) if scenario.setup else {}
+    stats = {name: StepStats() for name in scenario.steps}
+    spacing = scenario.ramp_up_s / scenario.users if scenario.users else 0
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_user(scenario, client, context, stats, delay_s=i * spacing, seed=i)
+        for i in range(scenario.users)
+    ))
+    elapsed = time.perf_counter() - started
+
+    total = StepStats()
+    for step_stats in stats.values():
+        total.merge(step_stats)
+    summary = total.summary(elapsed)
+    breaches = slo.check(summary)
+    return {
+        "scenario": scenario.name,
+        "users": scenario.users,
+        "iterations": scenario.iterations,
+        "elapsed_s": round(elapsed, 2),
+        "total": summary,
+        "steps": {name: step_stats.summary(elapsed) for name, step_stats in stats.items()},
+        "slo": slo.as_dict(),
+        "breaches": breaches,
+        "passed": not breaches,
+    }
+
+
+def format_report(report: dict) -> str:
+    verdict = "✓ SLO met" if report["passed"] else "✗ SLO breached: " + "; ".join(report["breaches"])
+    lines = [
+        f"[{report['scenario']}] {report['users']} users x {report['iterations']} iterations "
+        f"in {report['elapsed_s']}s - {verdict}",
+        f"{'step':<34}{'count':>7}{'err%':>7}{'rps':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)",
+    ]
+    for name, summary in [*report["steps"].items(), ("total", report["total"])]:
+        if not summary["count"]:
+            lines.append(f"{name:<34}{0:>7}")
+            continue
+        lines.append(
+            f"{name:<34}{summary['count']:>7}{summary['error_rate'] * 100:>7.1f}{summary['rps']:>9}"
+            f"{summary['mean_ms']:>9}{summary['p50_ms']:>9}{summary['p95_ms']:>9}"
+            f"{summary['p99_ms']:>9}{summary['max_ms']:>9}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+"""
+Load scenarios of the services, mirroring jmeter/ecolabel-load-test.jmx
+
+Default SLOs follow the JMeter performance criteria (mean < 500 ms,
+p95 < 1 s, errors < 1 %, > 50 req/s), adjusted per service. scoring runs
+first: the scores it creates are read by the widget and provenance scenarios.
+"""
+
+from loadtest.runner import SLO, Scenario, SetupError
+
+PRODUCTS = 200
+KNOWN_INGREDIENTS = ["tomato", "onion", "carrot", "potato", "huile_d'olive_bio", "sel_de_mer", "milk", "cheese"]
+# Not in the emission factor table: LCA falls back to the ML imputer
+UNKNOWN_INGREDIENTS = ["poivron_grille", "pois_chiches", "farine_de_riz"]
+PACKAGING = ["plastic", "glass", "paper", "cardboard", "aluminum"]
+LOOKUP_SIZE = 20
+
+
+def product_name(rng) -> str:
+    return f"Produit charge {rng.randint(1, PRODUCTS)}"
+
+
+# ============ SCORING ============
+
+async def scoring_health(client, context):
+    return await client.get("/health")
+
+
+async def compute_score(client, context):
+    rng = context["random"]
+    return await client.post("/score/compute", json={
+        "product_name": product_name(rng),
+        "total_co2": round(rng.uniform(0.2, 12.0), 2),
+        "total_water": round(rng.uniform(5.0, 600.0), 1),
+        "total_energy": round(rng.uniform(0.5, 60.0), 1),
+        "packaging_type": rng.choice(PACKAGING),
+        "transport_km": rng.randint(10, 2000),
+        "has_bio_label": rng.randint(0, 1),
+    })
+
+
+# ============ LCA ============
+
+async def calculate_lca(client, context):
+    rng = context["random"]
+    ingredients = [{"name": name, "quantity_kg": round(rng.uniform(0.01, 0.5), 3)}
+                   for name in rng.sample(KNOWN_INGREDIENTS, rng.randint(2, 5))]
+    # One request in four has an unknown ingredient (ML imputation path)
+    if rng.random() < 0.25:
+        ingredients.append({"name": rng.choice(UNKNOWN_INGREDIENTS), "quantity_kg": 0.1})
+    return await client.post("/lca/calc", json={
+        "product_name": product_name(rng),
+        "ingredients": ingredients,
+        "packaging": {"material": rng.choice(PACKAGING), "weight_kg": round(rng.uniform(0.02, 0.5), 3)},
+        "transport": {"distance_km": rng.randint(10, 2000), "mode": "truck"},
+    })
+
+
+# ============ WIDGET ============
+
+async def widget_setup(client) -> dict:
+    response = await client.get("/public/products", params={"limit": 100})
+    names = [item["product_name"] for item in response.json().get("items", [])] if response.is_success else []
+    if not names:
+        raise SetupError("widget-api has no scored product: run the scoring scenario first")
+    return {"names": names}
+
+
+async def widget_product(client, context):
+    return await client.get(f"/public/product/{context['random'].choice(context['names'])}")
+
+
+async def widget_lookup(client, context):
+    names = context["random"].sample(context["names"], min(LOOKUP_SIZE, len(context["names"])))
+    return await client.post("/public/products/lookup", json={"names": names})
+
+
+async def widget_list(client, context):
+    return await client.get("/public/products", params={"limit": 20})
+
+
+# ============ PROVENANCE ============
+
+async def provenance_setup(client) -> dict:
+    response = await client.get("/provenance/history/scores", params={"limit": 100})
+    scores = response.json().get("scores", []) if response.is_success else []
+    if not scores:
+        raise SetupError("provenance sees no score: run the scoring scenario first")
+    return {"score_ids": [s["id"] for s in scores], "names": sorted({s["product_name"] for s in scores})}
+
+
+async def provenance_stats(client, context):
+    return await client.get("/provenance/stats")
+
+
+async def provenance_history(client, context):
+    return await client.get("/provenance/history/scores", params={"limit": 20})
+
+
+async def provenance_search(client, context):
+    return await client.get(f"/provenance/search/{context['random'].choice(context['names'])}")
+
+
+async def provenance_score(client, context):
+    return await client.get(f"/provenance/{context['random'].choice(context['score_ids'])}")
+
+
+SCENARIOS = {
+    "scoring": Scenario(
+        "scoring", "scoring",
+        steps={"GET /health": scoring_health, "POST /score/compute": compute_score},
+        users=10, iterations=100, ramp_up_s=10,
+        slo=SLO(p50_ms=200, p95_ms=1000, p99_ms=2000, mean_ms=500, min_rps=50, max_error_rate=0.01),
+    ),
+    "lca": Scenario(
+        "lca", "lca-lite",
+        steps={"POST /lca/calc": calculate_lca},
+        users=5, iterations=50, ramp_up_s=5,
+        slo=SLO(p50_ms=300, p95_ms=1000, p99_ms=2000, mean_ms=500, min_rps=20, max_error_rate=0.01),
+    ),
+    "widget": Scenario(
+        "widget", "widget-api",
+        steps={"GET /public/product/{name}": widget_product, "POST /public/products/lookup": widget_lookup,
+               "GET /public/products": widget_list},
+        users=10, iterations=100, ramp_up_s=5, setup=widget_setup,
+        slo=SLO(p50_ms=100, p95_ms=500, p99_ms=1000, mean_ms=250, min_rps=50, max_error_rate=0.01),
+    ),
+    "provenance": Scenario(
+        "provenance", "provenance",
+        steps={"GET /provenance/stats": provenance_stats, "GET /provenance/history/scores": provenance_history,
+               "GET /provenance/search/{name}": provenance_search, "GET /provenance/{score_id}": provenance_score},
+        users=5, iterations=50, ramp_up_s=5, setup=provenance_setup,
+        slo=SLO(p50_ms=200, p95_ms=1000, p99_ms=2000, mean_ms=500, min_rps=20, max_error_rate=0.01),
+    ),
+}
@@ -0,0 +1,54 @@
+"""
+Clients of the load-tested services
+
+    compose     HTTP to the running stack (docker-compose ports, overridable:
+                SCORING_URL, LCA_URL, WIDGET_URL, PROVENANCE_URL)
+    inprocess   the service's FastAPI app in this process through ASGITransport,
+                startup handlers run; the database comes from the DB_* variables
+                and lca-lite reports go to an in-memory object store
+"""
+
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# From the repository root, the ecolabel_common/ project folder would shadow the package
+sys.path.insert(0, os.path.join(ROOT, "ecolabel_common"))
+
+from ecolabel_common.testing import MemoryObjectStore, load_service
+
+SERVICE_URLS = {
+    "scoring": os.getenv("SCORING_URL", "http://localhost:8004"),
+    "lca-lite": os.getenv("LCA_URL", "http://localhost:8003"),
+    "widget-api": os.getenv("WIDGET_URL", "http://localhost:8005"),
+    "provenance": os.getenv("PROVENANCE_URL", "http://localhost:8007"),
+}
+
+TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+# Above the largest scenario's user count: users never wait for a connection
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+
+
+@asynccontextmanager
+async def compose_client(service: str):
+    async with httpx.AsyncClient(base_url=SERVICE_URLS[service], timeout=TIMEOUT, limits=LIMITS) as client:
+        yield client
+
+
+@asynccontextmanager
+async def inprocess_client(service: str):
+    main = load_service(service)
+    if hasattr(main, "minio_client"):
+        main.minio_client = MemoryObjectStore()
+    app = main.app
+    async with app.router.lifespan_context(app):
+        # Unhandled errors become 500 responses, as behind uvicorn
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url=f"http://{service}", timeout=TIMEOUT) as client:
+            yield client
+
+
+TARGETS = {"compose": compose_client, "inprocess": inprocess_client}
@@ -0,0 +1,130 @@
+"""
+Tests unitaires du harnais de charge
+EcoLabel-MS - Tests avec pytest (application ASGI factice, sans services)
+"""
+
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi import FastAPI, Response
+
+from loadtest.runner import SLO, Scenario, SetupError, format_report, run_scenario
+
+
+def fake_app():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    @app.post("/score/compute")
+    def compute(payload: dict):
+        return {"score_letter": "B", "product_name": payload["product_name"]}
+
+    @app.get("/flaky")
+    def flaky(response: Response):
+        app.state.calls += 1
+        if app.state.calls % 2 == 0:
+            response.status_code = 500
+        return {}
+
+    @app.get("/public/products")
+    def products(limit: int = 20):
+        return {"count": 0, "items": [], "next_cursor": None}
+
+    return app
+
+
+@asynccontextmanager
+async def asgi_client(service: str = "fake"):
+    transport = httpx.ASGITransport(app=fake_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://fake") as client:
+        yield client
+
+
+async def health(client, context):
+    return await client.get("/health")
+
+
+async def flaky(client, context):
+    return await client.get("/flaky")
+
+
+async def run(scenario):
+    async with asgi_client() as client:
+        return await run_scenario(scenario, client)
+
+
+class TestRunner:
+    """Tests de la génération de charge et des statistiques"""
+
+    def test_report_counts_every_request(self):
+        import asyncio
+        scenario = Scenario("fake", "fake", steps={"GET /health": health}, users=3, iterations=10,
+                            ramp_up_s=0, slo=SLO(p99_ms=5000, max_error_rate=0))
+        report = asyncio.run(run(scenario))
+        assert report["passed"]
+        total = report["total"]
+        assert total["count"] == 30
+        assert total["statuses"] == {"200": 30}
+        assert total["p50_ms"] <= total["p95_ms"] <= total["p99_ms"] <= total["max_ms"]
+        assert total["rps"] > 0
+        assert "✓ SLO met" in format_report(report)
+
+    def test_errors_breach_the_slo(self):
+        """Test qu'un taux d'erreur au-dessus du seuil fait échouer le scénario"""
+        import asyncio
+        scenario = Scenario("fake", "fake", steps={"GET /flaky": flaky}, users=2, iterations=10,
+                            ramp_up_s=0, slo=SLO(max_error_rate=0.01))
+        report = asyncio.run(run(scenario))
+        assert not report["passed"]
+        assert report["steps"]["GET /flaky"]["statuses"] == {"200": 10, "500": 10}
+        assert report["breaches"] == ["error_rate 0.5 > 0.01"]
+
+    def test_slo_thresholds(self):
+        summary = {"count": 100, "p50_ms": 40, "p95_ms": 300, "p99_ms": 900, "mean_ms": 60,
+                   "rps": 30, "error_rate": 0.0}
+        slo = SLO(p50_ms=50, p95_ms=250, p99_ms=1000, min_rps=50)
+        assert slo.check(summary) == ["p95_ms 300 > 250", "rps 30 < 50"]
+        assert slo.override(p95_ms=500, min_rps=20).check(summary) == []
+        assert SLO().check({"count": 0}) == ["no request completed"]
+
+
+class TestCli:
+    """Tests de python -m loadtest (cible remplacée par l'application factice)"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        from loadtest import targets
+        monkeypatch.setitem(targets.TARGETS, "compose", asgi_client)
+
+    def test_scoring_scenario_meets_slo(self, tmp_path):
+        from loadtest.__main__ import main
+        report_path = tmp_path / "report.json"
+        code = main(["scoring", "--users", "2", "--iterations", "5", "--ramp-up", "0",
+                     "--min-rps", "0", "--report", str(report_path)])
+        assert code == 0
+        report = json.loads(report_path.read_text())[0]
+        assert report["steps"]["POST /score/compute"]["count"] == 10
+        assert report["slo"]["min_rps"] == 0
+
+    def test_breach_fails_the_run(self):
+        from loadtest.__main__ import main
+        assert main(["scoring", "--users", "1", "--iterations", "2", "--ramp-up", "0", "--p50-ms", "0"]) == 1
+
+    def test_missing_data_fails_the_run(self, tmp_path):
+        """Test que le scénario widget échoue sans produit scoré (SetupError)"""
+        from loadtest.__main__ import main
+        report_path = tmp_path / "report.json"
+        assert main(["widget", "--report", str(report_path)]) == 1
+        report = json.loads(report_path.read_text())[0]
+        assert report["breaches"][0].startswith("setup: widget-api has no scored product")
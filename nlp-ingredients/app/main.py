@@ -5,20 +5,27 @@ from transformers import pipeline
 import json
 from contextlib import asynccontextmanager
 
-from app.database import SessionLocal, engine
+from app.database import SessionLocal, engine, get_db
+from ecolabel_common import instrument
+from ecolabel_common.metrics import time_inference
+from ecolabel_common.tracing import span
 from app.models import Base, IngredientTaxonomy, ExtractionLog
+from ecolabel_common.events import EVENTS_ENABLED, EventBus
+from ecolabel_common.extract import DEFAULT_INGREDIENT_KG, extract_sheet, ingredient_key
 
 # NLP Pipeline
 ner_pipeline = None
+event_bus = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load model on startup
-    global ner_pipeline
+    global ner_pipeline, event_bus
     print("Loading NLP Model...")
     try:
         # Use a multilingual NER model
-        ner_pipeline = pipeline("ner", model="Davlan/bert-base-multilingual-cased-ner-hrl", aggregation_strategy="simple")
+        with span("model.load", model="ner"):
+            ner_pipeline = pipeline("ner", model="Davlan/bert-base-multilingual-cased-ner-hrl", aggregation_strategy="simple")
         print("NLP Model loaded.")
     except Exception as e:
         print(f"Error loading model: {e}")
@@ -29,9 +36,17 @@ async def lifespan(app: FastAPI):
         print("Tables created.")
     except Exception as e:
         print(f"DB Error: {e}")
-        
+
+    if EVENTS_ENABLED:
+        event_bus = EventBus()
+        # At most once per event (extraction log included)
+        event_bus.subscribe("product.parsed", "nlp-ingredients", extraction_event,
+                            publish_to="ingredients.extracted", sessions=SessionLocal)
+        await event_bus.start()
+
     yield
-    pass
+    if event_bus is not None:
+        await event_bus.stop()
 
 app = FastAPI(title="NLPIngredients", lifespan=lifespan)
 
@@ -44,17 +59,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+instrument(app, "nlp-ingredients", {"primary": engine})
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "nlp-ingredients"}
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class IdentificationRequest(BaseModel):
     text: str
 
@@ -67,14 +77,10 @@ class IdentificationResponse(BaseModel):
     entities: list[Entity]
     normalized_ingredients: list[str]
 
-@app.post("/nlp/extract", response_model=IdentificationResponse)
-def extract_entities(request: IdentificationRequest, db: Session = Depends(get_db)):
-    if not ner_pipeline:
-        raise HTTPException(status_code=503, detail="NLP model not loaded")
-    
-    text = request.text
+def run_ner(text: str, db: Session) -> IdentificationResponse:
     # BERT NER extraction
-    results = ner_pipeline(text)
+    with time_inference("ner"):
+        results = ner_pipeline(text)
     
     # Format entities
     entities = []
@@ -96,6 +102,44 @@ def extract_entities(request: IdentificationRequest, db: Session = Depends(get_d
     
     return IdentificationResponse(entities=entities, normalized_ingredients=ingredients)
 
+@app.post("/nlp/extract", response_model=IdentificationResponse)
+def extract_entities(request: IdentificationRequest, db: Session = Depends(get_db)):
+    if not ner_pipeline:
+        raise HTTPException(status_code=503, detail="NLP model not loaded")
+    return run_ner(request.text, db)
+
+# Events: product.parsed -> ingredients.extracted
+def extraction_event(event: dict, db: Session):
+    """
+    Ingredients, packaging, transport and labels of a parsed product, for lca-lite.
+    Listed ingredients come from the sheet, NER is the fallback (like the orchestrator).
+    """
+    text = event["raw_text"]
+    sheet = extract_sheet(text)
+    normalized = []
+    if ner_pipeline:
+        normalized = run_ner(text, db).normalized_ingredients
+    ingredients, source = sheet["ingredients"], "sheet"
+    if not ingredients:
+        ingredients = [{"name": ingredient_key(name), "quantity_kg": DEFAULT_INGREDIENT_KG} for name in normalized]
+        source = "nlp"
+    if not ingredients:
+        print(f"[{event.get('correlation_id')}] ✗ product {event.get('product_id')}: no ingredients found")
+        return None
+    return {
+        "correlation_id": event.get("correlation_id"),
+        "product_id": event.get("product_id"),
+        "gtin": event.get("gtin"),
+        "product_name": sheet["product_name"] or "Produit",
+        "ingredients": ingredients,
+        "ingredients_source": source,
+        "normalized_ingredients": normalized,
+        "packaging": sheet["packaging"],
+        "transport": sheet["transport"],
+        "has_bio_label": sheet["has_bio_label"],
+        "has_recyclable": sheet["has_recyclable"],
+    }
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -153,5 +153,41 @@ class TestBioLabels:
         assert response.status_code == 200
 
 
+class TestEvents:
+    """Tests du mode événementiel : product.parsed -> ingredients.extracted"""
+
+    FICHE = """FICHE PRODUIT - Sauce Tomate Bio
+
+INGRÉDIENTS:
+- Tomates bio italiennes (92%)
+- Sel de mer
+
+EMBALLAGE:
+- Matériau: Verre recyclable
+- Poids: 720g
+"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        import app.main as main
+        # Extraction à partir de la fiche seule, sans modèle NER
+        monkeypatch.setattr(main, "ner_pipeline", None)
+        self.main = main
+
+    def test_extraction_event_from_sheet(self):
+        event = {"correlation_id": "evt-1", "product_id": 3, "gtin": None, "raw_text": self.FICHE}
+        extracted = self.main.extraction_event(event, db=None)
+        assert extracted["correlation_id"] == "evt-1"
+        assert extracted["product_id"] == 3
+        assert extracted["product_name"] == "Sauce Tomate Bio"
+        assert extracted["ingredients_source"] == "sheet"
+        assert extracted["ingredients"][0] == {"name": "tomates_bio_italiennes", "quantity_kg": 0.92}
+        assert extracted["packaging"] == {"material": "glass", "weight_kg": 0.72}
+
+    def test_no_ingredients_publishes_nothing(self):
+        event = {"correlation_id": "evt-2", "product_id": 4, "raw_text": "Texte sans liste"}
+        assert self.main.extraction_event(event, db=None) is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,255 @@
+"""
+Bulk catalogue runner
+Streams NDJSON product sheets through the pipeline with bounded concurrency
+
+    python -m app.batch catalogue.ndjson -o results.ndjson --concurrency 16
+
+Each input line is a /pipeline/run body ({"text": ..., "gtin": ..., ...}),
+optionally with an "id". Results are appended to the output file as they
+complete, one line per input line; that file is the checkpoint: a rerun with
+the same output skips the lines already recorded.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+from pydantic import ValidationError
+
+from app.pipeline import PipelineFailed, run_pipeline
+
+# Upper bounds (ms) of the per-stage latency histogram buckets
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+FSYNC_EVERY = 100
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.values = []
+
+    def add(self, ms: float):
+        self.values.append(ms)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        if not self.values:
+            return {"count": 0}
+        buckets = {}
+        for bound in BUCKETS_MS:
+            buckets[f"le_{bound}"] = sum(1 for v in self.values if v <= bound)
+        buckets["le_inf"] = len(self.values)
+        return {
+            "count": len(self.values),
+            "avg_ms": round(sum(self.values) / len(self.values), 2),
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(max(self.values), 2),
+            "buckets": buckets,
+        }
+
+
+class BatchStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.stages = {}
+
+    def record(self, stages: dict, timings: dict):
+        # Skipped stages did not run, their 0 ms would skew the histogram
+        for name, stage in stages.items():
+            if stage["status"] != "skipped":
+                self.stages.setdefault(name, LatencyHistogram()).add(stage["duration_ms"])
+        self.stages.setdefault("total", LatencyHistogram()).add(timings["total_ms"])
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        processed = self.ok + self.failed
+        return {
+            "processed": processed,
+            "ok": self.ok,
+            "failed": self.failed,
+            "skipped_from_checkpoint": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "items_per_s": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+            "stages": {name: hist.summary() for name, hist in self.stages.items()},
+        }
+
+
+def load_checkpoint(output_path: str, retry_failed: bool = False) -> set:
+    """
+    Input line numbers already recorded in the output file.
+
+    A line cut short by a crash is dropped from the file so appends stay
+    valid NDJSON; with ``retry_failed`` failed items are run again.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            if not raw.endswith(b"\n"):
+                break
+            valid_bytes += len(raw)
+            if record.get("status") == "ok" or not retry_failed:
+                done.add(record["line"])
+    if valid_bytes != os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+def read_inputs(input_path: str):
+    """(line number, raw line) for each non-blank input line, read lazily"""
+    with open(input_path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                yield number, line
+
+
+async def run_batch(client, services: dict, input_path: str, output_path: str,
+                    concurrency: int = 8, run_nlp: bool = True, run_parse: bool = True,
+                    retry_failed: bool = False, progress_every: int = 0) -> dict:
+    """Run every input line not yet in the output through the pipeline, return the report"""
+    # Same validation as the HTTP endpoint
+    from app.main import PipelineRequest
+
+    stats = BatchStats()
+    done = load_checkpoint(output_path, retry_failed)
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    batch_id = uuid.uuid4().hex[:8]
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        written = 0
+
+        def write(record: dict):
+            nonlocal written
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            written += 1
+            if written % FSYNC_EVERY == 0:
+                os.fsync(out.fileno())
+            if progress_every and written % progress_every == 0:
+                report = stats.report()
+                print(f"… {report['processed']} items ({report['items_per_s']}/s), {report['failed']} failed")
+
+        async def process(number: int, line: str):
+            try:
+                record = {"line": number}
+                try:
+                    payload = json.loads(line)
+                    if not isinstance(payload, dict):
+                        raise ValueError(f"expected a JSON object, got {type(payload).__name__}")
+                    record["id"] = payload.pop("id", None)
+                    request = PipelineRequest.model_validate(payload).model_dump(exclude_none=True)
+                except (ValueError, ValidationError) as e:
+                    stats.failed += 1
+                    write({**record, "status": "error", "error": f"invalid input: {e}"})
+                    return
+                correlation_id = f"batch-{batch_id}-{number}"
+                try:
+                    result = await run_pipeline(client, services, request, correlation_id,
+                                                run_nlp=run_nlp, run_parse=run_parse)
+                except PipelineFailed as e:
+                    body = e.body()
+                    stats.failed += 1
+                    stats.record(body["stages"], body["timings"])
+                    write({**record, "status": "error", **body})
+                    return
+                except Exception as e:
+                    # A bug or an unexpected error on one item must not abort the whole catalogue
+                    stats.failed += 1
+                    write({**record, "status": "error", "correlation_id": correlation_id,
+                           "error": f"{type(e).__name__}: {e}"})
+                    return
+                stats.ok += 1
+                stats.record(result["stages"], result["timings"])
+                write({**record, "status": "ok", **result})
+            finally:
+                semaphore.release()
+
+        for number, line in read_inputs(input_path):
+            if number in done:
+                stats.skipped += 1
+                continue
+            # Blocks once `concurrency` items are in flight, so input is read no faster than processed
+            await semaphore.acquire()
+            task = asyncio.create_task(process(number, line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        os.fsync(out.fileno())
+
+    return stats.report()
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Processed {report['processed']} items in {report['elapsed_s']}s "
+        f"({report['items_per_s']} items/s): {report['ok']} ok, {report['failed']} failed, "
+        f"{report['skipped_from_checkpoint']} already done",
+        f"{'stage':<10}{'count':>7}{'avg':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)",
+    ]
+    for name, summary in report["stages"].items():
+        if not summary["count"]:
+            continue
+        lines.append(
+            f"{name:<10}{summary['count']:>7}{summary['avg_ms']:>10}{summary['p50_ms']:>10}"
+            f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary['max_ms']:>10}"
+        )
+    return "\n".join(lines)
+
+
+async def main_async(args) -> dict:
+    from app.main import SERVICES, build_client
+
+    client = build_client()
+    try:
+        return await run_batch(
+            client, SERVICES, args.input, args.output,
+            concurrency=args.concurrency, run_nlp=not args.no_nlp, run_parse=not args.no_parse,
+            retry_failed=args.retry_failed, progress_every=args.progress_every,
+        )
+    finally:
+        await client.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the EcoLabel pipeline over an NDJSON catalogue")
+    parser.add_argument("input", help="NDJSON file, one /pipeline/run body per line")
+    parser.add_argument("-o", "--output", required=True, help="NDJSON results, also used as checkpoint")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="products in flight (default 8)")
+    parser.add_argument("--no-nlp", action="store_true", help="skip the NLP stage")
+    parser.add_argument("--no-parse", action="store_true", help="do not archive the sheets with the parser")
+    parser.add_argument("--retry-failed", action="store_true", help="rerun items recorded as failed")
+    parser.add_argument("--progress-every", type=int, default=100, help="progress line every N items (0 = off)")
+    parser.add_argument("--report", help="also write the final report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Orchestrator - EcoLabel-MS
+Runs parse -> NLP -> LCA -> scoring server-side in one call
+"""
+
+from fastapi import FastAPI, Header, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import httpx
+import os
+import uuid
+
+from app.pipeline import CORRELATION_HEADER, PipelineFailed, run_pipeline
+from ecolabel_common import instrument
+
+app = FastAPI(
+    title="Orchestrator",
+    description="""
+    Orchestration du pipeline EcoLabel côté serveur.
+
+    ## Fonctionnalités
+    - Parsing, NLP, ACV et scoring en un seul appel
+    - Étapes indépendantes exécutées en parallèle
+    - Identifiant de corrélation propagé aux microservices
+    - Durée de chaque étape dans la réponse
+    """,
+    version="1.0.0"
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=[CORRELATION_HEADER],
+)
+
+instrument(app, "orchestrator")
+
+# ============ CONFIGURATION ============
+
+SERVICES = {
+    "parser": os.getenv("PARSER_URL", "http://parser-produit:8000"),
+    "nlp": os.getenv("NLP_URL", "http://nlp-ingredients:8000"),
+    "lca": os.getenv("LCA_URL", "http://lca-lite:8000"),
+    "scoring": os.getenv("SCORING_URL", "http://scoring:8000"),
+}
+
+# One keep-alive pool shared by all requests (connections are reused across calls)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+# NLP model inference dominates, hence the generous read timeout
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        transport=transport,
+    )
+
+
+@app.on_event("startup")
+async def startup():
+    global http_client
+    http_client = build_client()
+    print(f"✓ Orchestrator ready: {SERVICES}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if http_client is not None:
+        await http_client.aclose()
+
+
+# ============ SCHEMAS ============
+
+class IngredientInput(BaseModel):
+    name: str
+    quantity_kg: float
+
+
+class PackagingInput(BaseModel):
+    material: str
+    weight_kg: float
+
+
+class TransportInput(BaseModel):
+    distance_km: float
+    mode: str
+
+
+class PipelineRequest(BaseModel):
+    text: str = Field(min_length=1)  # product sheet, as sent to the parser
+    gtin: Optional[str] = None
+    # Optional overrides of what is extracted from the text
+    product_name: Optional[str] = None
+    ingredients: Optional[List[IngredientInput]] = None
+    packaging: Optional[PackagingInput] = None
+    transport: Optional[TransportInput] = None
+    category: Optional[str] = None
+
+
+# ============ API ENDPOINTS ============
+
+@app.get("/health")
+def health_check():
+    return {
+        "status": "healthy",
+        "service": "orchestrator",
+        "services": SERVICES,
+        "version": "1.0.0"
+    }
+
+
+@app.post("/pipeline/run")
+async def pipeline_run(
+    request: PipelineRequest,
+    response: Response,
+    nlp: bool = True,
+    x_correlation_id: Optional[str] = Header(default=None)
+):
+    """Parse, extract, compute the LCA and the score of one product sheet"""
+    correlation_id = x_correlation_id or str(uuid.uuid4())
+    response.headers[CORRELATION_HEADER] = correlation_id
+    try:
+        result = await run_pipeline(
+            http_client, SERVICES, request.model_dump(exclude_none=True), correlation_id, run_nlp=nlp
+        )
+    except PipelineFailed as e:
+        print(f"[{correlation_id}] ✗ pipeline failed at {e.error.stage}: {e.error.detail}")
+        return JSONResponse(status_code=502, content=e.body(), headers={CORRELATION_HEADER: correlation_id})
+
+    print(f"[{correlation_id}] ✓ pipeline {result['product_name']}: {result['timings']}")
+    return result
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,216 @@
+"""
+Server-side product pipeline: parse + NLP (in parallel) -> LCA -> scoring
+Each stage is timed and its outcome recorded, downstream calls carry the correlation id
+"""
+
+import asyncio
+import time
+
+import httpx
+
+from ecolabel_common.extract import DEFAULT_INGREDIENT_KG, extract_sheet, ingredient_key
+
+CORRELATION_HEADER = "X-Correlation-ID"
+
+
+class StageError(Exception):
+    """A required stage failed; the pipeline stops there"""
+
+    def __init__(self, stage: str, detail: str):
+        super().__init__(f"{stage}: {detail}")
+        self.stage = stage
+        self.detail = detail
+
+
+class PipelineRun:
+    """Stage results and timings of one /pipeline/run call"""
+
+    def __init__(self, correlation_id: str):
+        self.correlation_id = correlation_id
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    async def stage(self, name: str, call, required: bool = True):
+        """Run ``call()`` as stage ``name``; optional stages record their error and return None"""
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except (httpx.HTTPError, StageError, ValueError, KeyError, TypeError) as e:
+            detail = describe_error(e)
+            self.stages[name] = {"status": "error", "duration_ms": elapsed_ms(started), "error": detail}
+            if required:
+                raise StageError(name, detail)
+            return None
+        self.stages[name] = {"status": "ok", "duration_ms": elapsed_ms(started)}
+        return result
+
+    def skip(self, name: str, reason: str):
+        self.stages[name] = {"status": "skipped", "duration_ms": 0.0, "reason": reason}
+
+    def timings(self) -> dict:
+        return {
+            "total_ms": elapsed_ms(self.started),
+            "stages": {name: stage["duration_ms"] for name, stage in self.stages.items()},
+        }
+
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def describe_error(error: Exception) -> str:
+    if isinstance(error, StageError):
+        return error.detail
+    if isinstance(error, httpx.HTTPError):
+        return describe_http_error(error)
+    if isinstance(error, KeyError):
+        return f"malformed response: missing {error}"
+    if isinstance(error, TypeError):
+        return f"malformed response: {error}"
+    # response.json() on a body that is not JSON (proxy error page, truncated response)
+    return f"invalid JSON response: {error}"
+
+
+def describe_http_error(error: httpx.HTTPError) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code} from {error.request.url}: {error.response.text[:200]}"
+    try:
+        return f"{type(error).__name__} calling {error.request.url}"
+    except RuntimeError:  # no request attached
+        return f"{type(error).__name__}: {error}"
+
+
+async def post_json(client: httpx.AsyncClient, url: str, run: PipelineRun, **kwargs) -> dict:
+    response = await client.post(url, headers={CORRELATION_HEADER: run.correlation_id}, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def run_pipeline(client: httpx.AsyncClient, services: dict, request: dict,
+                       correlation_id: str, run_nlp: bool = True, run_parse: bool = True) -> dict:
+    """
+    Run the chain for one product sheet and return the combined result.
+
+    ``services`` maps parser/nlp/lca/scoring to base URLs. Parsing (which
+    archives the raw sheet) and NLP only need the text, so they start at once
+    and run alongside LCA and scoring; LCA waits for NLP only when neither the
+    request nor the sheet lists the ingredients. Raises PipelineFailed when
+    LCA or scoring fails, with the stages run so far.
+    """
+    run = PipelineRun(correlation_id)
+    text = request["text"]
+    sheet = extract_sheet(text)
+
+    async def parse():
+        files = {"files": ("product.txt", text.encode("utf-8"), "text/plain")}
+        # The orchestrator drives LCA and scoring itself: no product.parsed event
+        data = {"publish": "false"}
+        if request.get("gtin"):
+            data["gtin"] = request["gtin"]
+        parsed = await post_json(client, f"{services['parser']}/product/parse", run, files=files, data=data)
+        return parsed[0]["id"] if parsed else None
+
+    async def nlp():
+        result = await post_json(client, f"{services['nlp']}/nlp/extract", run, json={"text": text})
+        # Read once the stage is over: a malformed body must fail this stage, not the request
+        if not isinstance(result["normalized_ingredients"], list):
+            raise TypeError("normalized_ingredients is not a list")
+        return result
+
+    async def lca_stage():
+        lca = await post_json(client, f"{services['lca']}/lca/calc", run, json=lca_payload)
+        # Fields forwarded to scoring, read inside the stage for the same reason
+        totals = {"total_co2": lca["total_co2_kg"], "total_water": lca["total_water_l"],
+                  "total_energy": lca["total_energy_mj"], "lca_result_id": lca.get("lca_result_id")}
+        return lca, totals
+
+    # ---- Parse + NLP: optional, started immediately ----
+    parse_task = None
+    if run_parse:
+        parse_task = asyncio.create_task(run.stage("parse", parse, required=False))
+    else:
+        run.skip("parse", "disabled")
+    nlp_task = None
+    if run_nlp:
+        nlp_task = asyncio.create_task(run.stage("nlp", nlp, required=False))
+    else:
+        run.skip("nlp", "disabled")
+
+    try:
+        # ---- Ingredients: request > product sheet > NLP ----
+        ingredients, ingredients_source = request.get("ingredients"), "request"
+        if not ingredients and sheet["ingredients"]:
+            ingredients, ingredients_source = sheet["ingredients"], "sheet"
+        if not ingredients and nlp_task is not None:
+            nlp_result = await nlp_task
+            if nlp_result and nlp_result.get("normalized_ingredients"):
+                ingredients = [
+                    {"name": ingredient_key(name), "quantity_kg": DEFAULT_INGREDIENT_KG}
+                    for name in nlp_result["normalized_ingredients"]
+                ]
+                ingredients_source = "nlp"
+        if not ingredients:
+            run.stages["lca"] = {"status": "error", "duration_ms": 0.0, "error": "no ingredients found"}
+            raise StageError("lca", "no ingredients found in the request, the product sheet or NLP")
+
+        name = request.get("product_name") or sheet["product_name"] or "Produit"
+        packaging = request.get("packaging") or sheet["packaging"]
+        transport = request.get("transport") or sheet["transport"]
+
+        # ---- LCA ----
+        lca_payload = {"product_name": name, "ingredients": ingredients,
+                       "packaging": packaging, "transport": transport}
+        lca, totals = await run.stage("lca", lca_stage)
+
+        # ---- Scoring ----
+        score_payload = {
+            "product_name": name,
+            "total_co2": totals["total_co2"],
+            "total_water": totals["total_water"],
+            "total_energy": totals["total_energy"],
+            "packaging_type": packaging["material"],
+            "packaging_weight_kg": packaging["weight_kg"],
+            "transport_km": transport["distance_km"],
+            "has_bio_label": sheet["has_bio_label"],
+            "has_recyclable": sheet["has_recyclable"],
+            "category": request.get("category") or "processed",
+            "lca_result_id": totals["lca_result_id"],
+        }
+        score = await run.stage("scoring", lambda: post_json(client, f"{services['scoring']}/score/compute", run, json=score_payload))
+    except StageError as e:
+        await asyncio.gather(*[task for task in (parse_task, nlp_task) if task], return_exceptions=True)
+        raise PipelineFailed(run, e)
+
+    parsed_product_id = await parse_task if parse_task is not None else None
+    nlp_result = await nlp_task if nlp_task is not None else None
+
+    return {
+        "correlation_id": correlation_id,
+        "product_name": name,
+        "parsed_product_id": parsed_product_id,
+        "ingredients": ingredients,
+        "ingredients_source": ingredients_source,
+        "nlp": nlp_result,
+        "lca": lca,
+        "score": score,
+        "stages": run.stages,
+        "timings": run.timings(),
+    }
+
+
+class PipelineFailed(Exception):
+    """Raised by run_pipeline with the stages completed so far"""
+
+    def __init__(self, run: PipelineRun, error: StageError):
+        super().__init__(str(error))
+        self.run = run
+        self.error = error
+
+    def body(self) -> dict:
+        return {
+            "correlation_id": self.run.correlation_id,
+            "failed_stage": self.error.stage,
+            "detail": self.error.detail,
+            "stages": self.run.stages,
+            "timings": self.run.timings(),
+        }
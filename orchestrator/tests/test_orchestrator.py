@@ -0,0 +1,371 @@
+"""
+Tests Unitaires pour le microservice Orchestrator
+EcoLabel-MS - Tests avec pytest
+"""
+
+import pytest
+import sys
+import os
+import json
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi.testclient import TestClient
+
+FICHE = """FICHE PRODUIT - Sauce Tomate Bio Basilic
+
+INGRÉDIENTS:
+- Tomates bio italiennes (92%)
+- Basilic frais (5%)
+- Sel de mer
+
+EMBALLAGE:
+- Matériau: Verre recyclable
+- Poids: 720g
+
+LABELS:
+- Agriculture Biologique (AB)
+
+TRANSPORT:
+- Distance: 800 km
+- Mode: Camion réfrigéré
+"""
+
+
+class FakeServices:
+    """Microservices simulés : enregistre les appels reçus"""
+
+    def __init__(self, delays=None, failures=(), invalid=(), malformed=()):
+        self.calls = []
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.invalid = set(invalid)
+        self.malformed = set(malformed)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        service = request.url.host
+        self.calls.append((service, request))
+        await asyncio.sleep(self.delays.get(service, 0))
+        if service in self.failures:
+            return httpx.Response(503, json={"detail": f"{service} down"})
+        if service in self.invalid:
+            return httpx.Response(200, text="<html>Bad Gateway</html>")
+        if service in self.malformed:
+            return httpx.Response(200, json={"status": "ok"})
+        if service == "parser":
+            return httpx.Response(200, json=[{"id": 7, "gtin": None, "raw_text": "..."}])
+        if service == "nlp":
+            return httpx.Response(200, json={"entities": [], "normalized_ingredients": ["tomate", "sel"]})
+        if service == "lca":
+            body = json.loads(request.content)
+            return httpx.Response(200, json={
+                "lca_result_id": 11, "product_name": body["product_name"],
+                "total_co2_kg": 1.2, "total_water_l": 40.0, "total_energy_mj": 3.0,
+                "ml_imputation_used": False, "breakdown": {}
+            })
+        body = json.loads(request.content)
+        return httpx.Response(200, json={
+            "score_id": 21, "lca_result_id": body["lca_result_id"], "product_name": body["product_name"],
+            "score_numerical": 82.0, "score_letter": "A", "confidence": 0.9
+        })
+
+    def payload(self, service):
+        return json.loads(next(r for s, r in self.calls if s == service).content)
+
+
+@pytest.fixture
+def services(monkeypatch):
+    import app.main as main
+    fake = FakeServices()
+    monkeypatch.setattr(main, "SERVICES", {name: f"http://{name}" for name in ("parser", "nlp", "lca", "scoring")})
+    monkeypatch.setattr(main, "http_client", main.build_client(transport=httpx.MockTransport(fake)))
+    return main, fake
+
+
+class TestOrchestratorAPI:
+    """Tests pour l'API Orchestrator"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, services):
+        self.main, self.fake = services
+        self.client = TestClient(self.main.app)
+
+    def test_health_endpoint(self):
+        response = self.client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["status"] == "healthy"
+
+    def test_pipeline_run(self):
+        """Test du pipeline complet en un appel"""
+        response = self.client.post("/pipeline/run", json={"text": FICHE})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["product_name"] == "Sauce Tomate Bio Basilic"
+        assert data["parsed_product_id"] == 7
+        assert data["ingredients_source"] == "sheet"
+        assert data["score"]["score_letter"] == "A"
+        assert set(data["stages"]) == {"parse", "nlp", "lca", "scoring"}
+        assert all(stage["status"] == "ok" for stage in data["stages"].values())
+        assert set(data["timings"]["stages"]) == {"parse", "nlp", "lca", "scoring"}
+
+    def test_payloads_sent_downstream(self):
+        self.client.post("/pipeline/run", json={"text": FICHE})
+        lca = self.fake.payload("lca")
+        assert lca["ingredients"][0] == {"name": "tomates_bio_italiennes", "quantity_kg": 0.92}
+        assert lca["packaging"] == {"material": "glass", "weight_kg": 0.72}
+        assert lca["transport"]["distance_km"] == 800
+        parse = next(r for s, r in self.fake.calls if s == "parser")
+        assert b'name="publish"\r\n\r\nfalse' in parse.content
+        score = self.fake.payload("scoring")
+        assert score["lca_result_id"] == 11
+        assert score["has_bio_label"] == 1
+        assert score["total_co2"] == 1.2
+
+    def test_correlation_id_propagated(self):
+        """Test de la propagation de l'identifiant de corrélation"""
+        response = self.client.post("/pipeline/run", json={"text": FICHE}, headers={"X-Correlation-ID": "abc-123"})
+        assert response.headers["X-Correlation-ID"] == "abc-123"
+        assert response.json()["correlation_id"] == "abc-123"
+        assert {r.headers["X-Correlation-ID"] for _, r in self.fake.calls} == {"abc-123"}
+
+        generated = self.client.post("/pipeline/run", json={"text": FICHE}).headers["X-Correlation-ID"]
+        assert generated and generated != "abc-123"
+
+    def test_request_overrides_sheet(self):
+        payload = {
+            "text": FICHE, "product_name": "Sauce Maison",
+            "ingredients": [{"name": "tomato", "quantity_kg": 0.5}],
+            "packaging": {"material": "paper", "weight_kg": 0.1}
+        }
+        data = self.client.post("/pipeline/run?nlp=false", json=payload).json()
+        assert data["ingredients_source"] == "request"
+        assert data["stages"]["nlp"]["status"] == "skipped"
+        assert self.fake.payload("lca")["packaging"]["material"] == "paper"
+        assert "nlp" not in {s for s, _ in self.fake.calls}
+
+
+class TestPipelineStages:
+    """Tests du parallélisme et de la gestion des erreurs par étape"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, services):
+        self.main, self.fake = services
+        self.client = TestClient(self.main.app)
+
+    def test_parse_and_nlp_run_alongside_lca(self):
+        """Test que parsing et NLP ne retardent pas l'ACV quand la fiche liste les ingrédients"""
+        self.fake.delays = {"parser": 0.3, "nlp": 0.3}
+        data = self.client.post("/pipeline/run", json={"text": FICHE}).json()
+        # En séquence : au moins 600 ms
+        assert data["timings"]["total_ms"] < 500
+        assert data["stages"]["parse"]["duration_ms"] >= 300
+        assert data["stages"]["nlp"]["duration_ms"] >= 300
+
+    def test_nlp_ingredients_when_sheet_has_none(self):
+        data = self.client.post("/pipeline/run", json={"text": "Sauce tomate au sel"}).json()
+        assert data["ingredients_source"] == "nlp"
+        assert [i["name"] for i in self.fake.payload("lca")["ingredients"]] == ["tomate", "sel"]
+
+    def test_optional_stage_failure_is_reported(self):
+        """Test qu'une panne du parser n'empêche pas le scoring"""
+        self.fake.failures = {"parser"}
+        response = self.client.post("/pipeline/run", json={"text": FICHE})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["stages"]["parse"]["status"] == "error"
+        assert data["parsed_product_id"] is None
+        assert data["score"]["score_letter"] == "A"
+
+    def test_required_stage_failure_returns_502(self):
+        self.fake.failures = {"lca"}
+        response = self.client.post("/pipeline/run", json={"text": FICHE})
+        assert response.status_code == 502
+        data = response.json()
+        assert data["failed_stage"] == "lca"
+        assert "503" in data["detail"]
+        assert "scoring" not in data["stages"]
+
+    def test_invalid_json_is_a_stage_error(self):
+        """Test qu'une réponse 200 non JSON est une erreur d'étape, pas une erreur 500"""
+        self.fake.invalid = {"parser", "scoring"}
+        response = self.client.post("/pipeline/run", json={"text": FICHE})
+        assert response.status_code == 502
+        data = response.json()
+        assert data["failed_stage"] == "scoring"
+        assert data["detail"].startswith("invalid JSON response")
+        assert data["stages"]["parse"]["status"] == "error"
+
+    def test_malformed_response_is_a_stage_error(self):
+        """Test qu'une réponse 200 sans les champs attendus est une erreur d'étape, avec les durées"""
+        self.fake.malformed = {"parser", "lca"}
+        response = self.client.post("/pipeline/run", json={"text": FICHE})
+        assert response.status_code == 502
+        data = response.json()
+        assert data["failed_stage"] == "lca"
+        assert data["detail"] == "malformed response: missing 'total_co2_kg'"
+        assert data["stages"]["lca"]["duration_ms"] >= 0
+        assert data["stages"]["parse"]["error"].startswith("malformed response")
+        assert not any(service == "scoring" for service, _ in self.fake.calls)
+
+    def test_no_ingredients_anywhere(self):
+        self.fake.failures = {"nlp"}
+        response = self.client.post("/pipeline/run", json={"text": "Texte sans liste"})
+        assert response.status_code == 502
+        assert response.json()["failed_stage"] == "lca"
+
+
+class TestBatchRunner:
+    """Tests du traitement d'un catalogue NDJSON (concurrence bornée, reprise)"""
+
+    SERVICES = {name: f"http://{name}" for name in ("parser", "nlp", "lca", "scoring")}
+
+    def run(self, fake, input_path, output_path, **kwargs):
+        from app.batch import run_batch
+        import app.main as main
+
+        async def go():
+            client = main.build_client(transport=httpx.MockTransport(fake))
+            try:
+                return await run_batch(client, self.SERVICES, str(input_path), str(output_path), **kwargs)
+            finally:
+                await client.aclose()
+        return asyncio.run(go())
+
+    def write_catalogue(self, path, count, invalid_at=()):
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(1, count + 1):
+                if i in invalid_at:
+                    f.write('{"gtin": "sans texte"}\n')
+                else:
+                    f.write(json.dumps({"id": f"p{i}", "text": FICHE, "gtin": str(i)}) + "\n")
+
+    @staticmethod
+    def records(path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_batch_writes_one_result_per_line(self, tmp_path):
+        self.write_catalogue(tmp_path / "in.ndjson", 5, invalid_at={3})
+        report = self.run(FakeServices(), tmp_path / "in.ndjson", tmp_path / "out.ndjson", concurrency=2)
+        records = self.records(tmp_path / "out.ndjson")
+        assert sorted(r["line"] for r in records) == [1, 2, 3, 4, 5]
+        assert {r["line"]: r["status"] for r in records}[3] == "error"
+        assert {r["line"]: r["id"] for r in records}[1] == "p1"
+        assert report["ok"] == 4 and report["failed"] == 1
+        assert report["items_per_s"] > 0
+        assert report["stages"]["lca"]["count"] == 4
+        assert report["stages"]["total"]["buckets"]["le_inf"] == 4
+
+    def test_concurrency_is_bounded(self, tmp_path):
+        """Test que le nombre de fiches en cours ne dépasse pas la limite"""
+        in_flight, peak = 0, 0
+        fake = FakeServices()
+
+        async def counting(request):
+            nonlocal in_flight, peak
+            if request.url.host != "lca":
+                return await fake(request)
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.02)
+            try:
+                return await fake(request)
+            finally:
+                in_flight -= 1
+
+        self.write_catalogue(tmp_path / "in.ndjson", 12)
+        report = self.run(counting, tmp_path / "in.ndjson", tmp_path / "out.ndjson", concurrency=3, run_nlp=False)
+        assert report["ok"] == 12
+        assert 1 < peak <= 3
+        assert "nlp" not in report["stages"]
+
+    def test_resume_from_checkpoint(self, tmp_path):
+        """Test de la reprise après interruption : seules les lignes manquantes sont traitées"""
+        self.write_catalogue(tmp_path / "in.ndjson", 4)
+        out = tmp_path / "out.ndjson"
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"line": 1, "status": "ok"}) + "\n")
+            f.write(json.dumps({"line": 2, "status": "error"}) + "\n")
+            f.write('{"line": 3, "sta')  # écriture interrompue
+        fake = FakeServices()
+        report = self.run(fake, tmp_path / "in.ndjson", out)
+        assert report["skipped_from_checkpoint"] == 2
+        assert report["processed"] == 2
+        assert sorted(r["line"] for r in self.records(out)) == [1, 2, 3, 4]
+
+        report = self.run(fake, tmp_path / "in.ndjson", out, retry_failed=True)
+        assert report["processed"] == 1
+        assert report["skipped_from_checkpoint"] == 3
+
+    def test_failed_stage_recorded(self, tmp_path):
+        self.write_catalogue(tmp_path / "in.ndjson", 2)
+        report = self.run(FakeServices(failures={"scoring"}), tmp_path / "in.ndjson", tmp_path / "out.ndjson")
+        assert report["failed"] == 2
+        record = self.records(tmp_path / "out.ndjson")[0]
+        assert record["failed_stage"] == "scoring"
+        assert record["correlation_id"].startswith("batch-")
+
+    def test_non_object_line_recorded(self, tmp_path):
+        """Test qu'une ligne JSON valide mais qui n'est pas un objet est une entrée invalide"""
+        with open(tmp_path / "in.ndjson", "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": "p1", "text": FICHE}) + "\n")
+            f.write('[1, 2]\n"x"\n3\n')
+        report = self.run(FakeServices(), tmp_path / "in.ndjson", tmp_path / "out.ndjson")
+        assert report["ok"] == 1 and report["failed"] == 3
+        records = {r["line"]: r for r in self.records(tmp_path / "out.ndjson")}
+        assert records[1]["status"] == "ok"
+        for line in (2, 3, 4):
+            assert records[line]["status"] == "error"
+            assert records[line]["error"].startswith("invalid input: expected a JSON object")
+
+    def test_unexpected_error_recorded(self, tmp_path):
+        """Test qu'une exception inattendue sur une fiche n'interrompt pas le lot"""
+        fake = FakeServices()
+
+        async def broken(request):
+            if request.url.host == "lca" and json.loads(request.content)["product_name"] == "Cassé":
+                raise RuntimeError("unexpected")
+            return await fake(request)
+
+        with open(tmp_path / "in.ndjson", "w", encoding="utf-8") as f:
+            for i, name in enumerate(["Sauce", "Cassé", "Pesto"], start=1):
+                f.write(json.dumps({"id": f"p{i}", "text": FICHE, "product_name": name}) + "\n")
+        report = self.run(broken, tmp_path / "in.ndjson", tmp_path / "out.ndjson")
+        assert report["ok"] == 2 and report["failed"] == 1
+        records = {r["line"]: r for r in self.records(tmp_path / "out.ndjson")}
+        assert records[2]["status"] == "error"
+        assert records[2]["error"] == "RuntimeError: unexpected"
+        assert records[2]["id"] == "p2"
+        assert records[3]["status"] == "ok"
+
+
+class TestExtraction:
+    """Tests de l'extraction de la fiche produit (mêmes règles que le frontend)"""
+
+    def test_extract_sheet(self):
+        from ecolabel_common.extract import extract_sheet
+        sheet = extract_sheet(FICHE)
+        assert sheet["product_name"] == "Sauce Tomate Bio Basilic"
+        assert sheet["ingredients"] == [
+            {"name": "tomates_bio_italiennes", "quantity_kg": 0.92},
+            {"name": "basilic_frais", "quantity_kg": 0.05},
+            {"name": "sel_de_mer", "quantity_kg": 0.1},
+        ]
+        assert sheet["packaging"] == {"material": "glass", "weight_kg": 0.72}
+        assert sheet["transport"] == {"distance_km": 800.0, "mode": "truck"}
+        assert sheet["has_bio_label"] == 1
+        assert sheet["has_recyclable"] == 1
+
+    def test_defaults_without_sections(self):
+        from ecolabel_common.extract import extract_sheet
+        sheet = extract_sheet("Un produit")
+        assert sheet["product_name"] is None
+        assert sheet["ingredients"] == []
+        assert sheet["packaging"]["material"] == "plastic"
+        assert sheet["transport"]["distance_km"] == 250.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
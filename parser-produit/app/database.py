@@ -1,19 +1,11 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+from ecolabel_common import build_engine, database_url, session_dependency, session_factory
+from ecolabel_common.db import env
 
-# Use individual components to avoid URL encoding issues on Windows
-DB_USER = os.getenv("DB_USER", "eco")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "eco_pass")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "eco_db")
+# Unlike the other services, parser-produit defaults to a local server (uvicorn run without Docker)
+DATABASE_URL = database_url(host=env("DB_HOST", "localhost"))
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    connect_args={"options": "-c client_encoding=utf8"}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Pool, timeouts and query timing from ecolabel_common (DB_POOL_SIZE, DB_STATEMENT_TIMEOUT, ...);
+# the connections are UTF-8 whatever the client locale (Windows)
+engine = build_engine("parser-produit", DATABASE_URL)
+SessionLocal = session_factory(engine)
+get_db = session_dependency(SessionLocal)
@@ -1,12 +1,21 @@
-from fastapi import FastAPI, UploadFile, File, Form, Depends
+from fastapi import FastAPI, UploadFile, File, Form, Depends, Header
 from sqlalchemy.orm import Session
 import pytesseract
 from PIL import Image
 from bs4 import BeautifulSoup
 import sys
 import io
+import uuid
 from contextlib import asynccontextmanager
 
+from ecolabel_common import instrument
+from ecolabel_common.events import EVENTS_ENABLED, EventBus
+from ecolabel_common.metrics import track_engine
+from ecolabel_common.tracing import span
+
+# Publishes product.parsed when EVENTS_ENABLED, None otherwise (HTTP only)
+event_bus = None
+
 # Fix for Windows UTF-8 encoding issues with psycopg2
 if sys.platform == "win32":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -14,6 +23,7 @@ if sys.platform == "win32":
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global event_bus
     # Startup
     try:
         from app.database import SessionLocal, engine
@@ -23,9 +33,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Warning: Could not connect to database: {e}")
         print("The app will start but database operations will fail")
+    if EVENTS_ENABLED:
+        event_bus = EventBus()
+        await event_bus.start()
     yield
     # Shutdown
-    pass
+    if event_bus is not None:
+        await event_bus.stop()
 
 app = FastAPI(title="ParserProduit", lifespan=lifespan)
 
@@ -38,49 +52,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+instrument(app, "parser-produit")
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "parser-produit"}
 
 # Import after app creation to avoid issues
-from app.database import SessionLocal
+from app.database import SessionLocal, engine, get_db
 from app.models import ProductRaw
 from app.schemas import ProductParsed
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+track_engine("primary", engine)
+
+def extract_text(content: bytes, content_type: str, filename: str) -> tuple[str, str]:
+    """Raw text of an uploaded file and its source type (image OCR, HTML or plain text)"""
+    if content_type.startswith("image/"):
+        image = Image.open(io.BytesIO(content))
+        with span("ocr", filename=filename):
+            return pytesseract.image_to_string(image), "image"
+    if filename.endswith(".html"):
+        soup = BeautifulSoup(content, "html.parser")
+        return soup.get_text(separator="\n"), "html"
+    return content.decode(errors="ignore"), "pdf"
 
 @app.post("/product/parse", response_model=list[ProductParsed])
 async def parse_products(
     files: list[UploadFile] = File(...),
     gtin: str | None = Form(default=None),
+    # Clients running the rest of the chain themselves (orchestrator) send false
+    publish: bool = Form(default=True),
+    x_correlation_id: str | None = Header(default=None),
     db: Session = Depends(get_db),
 ):
+    correlation_id = x_correlation_id or str(uuid.uuid4())
     results = []
     for f in files:
         content = await f.read()
-        if f.content_type.startswith("image/"):
-            image = Image.open(io.BytesIO(content))
-            text = pytesseract.image_to_string(image)
-            source_type = "image"
-        elif f.filename.endswith(".html"):
-            soup = BeautifulSoup(content, "html.parser")
-            text = soup.get_text(separator="\n")
-            source_type = "html"
-        else:
-            text = content.decode(errors="ignore")
-            source_type = "pdf"
+        text, source_type = extract_text(content, f.content_type, f.filename)
         obj = ProductRaw(gtin=gtin, source_type=source_type, raw_text=text)
         db.add(obj)
         db.commit()
         db.refresh(obj)
         results.append(obj)
+        if event_bus is not None and publish:
+            await publish_parsed(obj, correlation_id)
     return results
 
+async def publish_parsed(product: ProductRaw, correlation_id: str):
+    """product.parsed starts the event pipeline; a broker outage never fails the upload"""
+    try:
+        await event_bus.publish("product.parsed", {
+            "correlation_id": correlation_id,
+            "product_id": product.id,
+            "gtin": product.gtin,
+            "raw_text": product.raw_text,
+        })
+    except Exception as e:
+        print(f"[{correlation_id}] ✗ product.parsed not published for product {product.id}: {e}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
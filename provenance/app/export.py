@@ -0,0 +1,96 @@
+"""
+Full audit export for /provenance/export/audit
+Every score with its LCA breakdown, streamed in id order as NDJSON or CSV
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text
+from app.rows import LCA_DETAIL_FIELDS, SCORE_FIELDS, columns, format_lca, format_score, stream_rows
+
+# Scores linked to their LCA by lca_result_id; older scores fall back to the
+# latest LCA with the same product name, as in the single-score audit (one
+# backward scan of ix_lca_results_name_id per score, see app/migrations.py). Ordered
+# by ascending id so an interrupted download resumes with after=<last id>.
+AUDIT_EXPORT_SQL = f"""
+    SELECT {columns(SCORE_FIELDS, "s.")}, s.lca_result_id,
+           {", ".join(f"l.{field} AS lca_{field}" for field in LCA_DETAIL_FIELDS)}
+    FROM product_scores s
+    LEFT JOIN lca_results l ON l.id = COALESCE(
+        s.lca_result_id,
+        (SELECT MAX(m.id) FROM lca_results m WHERE m.product_name = s.product_name)
+    )
+"""
+
+CSV_COLUMNS = [
+    "score_id", "product_name", "score_numerical", "score_letter", "confidence_level", "created_at",
+    "lca_link", "lca_id", "lca_total_co2", "lca_total_water", "lca_total_energy", "lca_created_at",
+    "lca_details",
+]
+
+
+def audit_query(after: Optional[int], since: Optional[datetime], until: Optional[datetime]):
+    conditions = []
+    params = {}
+    if after is not None:
+        conditions.append("s.id > :after")
+        params["after"] = after
+    if since is not None:
+        conditions.append("s.created_at >= :since")
+        params["since"] = since
+    if until is not None:
+        conditions.append("s.created_at < :until")
+        params["until"] = until
+    sql = AUDIT_EXPORT_SQL
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY s.id"
+    return text(sql), params
+
+
+def audit_record(row) -> dict:
+    """Score + LCA record for one exported row"""
+    lca = None
+    lca_link = None
+    if row["lca_id"] is not None:
+        lca_link = "exact" if row["lca_result_id"] is not None else "name_match"
+        lca = format_lca({field: row[f"lca_{field}"] for field in LCA_DETAIL_FIELDS}, with_details=True)
+    return {"score": format_score(row), "lca": lca, "lca_link": lca_link}
+
+
+def csv_row(record: dict) -> list:
+    score, lca = record["score"], record["lca"] or {}
+    return [
+        score["id"], score["product_name"], score["score_numerical"], score["score_letter"],
+        score["confidence_level"], score["created_at"], record["lca_link"],
+        lca.get("id"), lca.get("total_co2"), lca.get("total_water"), lca.get("total_energy"),
+        lca.get("created_at"), json.dumps(lca["details"]) if lca.get("details") is not None else None,
+    ]
+
+
+def stream_audit(conn, format: str = "ndjson", after: Optional[int] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Yield the export chunk by chunk, one chunk per batch of rows (``stream_rows``),
+    so memory stays bounded by the batch size whatever the table size.
+    """
+    query, params = audit_query(after, since, until)
+    batches = stream_rows(conn, query, params)
+
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        yield buffer.getvalue()
+        for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(csv_row(audit_record(row)) for row in batch)
+            yield buffer.getvalue()
+        return
+
+    for batch in batches:
+        yield "".join(json.dumps(audit_record(row)) + "\n" for row in batch)
@@ -0,0 +1,68 @@
+"""
+Score and LCA history for /provenance/history/*
+Keyset pagination on the primary key, created_at range filters, NDJSON export
+"""
+
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text
+from app.rows import LCA_FIELDS, SCORE_FIELDS, columns, format_lca, format_score, stream_rows
+
+# Row id order is insertion order, so "id < cursor" pages through history newest
+# first without OFFSET. since/until are served by the created_at indexes.
+HISTORY_TABLES = {
+    "scores": {"table": "product_scores", "fields": SCORE_FIELDS, "format": format_score},
+    "lca": {"table": "lca_results", "fields": LCA_FIELDS, "format": format_lca},
+}
+
+
+def history_query(kind: str, cursor: Optional[int], since: Optional[datetime],
+                  until: Optional[datetime], limit: Optional[int]):
+    """SELECT for one page (``limit``) or the whole range (``limit=None``), newest first"""
+    spec = HISTORY_TABLES[kind]
+    conditions = []
+    params = {}
+    if cursor is not None:
+        conditions.append("id < :cursor")
+        params["cursor"] = cursor
+    if since is not None:
+        conditions.append("created_at >= :since")
+        params["since"] = since
+    if until is not None:
+        conditions.append("created_at < :until")
+        params["until"] = until
+
+    sql = f"SELECT {columns(spec['fields'])} FROM {spec['table']}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY id DESC"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return text(sql), params
+
+
+def format_row(kind: str, row) -> dict:
+    return HISTORY_TABLES[kind]["format"](row)
+
+
+def history_page(conn, kind: str, limit: int, cursor: Optional[int] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """(items, next_cursor); next_cursor is None on the last page"""
+    query, params = history_query(kind, cursor, since, until, limit + 1)
+    rows = conn.execute(query, params).mappings().fetchall()
+    items = [format_row(kind, row) for row in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return items, next_cursor
+
+
+def export_ndjson(conn, kind: str, cursor: Optional[int] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Yield the whole range as NDJSON lines, one chunk per batch of rows
+    (``stream_rows``), so memory use does not grow with the number of rows exported.
+    """
+    query, params = history_query(kind, cursor, since, until, None)
+    for batch in stream_rows(conn, query, params):
+        yield "".join(json.dumps(format_row(kind, row)) + "\n" for row in batch)
@@ -1,11 +1,23 @@
-from fastapi import FastAPI, HTTPException
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
 import os
 import json
+import asyncio
 from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional, List
+from app.stats import create_rollup_table, format_stats, load_rollup, refresh_rollup, rollup_age
+from app.migrations import run_migrations
+from app.search import detect_backend, search_scores
+from app.export import stream_audit
+from app.history import export_ndjson, history_page
+from ecolabel_common import (
+    build_engine as build_pooled_engine, database_url, instrument, pool_status, query_metrics, session_factory
+)
+from ecolabel_common.metrics import record_cache, track_engine
+from ecolabel_common.replica import ReplicaRouter, replica_url
+from app.rows import LCA_DETAIL_FIELDS, SCORE_FIELDS, columns, format_lca, format_score
 
 app = FastAPI(
     title="Provenance",
@@ -29,23 +41,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+instrument(app, "provenance")
+
 # Database configuration
 DB_HOST = os.getenv("DB_HOST", "postgres")
 DB_PORT = os.getenv("DB_PORT", "5432")
-DB_USER = os.getenv("DB_USER", "eco")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "eco_pass")
 DB_NAME = os.getenv("DB_NAME", "eco_db")
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Optional read replica for the (read-only) provenance queries: DB_READ_HOST,
+# DB_MAX_REPLICA_LAG, ... (ecolabel_common.replica)
+
+# Pool and statement timeout defaults, overridden by DB_POOL_SIZE, DB_STATEMENT_TIMEOUT, ...
+# (ecolabel_common): provenance serves many short read queries concurrently
+POOL_DEFAULTS = {"pool_size": 10, "max_overflow": 20}
+STATEMENT_TIMEOUT = 10.0
+
+# Seconds between two background refreshes of the stats rollup
+STATS_MAX_AGE = float(os.getenv("PROVENANCE_STATS_MAX_AGE", "30"))
+# Seconds a write transaction may take to commit before rows below the ids
+# already seen are considered complete (see app/stats.py)
+STATS_SETTLE_SECONDS = float(os.getenv("PROVENANCE_STATS_SETTLE_SECONDS", "300"))
+
+# Product search: pg_trgm similarity threshold (0.3 is the pg_trgm default)
+SEARCH_THRESHOLD = float(os.getenv("PROVENANCE_SEARCH_THRESHOLD", "0.3"))
+
+DATABASE_URL = database_url()
+READ_DATABASE_URL = replica_url()
 
 engine = None
+read_engine = None
+router = None
 SessionLocal = None
+search_backend = None
+
+
+def read_connection(query_name: Optional[str] = None):
+    """Connection for read-only queries: replica when usable, primary otherwise"""
+    return router.read_connection(query_name)
+
+
+def build_engine(url: str):
+    """Pooled engine with the provenance defaults, timed by query_metrics"""
+    return build_pooled_engine("provenance", url, statement_timeout=STATEMENT_TIMEOUT, **POOL_DEFAULTS)
+
 
 def init_db():
-    global engine, SessionLocal
+    global engine, read_engine, router, SessionLocal
     try:
-        engine = create_engine(DATABASE_URL)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        engine = build_engine(DATABASE_URL)
+        SessionLocal = session_factory(engine)
+        track_engine("primary", engine)
+        if READ_DATABASE_URL:
+            read_engine = build_engine(READ_DATABASE_URL)
+            track_engine("replica", read_engine)
+            print(f"✓ Read replica configured: {read_engine.url.host}:{read_engine.url.port}/{DB_NAME}")
+        router = ReplicaRouter(engine, read_engine)
         print(f"✓ Connected to database: {DB_HOST}:{DB_PORT}/{DB_NAME}")
         return True
     except Exception as e:
@@ -54,7 +104,19 @@ def init_db():
 
 @app.on_event("startup")
 def startup():
-    init_db()
+    if init_db():
+        global search_backend
+        try:
+            run_migrations(engine)
+            with read_connection() as conn:
+                search_backend = detect_backend(conn)
+            print(f"✓ Product search backend: {search_backend}")
+        except Exception as e:
+            print(f"Warning: migrations not applied: {e}")
+        try:
+            create_rollup_table(engine)
+        except Exception as e:
+            print(f"Warning: stats rollup not initialized: {e}")
 
 def get_db():
     if SessionLocal is None:
@@ -72,6 +134,7 @@ def health_check():
         "status": "healthy", 
         "service": "provenance",
         "database_connected": db_connected,
+        "read_replica": read_engine is not None,
         "version": "2.0.0"
     }
 
@@ -106,131 +169,94 @@ class AuditResult(BaseModel):
 # IMPORTANT: Specific routes MUST come BEFORE generic routes
 # =====================================================
 
+def refresh_stats(force: bool = False) -> dict:
+    """Refresh the stats rollup unless another worker did it less than STATS_MAX_AGE ago"""
+    with engine.begin() as conn:
+        conn.execution_options(query_name="stats_rollup_refresh")
+        if conn.dialect.name == "postgresql" and load_rollup(conn) is None:
+            # The first build scans whole tables, exempt it from the request timeout
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+        return refresh_rollup(conn, STATS_SETTLE_SECONDS, max_age=None if force else STATS_MAX_AGE)
+
+
+async def refresh_stats_periodically():
+    """Background job: /provenance/stats only reads the rollup it maintains"""
+    while True:
+        if engine is not None:
+            try:
+                await asyncio.to_thread(refresh_stats)
+            except Exception as e:
+                print(f"✗ Stats rollup refresh failed: {e}")
+        await asyncio.sleep(STATS_MAX_AGE)
+
+
+stats_task = None
+
+
+@app.on_event("startup")
+async def start_stats_refresh():
+    global stats_task
+    stats_task = asyncio.create_task(refresh_stats_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_stats_refresh():
+    if stats_task is not None:
+        stats_task.cancel()
+        await asyncio.gather(stats_task, return_exceptions=True)
+
+
 @app.get("/provenance/stats")
 def get_stats():
-    """Get statistics from all microservices data"""
+    """Get statistics from all microservices data (served from the rollup refreshed in background)"""
     if engine is None:
         raise HTTPException(status_code=503, detail="Database not connected")
     
     try:
-        with engine.connect() as conn:
-            stats = {}
-            
-            # Product scores stats
-            result = conn.execute(text("SELECT COUNT(*), AVG(score_numerical) FROM product_scores"))
-            row = result.fetchone()
-            stats["scores"] = {
-                "count": row[0] if row[0] else 0,
-                "avg_score": round(float(row[1]), 2) if row[1] else 0
-            }
-            
-            # Score distribution
-            result = conn.execute(text("""
-                SELECT score_letter, COUNT(*) as count 
-                FROM product_scores 
-                GROUP BY score_letter 
-                ORDER BY score_letter
-            """))
-            stats["score_distribution"] = {row[0]: row[1] for row in result.fetchall()}
-            
-            # LCA results stats
-            result = conn.execute(text("SELECT COUNT(*), AVG(total_co2), AVG(total_water), AVG(total_energy) FROM lca_results"))
-            row = result.fetchone()
-            stats["lca"] = {
-                "count": row[0] if row[0] else 0,
-                "avg_co2": round(float(row[1]), 3) if row[1] else 0,
-                "avg_water": round(float(row[2]), 2) if row[2] else 0,
-                "avg_energy": round(float(row[3]), 2) if row[3] else 0
-            }
-            
-            # Products parsed
-            result = conn.execute(text("SELECT COUNT(*) FROM product_raw"))
-            row = result.fetchone()
-            stats["products_parsed"] = row[0] if row[0] else 0
-            
-            # Emission factors
-            result = conn.execute(text("SELECT COUNT(*) FROM emission_factors"))
-            row = result.fetchone()
-            stats["emission_factors"] = row[0] if row[0] else 0
-            
-            return stats
-            
+        with engine.connect().execution_options(query_name="stats_rollup_load") as conn:
+            rollup = load_rollup(conn)
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    if rollup is None:
+        raise HTTPException(status_code=503, detail="Statistics not computed yet")
+    # Hit while the background job keeps up, miss when the rollup is served stale
+    record_cache("stats_rollup", hit=rollup_age(rollup) <= 2 * STATS_MAX_AGE)
+    return format_stats(rollup)
 
 
-@app.get("/provenance/history/scores")
-def get_scores_history(limit: int = 20):
-    """Get recent scores history"""
+@app.post("/provenance/stats/refresh")
+def refresh_stats_now():
+    """Fold in the rows written since the last background refresh and return the statistics"""
     if engine is None:
         raise HTTPException(status_code=503, detail="Database not connected")
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
-                    SELECT id, product_name, score_numerical, score_letter, confidence_level, created_at 
-                    FROM product_scores 
-                    ORDER BY created_at DESC
-                    LIMIT :limit
-                """),
-                {"limit": limit}
-            )
-            
-            scores = []
-            for row in result.fetchall():
-                scores.append({
-                    "id": row[0],
-                    "product_name": row[1],
-                    "score_numerical": float(row[2]) if row[2] else 0,
-                    "score_letter": row[3],
-                    "confidence_level": float(row[4]) if row[4] else 0,
-                    "created_at": str(row[5]) if row[5] else None
-                })
-            
-            return {
-                "count": len(scores),
-                "scores": scores
-            }
-            
+        return format_stats(refresh_stats(force=True))
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/provenance/history/lca")
-def get_lca_history(limit: int = 20):
-    """Get recent LCA calculations history"""
+def history_response(kind: str, key: str, limit: int, cursor: Optional[int],
+                     since: Optional[datetime], until: Optional[datetime], format: str):
     if engine is None:
         raise HTTPException(status_code=503, detail="Database not connected")
     
+    if format == "ndjson":
+        def stream():
+            # The connection stays open for the whole download
+            with read_connection(f"history_{kind}_export") as conn:
+                yield from export_ndjson(conn, kind, cursor, since, until)
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
-                    SELECT id, product_name, total_co2, total_water, total_energy, created_at 
-                    FROM lca_results 
-                    ORDER BY created_at DESC
-                    LIMIT :limit
-                """),
-                {"limit": limit}
-            )
-            
-            results = []
-            for row in result.fetchall():
-                results.append({
-                    "id": row[0],
-                    "product_name": row[1],
-                    "total_co2": float(row[2]) if row[2] else 0,
-                    "total_water": float(row[3]) if row[3] else 0,
-                    "total_energy": float(row[4]) if row[4] else 0,
-                    "created_at": str(row[5]) if row[5] else None
-                })
-            
+        with read_connection(f"history_{kind}") as conn:
+            items, next_cursor = history_page(conn, kind, limit, cursor, since, until)
             return {
-                "count": len(results),
-                "lca_results": results
+                "count": len(items),
+                key: items,
+                "next_cursor": next_cursor
             }
             
     except Exception as e:
@@ -238,34 +264,48 @@ def get_lca_history(limit: int = 20):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/provenance/history/scores")
+def get_scores_history(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[int] = Query(default=None, ge=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$")
+):
+    """Scores history, newest first. Pass next_cursor back as cursor for the next page."""
+    return history_response("scores", "scores", limit, cursor, since, until, format)
+
+
+@app.get("/provenance/history/lca")
+def get_lca_history(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[int] = Query(default=None, ge=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$")
+):
+    """LCA calculations history, newest first. format=ndjson streams the whole range."""
+    return history_response("lca", "lca_results", limit, cursor, since, until, format)
+
+
 @app.get("/provenance/search/{product_name}")
-def search_by_product(product_name: str):
-    """Search scores by product name"""
+def search_by_product(product_name: str, limit: int = Query(default=20, ge=1, le=100)):
+    """Search scores by product name, ranked by trigram similarity"""
+    global search_backend
     if engine is None:
         raise HTTPException(status_code=503, detail="Database not connected")
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
-                    SELECT id, product_name, score_numerical, score_letter, confidence_level, created_at 
-                    FROM product_scores 
-                    WHERE LOWER(product_name) LIKE LOWER(:name)
-                    ORDER BY created_at DESC
-                    LIMIT 20
-                """),
-                {"name": f"%{product_name}%"}
-            )
+        with read_connection("search") as conn:
+            if search_backend is None:
+                search_backend = detect_backend(conn)
+            rows = search_scores(conn, search_backend, product_name, limit, SEARCH_THRESHOLD)
             
             scores = []
-            for row in result.fetchall():
+            for row in rows:
                 scores.append({
-                    "id": row[0],
-                    "product_name": row[1],
-                    "score_numerical": float(row[2]) if row[2] else 0,
-                    "score_letter": row[3],
-                    "confidence_level": float(row[4]) if row[4] else 0,
-                    "created_at": str(row[5]) if row[5] else None
+                    **format_score(row),
+                    "similarity": round(float(row["similarity"]), 3) if row["similarity"] is not None else None
                 })
             
             return {
@@ -279,6 +319,46 @@ def search_by_product(product_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/provenance/export/audit")
+def export_audit(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    after: Optional[int] = Query(default=None, ge=0),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Stream every score with its LCA breakdown, in ascending id order.
+    An interrupted download resumes with after=<last score id received>.
+    """
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    
+    def stream():
+        # The connection stays open for the whole download
+        with read_connection("export_audit") as conn:
+            yield from stream_audit(conn, format, after, since, until)
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"provenance-audit.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/provenance/metrics/queries")
+def get_query_metrics(reset: bool = False):
+    """Database time per provenance query since startup (or the last reset), heaviest first"""
+    queries = query_metrics.snapshot()
+    if reset:
+        query_metrics.reset()
+    return {
+        "pool": pool_status(engine) if engine is not None else None,
+        "queries": queries
+    }
+
+
 # =====================================================
 # Generic route MUST be LAST (catches all numeric IDs)
 # =====================================================
@@ -290,48 +370,44 @@ def get_provenance(score_id: str):
         raise HTTPException(status_code=503, detail="Database not connected")
     
     try:
-        with engine.connect() as conn:
-            # Get score from product_scores
+        with read_connection("audit") as conn:
+            # Score and the LCA it was computed from, joined on the primary key
             result = conn.execute(
-                text("SELECT id, product_name, score_numerical, score_letter, confidence_level, created_at FROM product_scores WHERE id = :id"),
+                text(f"""
+                    SELECT {columns(SCORE_FIELDS, "s.")}, s.lca_result_id,
+                           {", ".join(f"l.{field} AS lca_{field}" for field in LCA_DETAIL_FIELDS)}
+                    FROM product_scores s
+                    LEFT JOIN lca_results l ON l.id = s.lca_result_id
+                    WHERE s.id = :id
+                """),
                 {"id": int(score_id)}
             )
-            score_row = result.fetchone()
+            row = result.mappings().fetchone()
             
-            if not score_row:
+            if not row:
                 raise HTTPException(status_code=404, detail=f"Score ID {score_id} not found")
             
-            score_data = {
-                "id": score_row[0],
-                "product_name": score_row[1],
-                "score_numerical": float(score_row[2]) if score_row[2] else 0,
-                "score_letter": score_row[3],
-                "confidence_level": float(score_row[4]) if score_row[4] else 0,
-                "created_at": str(score_row[5]) if score_row[5] else None
-            }
-            
-            # Try to find matching LCA result
-            lca_result = conn.execute(
-                text("SELECT id, product_name, total_co2, total_water, total_energy, details, created_at FROM lca_results WHERE product_name = :name ORDER BY id DESC LIMIT 1"),
-                {"name": score_data["product_name"]}
-            )
-            lca_row = lca_result.fetchone()
+            score_data = format_score(row)
             
             lca_data = None
-            if lca_row:
-                lca_data = {
-                    "id": lca_row[0],
-                    "product_name": lca_row[1],
-                    "total_co2": float(lca_row[2]) if lca_row[2] else 0,
-                    "total_water": float(lca_row[3]) if lca_row[3] else 0,
-                    "total_energy": float(lca_row[4]) if lca_row[4] else 0,
-                    "details": lca_row[5] if lca_row[5] else None,
-                    "created_at": str(lca_row[6]) if lca_row[6] else None
-                }
+            lca_link = None
+            if row["lca_result_id"] is not None and row["lca_id"] is not None:
+                lca_link = "exact"
+                lca_data = format_lca({field: row[f"lca_{field}"] for field in LCA_DETAIL_FIELDS}, with_details=True)
+            elif row["lca_result_id"] is None:
+                # Scores written before the explicit link: best-effort match on the name
+                lca_row = conn.execute(
+                    text(f"SELECT {columns(LCA_DETAIL_FIELDS)} FROM lca_results WHERE product_name = :name ORDER BY id DESC LIMIT 1"),
+                    {"name": score_data["product_name"]}
+                ).mappings().fetchone()
+                if lca_row:
+                    lca_link = "name_match"
+                    lca_data = format_lca(lca_row, with_details=True)
             
             return {
                 "score": score_data,
                 "lca": lca_data,
+                "lca_link": lca_link,
                 "audit_timestamp": datetime.now().isoformat(),
                 "data_source": "PostgreSQL"
             }
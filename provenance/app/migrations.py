@@ -0,0 +1,33 @@
+"""
+Schema migrations applied by provenance on startup
+Each migration runs once per database and is recorded in provenance_schema_migrations
+"""
+
+from ecolabel_common.migrations import run_migrations as apply_migrations
+
+# (id, dialect, statements). Statements run in autocommit mode so indexes can be
+# built CONCURRENTLY without blocking the services writing to these tables.
+MIGRATIONS = [
+    ("001_pg_trgm_product_search", "postgresql", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_product_scores_name_trgm
+           ON product_scores USING gin (lower(product_name) gin_trgm_ops)""",
+    ]),
+    # The stats rollup gained settled/recent totals: it is derived data, so it
+    # is dropped and rebuilt from the source tables by the next refresh
+    ("002_stats_rollup_settled_watermarks", "postgresql", [
+        "DROP TABLE IF EXISTS provenance_stats_rollup",
+    ]),
+    # Latest LCA of a product name (audit exports of scores without
+    # lca_result_id). Also created by lca-lite; declared here so the audit does
+    # not depend on the lca-lite version deployed.
+    ("003_lca_results_name_id_index", "postgresql", [
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lca_results_name_id
+           ON lca_results (product_name, id)""",
+    ]),
+]
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations for the engine's dialect, return the ids applied"""
+    return apply_migrations(engine, MIGRATIONS, "provenance_schema_migrations")
@@ -0,0 +1,80 @@
+"""
+Column projections and RowMapping formatters shared by the provenance queries
+Each query selects only the columns of its projection and rows are read by name
+"""
+
+import json
+
+SCORE_FIELDS = ("id", "product_name", "score_numerical", "score_letter", "confidence_level", "created_at")
+LCA_FIELDS = ("id", "product_name", "total_co2", "total_water", "total_energy", "created_at")
+LCA_DETAIL_FIELDS = LCA_FIELDS + ("details",)
+
+# Rows per batch of the streamed exports (history NDJSON, audit export)
+EXPORT_BATCH_SIZE = 1000
+
+
+def columns(fields, prefix: str = "") -> str:
+    """SELECT list for a projection, e.g. columns(SCORE_FIELDS, "s.")"""
+    return ", ".join(f"{prefix}{field}" for field in fields)
+
+
+def stream_rows(conn, query, params: dict):
+    """
+    Yield the rows of ``query`` as lists of at most ``EXPORT_BATCH_SIZE`` RowMappings.
+
+    The result is read through a server-side cursor (``stream_results``) in
+    ``yield_per`` batches, so memory stays bounded by the batch size whatever
+    the table size.
+    """
+    result = (
+        conn.execution_options(stream_results=True)
+        .execute(query, params)
+        .yield_per(EXPORT_BATCH_SIZE)
+        .mappings()
+    )
+    yield from result.partitions()
+
+
+def _float(value) -> float:
+    return float(value) if value else 0
+
+
+def _timestamp(value):
+    return str(value) if value else None
+
+
+def _details(value):
+    # JSON column: decoded by psycopg2, raw text on other drivers
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value if value else None
+
+
+def format_score(row) -> dict:
+    """Score dict from a RowMapping selected with SCORE_FIELDS"""
+    return {
+        "id": row["id"],
+        "product_name": row["product_name"],
+        "score_numerical": _float(row["score_numerical"]),
+        "score_letter": row["score_letter"],
+        "confidence_level": _float(row["confidence_level"]),
+        "created_at": _timestamp(row["created_at"])
+    }
+
+
+def format_lca(row, with_details: bool = False) -> dict:
+    """LCA dict from a RowMapping selected with LCA_FIELDS (LCA_DETAIL_FIELDS for details)"""
+    data = {
+        "id": row["id"],
+        "product_name": row["product_name"],
+        "total_co2": _float(row["total_co2"]),
+        "total_water": _float(row["total_water"]),
+        "total_energy": _float(row["total_energy"]),
+    }
+    if with_details:
+        data["details"] = _details(row["details"])
+    data["created_at"] = _timestamp(row["created_at"])
+    return data
@@ -0,0 +1,142 @@
+"""
+Product name search for /provenance/search/{product_name}
+pg_trgm similarity on PostgreSQL, in-memory trigram index elsewhere
+"""
+
+import re
+import threading
+from sqlalchemy import text
+from app.rows import SCORE_FIELDS, columns
+
+SCORE_COLUMNS = columns(SCORE_FIELDS)
+
+# Substring matches (LIKE) plus fuzzy matches (the pg_trgm % operator, true
+# above pg_trgm.similarity_threshold), best match first. Both operators are
+# served by the GIN index on lower(product_name), combined as a BitmapOr;
+# similarity() itself is not indexable and only ranks the matches.
+TRIGRAM_SEARCH_SQL = text(f"""
+    SELECT {SCORE_COLUMNS}, similarity(lower(product_name), :query) AS similarity
+    FROM product_scores
+    WHERE lower(product_name) LIKE :pattern ESCAPE '\\'
+       OR lower(product_name) % :query
+    ORDER BY similarity DESC, created_at DESC
+    LIMIT :limit
+""")
+
+# Threshold of %, for the current transaction only (SET LOCAL)
+SET_THRESHOLD_SQL = text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)")
+
+LIKE_SEARCH_SQL = text(f"""
+    SELECT {SCORE_COLUMNS}, NULL AS similarity
+    FROM product_scores
+    WHERE lower(product_name) LIKE :pattern ESCAPE '\\'
+    ORDER BY created_at DESC
+    LIMIT :limit
+""")
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def trigrams(value: str) -> set:
+    """Trigrams as extracted by pg_trgm: lower-cased words padded with two leading blanks and one trailing"""
+    result = set()
+    for word in WORD_RE.findall(value.lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(left: set, right: set) -> float:
+    """pg_trgm similarity: shared trigrams over the union"""
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def like_pattern(query: str) -> str:
+    escaped = query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over distinct product names.
+
+    Used when the database cannot do trigram search (SQLite test runs). It is
+    refreshed incrementally from the id watermark, like the stats rollup.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.postings = {}
+        self.watermark = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, conn):
+        with self._lock:
+            rows = conn.execute(
+                text("SELECT id, product_name FROM product_scores WHERE id > :watermark ORDER BY id"),
+                {"watermark": self.watermark}
+            ).fetchall()
+            for score_id, name in rows:
+                self.watermark = score_id
+                if name is None or name in self.names:
+                    continue
+                grams = trigrams(name)
+                self.names[name] = grams
+                for gram in grams:
+                    self.postings.setdefault(gram, set()).add(name)
+
+    def search(self, query: str, threshold: float) -> dict:
+        """Matching names with their similarity (substring matches always included)"""
+        query_grams = trigrams(query)
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self.postings.get(gram, set())
+        needle = query.lower()
+        candidates |= {name for name in self.names if needle in name.lower()}
+
+        matches = {}
+        for name in candidates:
+            score = similarity(self.names[name], query_grams)
+            if score >= threshold or needle in name.lower():
+                matches[name] = score
+        return matches
+
+
+memory_index = TrigramIndex()
+
+
+def detect_backend(conn) -> str:
+    """'trigram' when pg_trgm is installed, 'like' on PostgreSQL without it, 'memory' otherwise"""
+    if conn.dialect.name != "postgresql":
+        return "memory"
+    installed = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+    return "trigram" if installed else "like"
+
+
+def search_scores(conn, backend: str, query: str, limit: int, threshold: float) -> list:
+    """Rows (as mappings) of product_scores matching ``query``, ranked by similarity"""
+    if backend == "trigram":
+        conn.execute(SET_THRESHOLD_SQL, {"threshold": str(threshold)})
+        return conn.execute(TRIGRAM_SEARCH_SQL, {
+            "query": query.lower(), "pattern": like_pattern(query), "limit": limit
+        }).mappings().fetchall()
+    if backend == "like":
+        return conn.execute(LIKE_SEARCH_SQL, {
+            "pattern": like_pattern(query), "limit": limit
+        }).mappings().fetchall()
+
+    memory_index.refresh(conn)
+    matches = memory_index.search(query, threshold)
+    if not matches:
+        return []
+    params = {f"n{i}": name for i, name in enumerate(matches)}
+    placeholders = ", ".join(f":{key}" for key in params)
+    rows = conn.execute(
+        text(f"SELECT {SCORE_COLUMNS} FROM product_scores WHERE product_name IN ({placeholders})"),
+        params
+    ).mappings().fetchall()
+    ranked = [dict(row, similarity=matches[row["product_name"]]) for row in rows]
+    ranked.sort(key=lambda row: (row["similarity"], str(row["created_at"] or "")), reverse=True)
+    return ranked[:limit]
@@ -0,0 +1,235 @@
+"""
+Incrementally maintained statistics for /provenance/stats
+Delta aggregation by settled id watermark into a single-row rollup table
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import (
+    Column, DateTime, Float, Integer, JSON, MetaData, Table, select, text
+)
+
+metadata = MetaData()
+
+# One row (id=1). Sums and counts are kept rather than averages so new rows
+# can be folded in without rescanning history. Scores, LCA results and parsed
+# products are append-only.
+#
+# An id is allocated at INSERT but the row only becomes visible at COMMIT, so
+# a slow transaction can show up below ids already seen. The totals are
+# therefore split in two: rows up to the *_watermark columns are folded in
+# once and for all ("settled"), rows above are re-aggregated on every refresh
+# ("recent"). A watermark only moves up to the highest id seen at a refresh
+# at least settle_seconds old: every lower id had that long to commit.
+stats_rollup = Table(
+    "provenance_stats_rollup",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("scores_count", Integer, nullable=False, default=0),
+    Column("scores_sum", Float, nullable=False, default=0.0),
+    Column("score_distribution", JSON, nullable=False, default=dict),
+    Column("scores_watermark", Integer, nullable=False, default=0),
+    Column("lca_count", Integer, nullable=False, default=0),
+    Column("lca_co2_sum", Float, nullable=False, default=0.0),
+    Column("lca_water_sum", Float, nullable=False, default=0.0),
+    Column("lca_energy_sum", Float, nullable=False, default=0.0),
+    Column("lca_watermark", Integer, nullable=False, default=0),
+    Column("products_parsed", Integer, nullable=False, default=0),
+    Column("products_watermark", Integer, nullable=False, default=0),
+    # Totals of the rows above the watermarks at the last refresh
+    Column("recent", JSON, nullable=False, default=dict),
+    # [refreshed_at, max score id, max LCA id, max product id] of the refreshes
+    # not yet settled, oldest first
+    Column("checkpoints", JSON, nullable=False, default=list),
+    Column("emission_factors", Integer, nullable=False, default=0),
+    Column("refreshed_at", DateTime),
+)
+
+ROLLUP_ID = 1
+
+# Counters summed over the settled and recent parts
+TOTALS = (
+    "scores_count", "scores_sum", "lca_count", "lca_co2_sum", "lca_water_sum", "lca_energy_sum",
+    "products_parsed",
+)
+WATERMARKS = ("scores_watermark", "lca_watermark", "products_watermark")
+
+
+def create_rollup_table(engine):
+    metadata.create_all(bind=engine, tables=[stats_rollup], checkfirst=True)
+
+
+def load_rollup(conn, for_update=False):
+    """Current rollup row as a dict, or None if never computed"""
+    query = select(stats_rollup).where(stats_rollup.c.id == ROLLUP_ID)
+    if for_update:
+        # Serializes concurrent refreshers (several workers) so no delta is folded twice
+        query = query.with_for_update()
+    row = conn.execute(query).mappings().first()
+    return dict(row) if row else None
+
+
+def rollup_age(rollup: dict) -> float:
+    """Seconds since the last refresh (infinite if never refreshed)"""
+    if rollup is None or rollup["refreshed_at"] is None:
+        return float("inf")
+    return (datetime.utcnow() - rollup["refreshed_at"]).total_seconds()
+
+
+def id_range(low: int, high=None):
+    """WHERE clause and parameters of low < id <= high (no upper bound if high is None)"""
+    if high is None:
+        return "id > :low", {"low": low}
+    return "id > :low AND id <= :high", {"low": low, "high": high}
+
+
+def aggregate(conn, low: list, high=None) -> dict:
+    """
+    Totals of the rows between the ``low`` and ``high`` ids (scores, LCA results,
+    products; no upper bound if high is None) and the highest id of each table.
+    """
+    high = high or [None, None, None]
+    totals = {
+        "scores_count": 0, "scores_sum": 0.0, "score_distribution": {},
+        "lca_count": 0, "lca_co2_sum": 0.0, "lca_water_sum": 0.0, "lca_energy_sum": 0.0,
+        "products_parsed": 0,
+    }
+    distribution = totals["score_distribution"]
+    max_ids = list(low)
+
+    # Product scores, grouped by letter
+    condition, params = id_range(low[0], high[0])
+    for letter, count, total, max_id in conn.execute(
+        text(f"""
+            SELECT score_letter, COUNT(*), COALESCE(SUM(score_numerical), 0), MAX(id)
+            FROM product_scores
+            WHERE {condition}
+            GROUP BY score_letter
+        """),
+        params
+    ).fetchall():
+        if letter is not None:
+            distribution[letter] = distribution.get(letter, 0) + count
+        totals["scores_count"] += count
+        totals["scores_sum"] += float(total)
+        max_ids[0] = max(max_ids[0], max_id)
+
+    # LCA results
+    condition, params = id_range(low[1], high[1])
+    count, co2, water, energy, max_id = conn.execute(
+        text(f"""
+            SELECT COUNT(*), COALESCE(SUM(total_co2), 0), COALESCE(SUM(total_water), 0),
+                   COALESCE(SUM(total_energy), 0), MAX(id)
+            FROM lca_results
+            WHERE {condition}
+        """),
+        params
+    ).fetchone()
+    if count:
+        totals["lca_count"] = count
+        totals["lca_co2_sum"] = float(co2)
+        totals["lca_water_sum"] = float(water)
+        totals["lca_energy_sum"] = float(energy)
+        max_ids[1] = max_id
+
+    # Parsed products
+    condition, params = id_range(low[2], high[2])
+    count, max_id = conn.execute(
+        text(f"SELECT COUNT(*), MAX(id) FROM product_raw WHERE {condition}"), params
+    ).fetchone()
+    if count:
+        totals["products_parsed"] = count
+        max_ids[2] = max_id
+
+    return {"totals": totals, "max_ids": max_ids}
+
+
+def add_totals(state: dict, totals: dict) -> dict:
+    """``state`` plus ``totals`` (counters and score distribution)"""
+    result = dict(state)
+    for name in TOTALS:
+        result[name] = (state.get(name) or 0) + totals.get(name, 0)
+    distribution = dict(state.get("score_distribution") or {})
+    for letter, count in (totals.get("score_distribution") or {}).items():
+        distribution[letter] = distribution.get(letter, 0) + count
+    result["score_distribution"] = dict(sorted(distribution.items()))
+    return result
+
+
+def refresh_rollup(conn, settle_seconds: float, max_age=None):
+    """
+    Fold settled rows into the rollup and re-aggregate the recent ones.
+
+    Each query is a range scan on the primary key, so the cost is proportional
+    to the rows written during the last settle_seconds, not to table size. With
+    ``max_age``, a rollup refreshed less than max_age seconds ago is returned
+    as is (another worker just did it). Must run inside a transaction on the
+    primary (``engine.begin()``).
+    """
+    current = load_rollup(conn, for_update=True)
+    if max_age is not None and rollup_age(current) <= max_age:
+        return current
+    state = current or {
+        "scores_count": 0, "scores_sum": 0.0, "score_distribution": {}, "scores_watermark": 0,
+        "lca_count": 0, "lca_co2_sum": 0.0, "lca_water_sum": 0.0, "lca_energy_sum": 0.0,
+        "lca_watermark": 0, "products_parsed": 0, "products_watermark": 0,
+        "recent": {}, "checkpoints": [],
+    }
+    now = datetime.utcnow()
+    settled_before = (now - timedelta(seconds=settle_seconds)).isoformat()
+    checkpoints = list(state["checkpoints"] or [])
+    watermarks = [state[name] for name in WATERMARKS]
+
+    # Highest ids seen by the latest refresh old enough: all lower ids are committed by now
+    due = [checkpoint for checkpoint in checkpoints if checkpoint[0] <= settled_before]
+    if due:
+        settled = [max(watermark, max_id) for watermark, max_id in zip(watermarks, due[-1][1:])]
+        state = add_totals(state, aggregate(conn, watermarks, settled)["totals"])
+        watermarks = settled
+        checkpoints = [checkpoint for checkpoint in checkpoints if checkpoint[0] > settled_before]
+
+    recent = aggregate(conn, watermarks)
+    state["recent"] = recent["totals"]
+    state["checkpoints"] = checkpoints + [[now.isoformat(), *recent["max_ids"]]]
+    for name, watermark in zip(WATERMARKS, watermarks):
+        state[name] = watermark
+
+    # Emission factors are a small reference table that may be edited in place
+    state["emission_factors"] = conn.execute(text("SELECT COUNT(*) FROM emission_factors")).scalar() or 0
+    state["refreshed_at"] = now
+
+    if current is None:
+        conn.execute(stats_rollup.insert().values(id=ROLLUP_ID, **state))
+    else:
+        conn.execute(
+            stats_rollup.update()
+            .where(stats_rollup.c.id == ROLLUP_ID)
+            .values(**{k: v for k, v in state.items() if k != "id"})
+        )
+    return load_rollup(conn)
+
+
+def format_stats(rollup: dict) -> dict:
+    """Response body of /provenance/stats built from the rollup row (settled + recent rows)"""
+    totals = add_totals(rollup, rollup["recent"] or {})
+    scores_count = totals["scores_count"]
+    lca_count = totals["lca_count"]
+    refreshed_at = rollup["refreshed_at"]
+    return {
+        "scores": {
+            "count": scores_count,
+            "avg_score": round(totals["scores_sum"] / scores_count, 2) if scores_count else 0
+        },
+        "score_distribution": totals["score_distribution"],
+        "lca": {
+            "count": lca_count,
+            "avg_co2": round(totals["lca_co2_sum"] / lca_count, 3) if lca_count else 0,
+            "avg_water": round(totals["lca_water_sum"] / lca_count, 2) if lca_count else 0,
+            "avg_energy": round(totals["lca_energy_sum"] / lca_count, 2) if lca_count else 0
+        },
+        "products_parsed": totals["products_parsed"],
+        "emission_factors": rollup["emission_factors"],
+        "freshness": {
+            "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+            "age_seconds": round(rollup_age(rollup), 1) if refreshed_at else None
+        }
+    }
@@ -0,0 +1,41 @@
+"""
+Fixtures partagées des tests du microservice Provenance
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tables des autres microservices lues par Provenance
+SCHEMA = [
+    """CREATE TABLE product_scores (
+        id INTEGER PRIMARY KEY, product_name VARCHAR, score_numerical FLOAT,
+        score_letter VARCHAR(1), confidence_level FLOAT, created_at DATETIME,
+        lca_result_id INTEGER)""",
+    """CREATE TABLE lca_results (
+        id INTEGER PRIMARY KEY, product_name VARCHAR, total_co2 FLOAT, total_water FLOAT,
+        total_energy FLOAT, details JSON, created_at DATETIME)""",
+    "CREATE TABLE product_raw (id INTEGER PRIMARY KEY, gtin VARCHAR, source_type VARCHAR, raw_text TEXT)",
+    "CREATE TABLE emission_factors (id INTEGER PRIMARY KEY, name VARCHAR, category VARCHAR)",
+]
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """Base SQLite temporaire avec le schéma des autres microservices"""
+    from sqlalchemy import create_engine, text
+    from ecolabel_common.replica import ReplicaRouter
+    import app.main as main
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'eco.db'}")
+    with engine.begin() as conn:
+        for ddl in SCHEMA:
+            conn.execute(text(ddl))
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "read_engine", None)
+    monkeypatch.setattr(main, "router", ReplicaRouter(engine))
+    yield main, engine
+    engine.dispose()
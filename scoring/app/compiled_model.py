@@ -0,0 +1,176 @@
+"""
+Compiled tree ensemble for online scoring
+
+The trained RandomForest / XGBoost model is flattened once into contiguous
+numpy arrays, every tree's nodes one after the other:
+
+    feature[n]     feature tested by node n (0 for leaves)
+    threshold[n]   go left when x[feature] <= threshold (+inf for leaves)
+    left[n]        left child (leaves point to themselves)
+    right[n]       right child (leaves point to themselves)
+    value[n, k]    RandomForest: contribution of leaf n to class k
+    value[n]       XGBoost: margin of leaf n, added to the class of its tree
+                   (tree_class, one-hot per tree)
+
+Because leaves loop onto themselves, evaluation is ``depth`` vectorized steps
+over all trees at once, with no per-node branching, and predict_proba is then
+one sum (RandomForest: mean of the per-tree class fractions; XGBoost: softmax
+of the summed margins).
+
+Both libraries compare float32 features: inputs are rounded to float32 and the
+XGBoost ``x < split`` test is turned into ``x <= previous float32`` so that
+every node uses the same ``<=`` test.
+"""
+
+import json
+
+import numpy as np
+
+
+class CompiledEnsemble:
+    """Flattened tree ensemble with a vectorized predict_proba"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, depth, kind,
+                 tree_class=None, base_margin=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.depth = int(depth)
+        self.kind = kind  # "mean" (RandomForest) or "softmax" (XGBoost)
+        self.tree_class = None if tree_class is None else np.ascontiguousarray(tree_class, dtype=np.float64)
+        self.base_margin = None if base_margin is None else np.asarray(base_margin, dtype=np.float64)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Leaf reached in every tree, shape (n_samples, n_trees)"""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self._finish(self._scores(self.leaves(X)))
+
+    def predict_one(self, features) -> np.ndarray:
+        """predict_proba of a single row (1-D result)
+
+        For one row, every node's decision is computed at once and the walk is
+        then ``depth`` lookups of the next node.
+        """
+        x = np.asarray(features, dtype=np.float32).astype(np.float64)
+        next_node = np.where(x[self.feature] <= self.threshold, self.left, self.right)
+        node = self.roots
+        for _ in range(self.depth):
+            node = next_node[node]
+        return self._finish(self._scores(node))
+
+    def _scores(self, leaves: np.ndarray) -> np.ndarray:
+        """Per-class sum of the leaves' values over the trees (last axis)"""
+        if self.kind == "mean":
+            return self.value[leaves].sum(axis=-2)
+        return self.value[leaves] @ self.tree_class
+
+    def _finish(self, scores: np.ndarray) -> np.ndarray:
+        if self.kind == "mean":
+            return scores
+        margins = scores + self.base_margin
+        exp = np.exp(margins - margins.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def compile_random_forest(model) -> CompiledEnsemble:
+    n_classes = len(model.classes_)
+    n_trees = len(model.estimators_)
+    parts, roots, offset, depth = [], [], 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left < 0
+        own = np.arange(n)
+        fractions = tree.value[:, 0, :]
+        fractions = fractions / fractions.sum(axis=1, keepdims=True)
+        value = np.zeros((n, n_classes))
+        # Mean over trees folded in: predict_proba is a plain sum
+        value[is_leaf] = fractions[is_leaf] / n_trees
+        parts.append((
+            np.where(is_leaf, 0, tree.feature),
+            np.where(is_leaf, np.inf, tree.threshold),
+            np.where(is_leaf, own, tree.children_left) + offset,
+            np.where(is_leaf, own, tree.children_right) + offset,
+            value,
+        ))
+        roots.append(offset)
+        offset += n
+        depth = max(depth, tree.max_depth)
+    feature, threshold, left, right, value = (np.concatenate(arrays) for arrays in zip(*parts))
+    return CompiledEnsemble(feature, threshold, left, right, value, roots, depth, kind="mean")
+
+
+def _tree_depth(node: dict) -> int:
+    children = node.get("children")
+    return 1 + max(_tree_depth(child) for child in children) if children else 0
+
+
+def compile_xgboost(model, n_features: int) -> CompiledEnsemble:
+    import xgboost as xgb
+
+    booster = model.get_booster()
+    n_classes = int(model.n_classes_)
+    feature, threshold, left, right, value, roots, tree_class = [], [], [], [], [], [], []
+    depth = 0
+    for tree_index, dump in enumerate(booster.get_dump(dump_format="json")):
+        tree = json.loads(dump)
+        # multi:softprob grows one tree per class and round
+        tree_class.append(np.eye(n_classes)[tree_index % n_classes])
+        depth = max(depth, _tree_depth(tree))
+        offset = len(feature)
+        roots.append(offset)
+        # Dump ids are local to the tree: map them to global positions
+        nodes, stack = {}, [tree]
+        while stack:
+            node = stack.pop()
+            nodes[node["nodeid"]] = node
+            stack.extend(node.get("children", []))
+        position = {nodeid: offset + i for i, nodeid in enumerate(sorted(nodes))}
+        for nodeid in sorted(nodes):
+            node = nodes[nodeid]
+            if "leaf" in node:
+                feature.append(0)
+                threshold.append(np.inf)
+                left.append(position[nodeid])
+                right.append(position[nodeid])
+                value.append(node["leaf"])
+            else:
+                feature.append(int(node["split"].lstrip("f")))
+                split = np.float32(node["split_condition"])
+                threshold.append(float(np.nextafter(split, np.float32(-np.inf))))
+                left.append(position[node["yes"]])
+                right.append(position[node["no"]])
+                value.append(0.0)
+    compiled = CompiledEnsemble(feature, threshold, left, right, value, roots, depth, kind="softmax",
+                                tree_class=tree_class, base_margin=np.zeros(n_classes))
+    # base_score is stored differently across XGBoost versions: read it back
+    # as the margin the booster adds to the trees' output on a probe row
+    probe = np.zeros((1, n_features), dtype=np.float32)
+    margin = booster.predict(xgb.DMatrix(probe), output_margin=True)
+    compiled.base_margin = np.asarray(margin, dtype=np.float64).reshape(-1) \
+        - compiled._scores(compiled.leaves(probe))[0]
+    return compiled
+
+
+def compile_model(model, n_features: int) -> CompiledEnsemble:
+    """Export step: flatten a fitted RandomForestClassifier or XGBClassifier"""
+    if hasattr(model, "get_booster"):
+        return compile_xgboost(model, n_features)
+    if hasattr(model, "estimators_"):
+        return compile_random_forest(model)
+    raise TypeError(f"Cannot compile {type(model).__name__}")
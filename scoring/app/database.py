@@ -1,14 +1,8 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+from ecolabel_common import build_engine, database_url, session_dependency, session_factory
 
-DB_USER = os.getenv("DB_USER", "eco")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "eco_pass")
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "eco_db")
+DATABASE_URL = database_url()
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Pool, timeouts and query timing from ecolabel_common (DB_POOL_SIZE, DB_STATEMENT_TIMEOUT, ...)
+engine = build_engine("scoring", DATABASE_URL)
+SessionLocal = session_factory(engine)
+get_db = session_dependency(SessionLocal)
@@ -3,20 +3,27 @@ Scoring Microservice with ML-Based Predictions
 Uses XGBoost or Random Forest model for eco-score classification
 """
 
-from fastapi import FastAPI, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, Depends, HTTPException, Response
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, List, Literal, Optional
 import numpy as np
 import os
 import json
+import threading
 
-from app.database import SessionLocal, engine
+from app.database import SessionLocal, engine, get_db
+from ecolabel_common import instrument
+from ecolabel_common.metrics import time_inference
 from app.models import Base, ProductScore
+from app.migrations import LCA_RESULT_FK, run_migrations
+from app.prediction_cache import PredictionCache
 
 # Try to import ML components
 try:
     from app.ml_trainer import load_model, predict as ml_predict_func, train_models
+    from app.training import TrainingJob, validate_space
     ML_AVAILABLE = True
 except ImportError as e:
     print(f"ML trainer not available: {e}")
@@ -29,12 +36,21 @@ METRICS_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'training
 # Score values for probability-weighted scoring
 SCORE_VALUES = {'A': 95, 'B': 75, 'C': 55, 'D': 35, 'E': 15}
 
+# Upper bound on products per /score/compute/batch call
+BATCH_MAX_ITEMS = int(os.getenv("SCORING_BATCH_MAX_ITEMS", "1000"))
+
+# Rule-based grades: lower bound of D, C, B, A (below 20 is E)
+GRADE_THRESHOLDS = np.array([20, 40, 60, 80])
+GRADE_LETTERS = np.array(['E', 'D', 'C', 'B', 'A'])
+
 # ============ INIT DB ============
 Base.metadata.create_all(bind=engine)
 
 # ============ ML STATE ============
 ml_model_bundle = None
 training_metrics = None
+# Repeated feature vectors skip the model (PREDICTION_CACHE_SIZE, PREDICTION_CACHE_PRECISION)
+prediction_cache = PredictionCache()
 
 def load_ml_model():
     global ml_model_bundle, training_metrics
@@ -92,18 +108,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+instrument(app, "scoring", {"primary": engine})
+
 # Load model on startup
 @app.on_event("startup")
 def startup():
-    load_ml_model()
-
-# ============ DB DEPENDENCY ============
-def get_db():
-    db = SessionLocal()
     try:
-        yield db
-    finally:
-        db.close()
+        run_migrations(engine)
+    except Exception as e:
+        print(f"Warning: migrations not applied: {e}")
+    load_ml_model()
 
 # ============ PYDANTIC MODELS ============
 class ScoreRequest(BaseModel):
@@ -118,12 +132,16 @@ class ScoreRequest(BaseModel):
     has_recyclable: int = 0
     has_local_label: int = 0
     category: str = "processed"
+    # Id returned by /lca/calc, links the score to the exact LCA used (audit)
+    lca_result_id: Optional[int] = None
     # Legacy fields for backward compatibility
     max_co2_ref: float = 10.0
     max_water_ref: float = 500.0
     max_energy_ref: float = 50.0
 
 class ScoreResponse(BaseModel):
+    score_id: Optional[int] = None
+    lca_result_id: Optional[int] = None
     product_name: str
     score_numerical: float
     score_letter: str
@@ -132,6 +150,9 @@ class ScoreResponse(BaseModel):
     probabilities: Optional[Dict[str, float]] = None
     model_used: str = "rule-based"
 
+class BatchScoreRequest(BaseModel):
+    items: List[ScoreRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
 # ============ SCORING LOGIC ============
 
 def ml_predict(request: ScoreRequest) -> Dict:
@@ -140,18 +161,21 @@ def ml_predict(request: ScoreRequest) -> Dict:
         return None
     
     try:
-        result = ml_predict_func(
-            co2_kg=request.total_co2,
-            water_l=request.total_water,
-            energy_mj=request.total_energy,
-            packaging_type=request.packaging_type,
-            packaging_weight_kg=request.packaging_weight_kg,
-            transport_km=request.transport_km,
-            has_bio_label=request.has_bio_label,
-            has_recyclable=request.has_recyclable,
-            has_local_label=request.has_local_label,
-            category=request.category
-        )
+        with time_inference("scoring"):
+            result = ml_predict_func(
+                co2_kg=request.total_co2,
+                water_l=request.total_water,
+                energy_mj=request.total_energy,
+                packaging_type=request.packaging_type,
+                packaging_weight_kg=request.packaging_weight_kg,
+                transport_km=request.transport_km,
+                has_bio_label=request.has_bio_label,
+                has_recyclable=request.has_recyclable,
+                has_local_label=request.has_local_label,
+                category=request.category,
+                model_bundle=ml_model_bundle,
+                cache=prediction_cache
+            )
         
         # Calculate numerical score from probabilities
         score_num = sum(SCORE_VALUES.get(c, 50) * p for c, p in result['probabilities'].items())
@@ -218,6 +242,46 @@ def rule_based_predict(request: ScoreRequest) -> Dict:
     }
 
 
+def rule_based_scores(co2, water, energy, has_bio_label, has_recyclable, has_local_label,
+                      max_co2_ref=10.0, max_water_ref=500.0, max_energy_ref=50.0):
+    """Vectorized rule_based_predict: numpy arrays in, (unrounded scores, letters) out
+
+    Same operations in the same order as the scalar version, so the results are
+    bit-for-bit identical; letters come from np.searchsorted on GRADE_THRESHOLDS.
+    """
+    norm_co2 = np.minimum(np.asarray(co2, dtype=np.float64) / max_co2_ref, 1.0)
+    norm_water = np.minimum(np.asarray(water, dtype=np.float64) / max_water_ref, 1.0)
+    norm_energy = np.minimum(np.asarray(energy, dtype=np.float64) / max_energy_ref, 1.0)
+    
+    raw_score = (norm_co2 * 0.50) + (norm_water * 0.25) + (norm_energy * 0.25)
+    score_num = 100 - (raw_score * 100)
+    
+    score_num = score_num + np.where(np.asarray(has_bio_label) != 0, 5, 0)
+    score_num = score_num + np.where(np.asarray(has_recyclable) != 0, 3, 0)
+    score_num = score_num + np.where(np.asarray(has_local_label) != 0, 5, 0)
+    
+    score_num = np.clip(score_num, 0, 100)
+    letters = GRADE_LETTERS[np.searchsorted(GRADE_THRESHOLDS, score_num, side='right')]
+    return score_num, letters
+
+
+def rule_based_predict_batch(requests: List[ScoreRequest]) -> List[Dict]:
+    """rule_based_predict over many requests at once (same results, one vectorized pass)"""
+    if not requests:
+        return []
+    columns = np.array([
+        (r.total_co2, r.total_water, r.total_energy, r.has_bio_label, r.has_recyclable, r.has_local_label,
+         r.max_co2_ref, r.max_water_ref, r.max_energy_ref)
+        for r in requests
+    ], dtype=np.float64).T
+    scores, letters = rule_based_scores(*columns)
+    # Python's round (correctly rounded), as the scalar version; np.round can differ in the last digit
+    return [
+        {'letter': letter, 'score': round(score, 1), 'proba': None, 'confidence': 0.7, 'model_name': 'rule-based'}
+        for score, letter in zip(scores.tolist(), letters.tolist())
+    ]
+
+
 # ============ ENDPOINTS ============
 
 @app.get("/health")
@@ -246,6 +310,77 @@ def compute_score(request: ScoreRequest, db: Session = Depends(get_db)):
     if result is None:
         result = rule_based_predict(request)
     
+    # Save to DB
+    db_score = score_row(request, result)
+    db.add(db_score)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if request.lca_result_id is None or not lca_result_fk_violation(e):
+            raise
+        raise HTTPException(status_code=422, detail=f"Unknown lca_result_id {request.lca_result_id}")
+    
+    return score_response(request, result, db_score.id)
+
+
+@app.post("/score/compute/batch", response_model=List[ScoreResponse])
+def compute_scores_batch(batch: BatchScoreRequest, db: Session = Depends(get_db)):
+    """
+    Calcule les scores de plusieurs produits en un appel (même résultat que /score/compute).
+    
+    Modèle ML produit par produit s'il est chargé ; sinon, ou en cas d'échec, formule pondérée
+    vectorisée sur tout le lot. Les scores sont enregistrés en une transaction.
+    """
+    if ml_model_bundle is not None and ML_AVAILABLE:
+        results = [ml_predict(request) for request in batch.items]
+    else:
+        results = [None] * len(batch.items)
+    
+    # Fallback to rules, in one vectorized pass
+    fallback = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(fallback, rule_based_predict_batch([batch.items[i] for i in fallback])):
+        results[i] = result
+    
+    db_scores = [score_row(request, result) for request, result in zip(batch.items, results)]
+    db.add_all(db_scores)
+    try:
+        # Ids read before commit: afterwards each one would be reloaded by its own query
+        db.flush()
+        score_ids = [db_score.id for db_score in db_scores]
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if all(request.lca_result_id is None for request in batch.items) or not lca_result_fk_violation(e):
+            raise
+        raise HTTPException(status_code=422, detail="Unknown lca_result_id in batch")
+    
+    return [
+        score_response(request, result, score_id)
+        for request, result, score_id in zip(batch.items, results, score_ids)
+    ]
+
+
+def lca_result_fk_violation(error: IntegrityError) -> bool:
+    """True when ``error`` violates the lca_result_id foreign key (app/migrations.py, 002)"""
+    diag = getattr(error.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint is not None:
+        return constraint == LCA_RESULT_FK
+    return LCA_RESULT_FK in str(error.orig)
+
+
+def score_row(request: ScoreRequest, result: Dict) -> ProductScore:
+    return ProductScore(
+        product_name=request.product_name,
+        score_numerical=result['score'],
+        score_letter=result['letter'],
+        confidence_level=result['confidence'],
+        lca_result_id=request.lca_result_id
+    )
+
+
+def score_response(request: ScoreRequest, result: Dict, score_id: Optional[int]) -> ScoreResponse:
     model_used = result.get('model_name', 'rule-based')
     
     # Build explanation
@@ -256,17 +391,9 @@ def compute_score(request: ScoreRequest, db: Session = Depends(get_db)):
         f"Emballage={request.packaging_type}."
     )
     
-    # Save to DB
-    db_score = ProductScore(
-        product_name=request.product_name,
-        score_numerical=result['score'],
-        score_letter=result['letter'],
-        confidence_level=result['confidence']
-    )
-    db.add(db_score)
-    db.commit()
-    
     return ScoreResponse(
+        score_id=score_id,
+        lca_result_id=request.lca_result_id,
         product_name=request.product_name,
         score_numerical=result['score'],
         score_letter=result['letter'],
@@ -287,7 +414,8 @@ def get_model_info():
             "dataset_size": training_metrics.get('dataset_size'),
             "models_comparison": training_metrics.get('models_comparison'),
             "best_model_metrics": training_metrics.get('best_model_metrics'),
-            "trained_at": training_metrics.get('trained_at')
+            "trained_at": training_metrics.get('trained_at'),
+            "prediction_cache": prediction_cache.stats()
         }
     return {
         "model_loaded": False,
@@ -295,24 +423,140 @@ def get_model_info():
     }
 
 
-@app.post("/score/train")
-async def trigger_training():
-    """Déclenche l'entraînement du modèle ML (XGBoost + Random Forest)"""
+class TrainRequest(BaseModel):
+    strategy: Literal["grid", "random", "halving"] = "grid"
+    # {"RandomForest": {"max_depth": [8, 15]}, ...}; None: production grid, or the built-in search space
+    space: Optional[Dict[str, Dict[str, List[Any]]]] = None
+    n_iter: int = Field(10, ge=1)
+    eta: int = Field(3, ge=2)
+    seed: int = 42
+
+
+# Most recent training jobs, oldest first
+training_jobs: Dict[str, "TrainingJob"] = {}
+TRAINING_JOBS_KEPT = 20
+training_lock = threading.Lock()
+
+
+def run_training_job(job) -> Dict:
+    """Background thread: train, then swap the served model"""
+    global ml_model_bundle, training_metrics
+    bundle, metrics = train_models(verbose=False, progress=job.update, **job.options)
+    ml_model_bundle, training_metrics = bundle, metrics
+    # Entries of the previous model can no longer hit (version in the key): free them
+    prediction_cache.clear()
+    return {
+        "message": f"Model trained successfully: {bundle['model_name']}",
+        "best_model": metrics.get('best_model'),
+        "accuracy": metrics.get('best_model_metrics', {}).get('test_accuracy'),
+        "models_comparison": metrics.get('models_comparison'),
+        "search": metrics.get('search')
+    }
+
+
+@app.post("/score/train", status_code=202)
+def trigger_training(response: Response, request: Optional[TrainRequest] = None, wait: bool = False):
+    """
+    Lance l'entraînement du modèle ML en tâche de fond (XGBoost + Random Forest).
+    
+    Sans corps : la grille de production. `strategy` random/halving cherche les hyper-paramètres.
+    Suivi : `GET /score/train/{job_id}`. Avec `?wait=true`, attend la fin et répond 200 avec
+    les métriques (comportement synchrone d'avant les jobs).
+    """
     if not ML_AVAILABLE:
         raise HTTPException(status_code=500, detail="ML trainer not available")
     
-    try:
-        global ml_model_bundle, training_metrics
-        ml_model_bundle, training_metrics = train_models(verbose=False)
+    request = request or TrainRequest()
+    if request.space is not None:
+        try:
+            validate_space(request.space)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    # One training at a time (handlers run concurrently in the thread pool)
+    with training_lock:
+        running = [job for job in training_jobs.values() if job.running]
+        if running:
+            raise HTTPException(status_code=409, detail=f"Training job {running[0].id} already running")
         
-        return {
-            "status": "success",
-            "message": f"Model trained successfully: {ml_model_bundle['model_name']}",
-            "best_model": training_metrics.get('best_model'),
-            "accuracy": training_metrics.get('best_model_metrics', {}).get('test_accuracy'),
-            "models_comparison": training_metrics.get('models_comparison')
-        }
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+        job = TrainingJob(request.model_dump())
+        training_jobs[job.id] = job
+        while len(training_jobs) > TRAINING_JOBS_KEPT:
+            training_jobs.pop(next(iter(training_jobs)))
+        job.start(run_training_job)
+    
+    if wait:
+        job.thread.join()
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail=f"Training failed: {job.error}")
+        response.status_code = 200
+        return {"status": "success", "job_id": job.id, **job.result}
+    
+    return {"job_id": job.id, "status": job.status, "status_url": f"/score/train/{job.id}"}
+
+
+@app.get("/score/train/{job_id}")
+def get_training_job(job_id: str):
+    """État d'un entraînement : queued, running (progression), succeeded (résultat) ou failed"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown training job {job_id}")
+    return job.as_dict()
+
+
+# ============ EVENTS ============
+
+from ecolabel_common.events import EVENTS_ENABLED, EventBus
+
+event_bus: Optional[EventBus] = None
+
+
+def score_event(event: dict, db: Session) -> dict:
+    """lca.computed -> product.scored, same scoring as /score/compute"""
+    request = ScoreRequest(
+        product_name=event["product_name"],
+        total_co2=event["total_co2_kg"],
+        total_water=event["total_water_l"],
+        total_energy=event["total_energy_mj"],
+        packaging_type=event["packaging"]["material"],
+        packaging_weight_kg=event["packaging"]["weight_kg"],
+        transport_km=event["transport"]["distance_km"],
+        has_bio_label=event.get("has_bio_label", 0),
+        has_recyclable=event.get("has_recyclable", 0),
+        category=event.get("category") or "processed",
+        lca_result_id=event.get("lca_result_id"),
+    )
+    score = compute_score(request, db)
+    return {
+        "correlation_id": event.get("correlation_id"),
+        "product_id": event.get("product_id"),
+        "gtin": event.get("gtin"),
+        "lca_result_id": score.lca_result_id,
+        "score_id": score.score_id,
+        "product_name": score.product_name,
+        "score_numerical": score.score_numerical,
+        "score_letter": score.score_letter,
+    }
+
+
+def on_lca_computed(event: dict, db: Session) -> dict:
+    score = score_event(event, db)
+    print(f"[{event.get('correlation_id')}] ✓ scored {score['product_name']}: {score['score_letter']}")
+    return score
+
+
+@app.on_event("startup")
+async def start_events():
+    global event_bus
+    if EVENTS_ENABLED:
+        event_bus = EventBus()
+        # At most once per event: a redelivered lca.computed republishes the same score
+        event_bus.subscribe("lca.computed", "scoring", on_lca_computed, publish_to="product.scored",
+                            sessions=SessionLocal)
+        await event_bus.start()
+
+
+@app.on_event("shutdown")
+async def stop_events():
+    if event_bus is not None:
+        await event_bus.stop()
@@ -0,0 +1,43 @@
+"""
+Schema migrations applied by the scoring service on startup
+create_all() only creates missing tables, so columns and constraints added to
+existing tables are declared here and recorded in scoring_schema_migrations
+"""
+
+from ecolabel_common.migrations import run_migrations as apply_migrations
+
+# Name of the lca_result_id foreign key, matched by the score endpoints on IntegrityError
+LCA_RESULT_FK = "fk_product_scores_lca_result_id"
+
+# (id, dialect, statements), run in autocommit mode
+MIGRATIONS = [
+    ("001_product_scores_lca_result_id", "postgresql", [
+        "ALTER TABLE product_scores ADD COLUMN IF NOT EXISTS lca_result_id INTEGER",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_product_scores_lca_result_id
+           ON product_scores (lca_result_id)""",
+    ]),
+    # Separate step: lca_results is created by lca-lite, which may start later
+    ("002_product_scores_lca_result_fk", "postgresql", [
+        f"""ALTER TABLE product_scores
+           ADD CONSTRAINT {LCA_RESULT_FK}
+           FOREIGN KEY (lca_result_id) REFERENCES lca_results (id)
+           ON DELETE SET NULL NOT VALID""",
+    ]),
+    # Time-range filters of /provenance/history/scores
+    ("003_product_scores_created_at_index", "postgresql", [
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_product_scores_created_at
+           ON product_scores (created_at)""",
+    ]),
+    # Keyset pagination of widget-api /public/products (latest score per product, grade filter)
+    ("004_product_scores_keyset_indexes", "postgresql", [
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_product_scores_name_id
+           ON product_scores (product_name, id)""",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_product_scores_letter_id
+           ON product_scores (score_letter, id)""",
+    ]),
+]
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations for the engine's dialect, return the ids applied"""
+    return apply_migrations(engine, MIGRATIONS, "scoring_schema_migrations")
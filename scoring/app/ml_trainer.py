@@ -1,21 +1,24 @@
 """
 ML Trainer for Scoring Microservice
-Trains and compares XGBoost and Random Forest models
+Trains and compares XGBoost and Random Forest models (in parallel, app.training)
 Selects the best model based on cross-validation accuracy
 """
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
-import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import classification_report
 import joblib
 import json
 import os
 from datetime import datetime
 
+from ecolabel_common.encoding import UNKNOWN_CATEGORY, encoding_table
+from ecolabel_common.tracing import span
+
+from app.compiled_model import compile_model
+from app.training import TRAINING_WORKERS, TrainingEngine
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_PATH = os.path.join(BASE_DIR, 'data', 'training_dataset.csv')
@@ -54,64 +57,13 @@ def load_and_prepare_data():
     return X, y_encoded, label_encoder, packaging_encoder, category_encoder, feature_cols
 
 
-def train_random_forest(X_train, y_train, X_test, y_test):
-    """Train Random Forest model"""
-    rf_model = RandomForestClassifier(
-        n_estimators=200,
-        max_depth=15,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        class_weight='balanced',
-        random_state=42,
-        n_jobs=-1
-    )
-    
-    rf_model.fit(X_train, y_train)
-    
-    # Evaluate
-    y_pred = rf_model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    
-    # Cross-validation
-    cv_scores = cross_val_score(rf_model, X_train, y_train, cv=5, scoring='accuracy')
-    
-    return rf_model, accuracy, cv_scores.mean(), cv_scores.std()
-
-
-def train_xgboost(X_train, y_train, X_test, y_test):
-    """Train XGBoost model"""
-    xgb_model = xgb.XGBClassifier(
-        n_estimators=200,
-        max_depth=8,
-        learning_rate=0.1,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        min_child_weight=3,
-        gamma=0.1,
-        reg_alpha=0.1,
-        reg_lambda=1.0,
-        objective='multi:softprob',
-        num_class=5,
-        random_state=42,
-        use_label_encoder=False,
-        eval_metric='mlogloss',
-        n_jobs=-1
-    )
-    
-    xgb_model.fit(X_train, y_train)
-    
-    # Evaluate
-    y_pred = xgb_model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    
-    # Cross-validation
-    cv_scores = cross_val_score(xgb_model, X_train, y_train, cv=5, scoring='accuracy')
-    
-    return xgb_model, accuracy, cv_scores.mean(), cv_scores.std()
-
+def train_models(verbose=True, strategy='grid', space=None, n_iter=10, eta=3, seed=42,
+                 workers=None, progress=None):
+    """Train all candidate models in parallel (see app.training) and select the best one
 
-def train_models(verbose=True):
-    """Train all models and select the best one"""
+    The default grid trains the production RandomForest and XGBoost; strategy
+    'random' or 'halving' searches hyper-parameters.
+    """
     if verbose:
         print("=" * 60)
         print("ML TRAINING - Scoring Model")
@@ -126,45 +78,28 @@ def train_models(verbose=True):
         unique, counts = np.unique(y, return_counts=True)
         print(f"   Distribution: {dict(zip(label_encoder.inverse_transform(unique), counts))}")
     
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    
+    # Cross-validate every candidate (models x folds in a process pool), refit the best of each family
+    engine = TrainingEngine(workers=workers or TRAINING_WORKERS, progress=progress)
     if verbose:
-        print(f"\n🔄 Training set: {len(X_train)} samples")
-        print(f"   Test set: {len(X_test)} samples")
-    
-    # Train models
-    if verbose:
-        print("\n🌲 Training Random Forest...")
-    rf_model, rf_accuracy, rf_cv_mean, rf_cv_std = train_random_forest(X_train, y_train, X_test, y_test)
-    
-    if verbose:
-        print(f"   Test Accuracy: {rf_accuracy:.4f}")
-        print(f"   CV Accuracy: {rf_cv_mean:.4f} (+/- {rf_cv_std:.4f})")
-    
-    if verbose:
-        print("\n🚀 Training XGBoost...")
-    xgb_model, xgb_accuracy, xgb_cv_mean, xgb_cv_std = train_xgboost(X_train, y_train, X_test, y_test)
+        print(f"\n🔄 Search: {strategy} with {engine.workers} workers")
+    search = engine.search(X, y, strategy=strategy, space=space, n_iter=n_iter, eta=eta, seed=seed)
+    X_train, X_test, y_test = search['X_train'], search['X_test'], search['y_test']
     
     if verbose:
-        print(f"   Test Accuracy: {xgb_accuracy:.4f}")
-        print(f"   CV Accuracy: {xgb_cv_mean:.4f} (+/- {xgb_cv_std:.4f})")
-    
-    # Select best model (based on CV accuracy)
-    if xgb_cv_mean >= rf_cv_mean:
-        best_model = xgb_model
-        best_name = "XGBoost"
-        best_accuracy = xgb_accuracy
-        best_cv_mean = xgb_cv_mean
-        best_cv_std = xgb_cv_std
-    else:
-        best_model = rf_model
-        best_name = "RandomForest"
-        best_accuracy = rf_accuracy
-        best_cv_mean = rf_cv_mean
-        best_cv_std = rf_cv_std
+        print(f"   Training set: {len(X_train)} samples")
+        print(f"   Test set: {len(X_test)} samples")
+        for name, result in search['best'].items():
+            print(f"\n   {name} {result['params']}")
+            print(f"   Test Accuracy: {result['test_accuracy']:.4f}")
+            print(f"   CV Accuracy: {result['cv_accuracy_mean']:.4f} (+/- {result['cv_accuracy_std']:.4f})")
+    
+    # Select best model (based on CV accuracy, XGBoost on ties)
+    best = max(search['best'].values(), key=lambda r: (r['cv_accuracy_mean'], r['family'] == 'XGBoost'))
+    best_model = best['model']
+    best_name = best['family']
+    best_accuracy = best['test_accuracy']
+    best_cv_mean = best['cv_accuracy_mean']
+    best_cv_std = best['cv_accuracy_std']
     
     if verbose:
         print(f"\n✅ Best Model: {best_name}")
@@ -178,14 +113,21 @@ def train_models(verbose=True):
         print("\n📈 Classification Report:")
         print(classification_report(y_test, y_pred, target_names=['A', 'B', 'C', 'D', 'E']))
     
-    # Save model
+    # Save model, with its flattened copy used for online inference
+    trained_at = datetime.now().isoformat()
     model_bundle = {
         'model': best_model,
         'model_name': best_name,
         'label_encoder': label_encoder,
         'packaging_encoder': packaging_encoder,
         'category_encoder': category_encoder,
-        'feature_cols': feature_cols
+        'feature_cols': feature_cols,
+        # Inference encodes with these instead of LabelEncoder.transform
+        'packaging_codes': encoding_table(packaging_encoder),
+        'category_codes': encoding_table(category_encoder),
+        'compiled': compile_model(best_model, len(feature_cols)),
+        # Part of the prediction cache key: a retrained model never serves old entries
+        'version': f"{best_name}@{trained_at}"
     }
     
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
@@ -196,23 +138,21 @@ def train_models(verbose=True):
     
     # Save metrics
     metrics = {
-        'trained_at': datetime.now().isoformat(),
+        'trained_at': trained_at,
         'dataset_size': len(X),
         'train_size': len(X_train),
         'test_size': len(X_test),
         'best_model': best_name,
         'models_comparison': {
-            'RandomForest': {
-                'test_accuracy': float(rf_accuracy),
-                'cv_accuracy_mean': float(rf_cv_mean),
-                'cv_accuracy_std': float(rf_cv_std)
-            },
-            'XGBoost': {
-                'test_accuracy': float(xgb_accuracy),
-                'cv_accuracy_mean': float(xgb_cv_mean),
-                'cv_accuracy_std': float(xgb_cv_std)
+            name: {
+                'test_accuracy': result['test_accuracy'],
+                'cv_accuracy_mean': result['cv_accuracy_mean'],
+                'cv_accuracy_std': result['cv_accuracy_std'],
+                'params': result['params']
             }
+            for name, result in search['best'].items()
         },
+        'search': search['search'],
         'best_model_metrics': {
             'test_accuracy': float(best_accuracy),
             'cv_accuracy_mean': float(best_cv_mean),
@@ -242,58 +182,75 @@ def load_model():
         print("No model found. Training new model...")
         train_models()
     
-    return joblib.load(MODEL_PATH)
+    with span("model.load", model="scoring"):
+        model_bundle = joblib.load(MODEL_PATH)
+    # Bundles saved before the export step are compiled on load
+    if 'compiled' not in model_bundle:
+        model_bundle['compiled'] = compile_model(model_bundle['model'], len(model_bundle['feature_cols']))
+    if 'packaging_codes' not in model_bundle:
+        model_bundle['packaging_codes'] = encoding_table(model_bundle['packaging_encoder'])
+        model_bundle['category_codes'] = encoding_table(model_bundle['category_encoder'])
+    if 'version' not in model_bundle:
+        model_bundle['version'] = f"{model_bundle['model_name']}@{os.path.getmtime(MODEL_PATH)}"
+    return model_bundle
 
 
 def predict(co2_kg, water_l, energy_mj, packaging_type='plastic', 
             packaging_weight_kg=0.3, transport_km=200,
             has_bio_label=0, has_recyclable=0, has_local_label=0,
-            category='processed'):
-    """Make a prediction using the trained model"""
-    model_bundle = load_model()
-    model = model_bundle['model']
-    packaging_encoder = model_bundle['packaging_encoder']
-    category_encoder = model_bundle['category_encoder']
+            category='processed', model_bundle=None, cache=None):
+    """Make a prediction using the trained model (loaded from disk unless model_bundle is given)
+
+    With a PredictionCache, repeated feature vectors are served from it
+    without running the model.
+    """
+    if model_bundle is None:
+        model_bundle = load_model()
+    compiled = model_bundle['compiled']
+    packaging_codes = model_bundle['packaging_codes']
+    category_codes = model_bundle['category_codes']
     label_encoder = model_bundle['label_encoder']
     
     # Encode inputs
-    try:
-        packaging_encoded = packaging_encoder.transform([packaging_type])[0]
-    except ValueError:
-        packaging_encoded = 0  # Default
-    
-    try:
-        category_encoded = category_encoder.transform([category])[0]
-    except ValueError:
-        category_encoded = 0  # Default
+    packaging_encoded = packaging_codes.get(packaging_type, packaging_codes[UNKNOWN_CATEGORY])
+    category_encoded = category_codes.get(category, category_codes[UNKNOWN_CATEGORY])
     
     # Prepare features
-    features = np.array([[
+    features = [
         co2_kg, water_l, energy_mj,
         packaging_weight_kg, transport_km,
         has_bio_label, has_recyclable, has_local_label,
         packaging_encoded, category_encoded
-    ]])
+    ]
+    
+    if cache is not None and cache.enabled:
+        features = cache.quantize(features)
+        key = cache.key(model_bundle['version'], features)
+        cached = cache.get(key)
+        if cached is not None:
+            return {**cached, 'probabilities': dict(cached['probabilities'])}
     
-    # Predict
-    prediction = model.predict(features)[0]
-    probabilities = model.predict_proba(features)[0]
+    # Predict (same probabilities as model.predict_proba, without the library overhead)
+    probabilities = compiled.predict_one(np.array(features, dtype=np.float64))
     
     # Decode
-    grade = label_encoder.inverse_transform([prediction])[0]
+    grade = label_encoder.classes_[int(np.argmax(probabilities))]
     proba_dict = {
-        label_encoder.inverse_transform([i])[0]: float(p)
-        for i, p in enumerate(probabilities)
+        letter: float(p)
+        for letter, p in zip(label_encoder.classes_, probabilities)
     }
     
     confidence = float(max(probabilities))
     
-    return {
+    result = {
         'grade': grade,
         'confidence': confidence,
         'probabilities': proba_dict,
         'model_name': model_bundle['model_name']
     }
+    if cache is not None and cache.enabled:
+        cache.put(key, {**result, 'probabilities': dict(proba_dict)})
+    return result
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -12,4 +12,13 @@ class ProductScore(Base):
     score_numerical = Column(Float)
     score_letter = Column(String(1)) # A, B, C, D, E
     confidence_level = Column(Float)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # provenance history since/until
+    # LCA calculation the score was computed from (lca_results.id, owned by lca-lite).
+    # The foreign key is added by app/migrations.py since lca_results is not in this metadata.
+    lca_result_id = Column(Integer, index=True, nullable=True)
+
+    __table_args__ = (
+        # Used by widget-api keyset pagination (see widget-api/backend/app/models.py)
+        Index("ix_product_scores_name_id", "product_name", "id"),
+        Index("ix_product_scores_letter_id", "score_letter", "id"),
+    )
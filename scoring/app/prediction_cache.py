@@ -0,0 +1,94 @@
+"""
+LRU cache of ML predictions
+Keyed by model version + encoded feature vector; continuous features can be
+quantized so that near-identical inputs (same product rescored, same LCA
+output up to float noise) share an entry
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from ecolabel_common.metrics import record_cache
+
+# ============ CONFIGURATION ============
+# Entries kept (0 disables the cache)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+# Decimals kept on continuous features (co2, water, energy, packaging weight,
+# transport); empty = exact values
+_precision = os.getenv("PREDICTION_CACHE_PRECISION", "")
+PREDICTION_CACHE_PRECISION = int(_precision) if _precision else None
+
+# Positions of the continuous features in the model's feature vector
+CONTINUOUS_FEATURES = (0, 1, 2, 3, 4)
+
+
+class PredictionCache:
+    """Thread-safe LRU of prediction results (sync handlers run in a thread pool)"""
+
+    def __init__(self, max_size: int = PREDICTION_CACHE_SIZE, precision: Optional[int] = PREDICTION_CACHE_PRECISION,
+                 name: str = "scoring_predictions"):
+        self.max_size = max_size
+        self.precision = precision
+        self.name = name
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def quantize(self, features: list) -> list:
+        """Round the continuous features to the configured precision
+
+        Applied before prediction as well as for the key, so a cached result is
+        exactly what the model returns for the quantized input.
+        """
+        if self.precision is None:
+            return features
+        return [
+            round(float(value), self.precision) if i in CONTINUOUS_FEATURES else value
+            for i, value in enumerate(features)
+        ]
+
+    @staticmethod
+    def key(model_version: str, features: list) -> tuple:
+        return (model_version, *(float(value) for value in features))
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        record_cache(self.name, hit=result is not None)
+        return result
+
+    def put(self, key: tuple, result: dict):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "precision": self.precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,385 @@
+"""
+Training engine for the scoring model
+
+Candidates (model family + hyper-parameters) are cross-validated in a process
+pool, one task per candidate and fold, so models and folds train concurrently.
+
+    grid      every combination of the search space
+    random    n_iter combinations drawn per family
+    halving   successive halving on n_estimators: every candidate is first
+              scored with few trees, the best 1/eta of each family go on with
+              eta times more trees, until the full number of trees
+
+The hold-out split, the CV folds (StratifiedKFold without shuffling, as
+cross_val_score) and the feature matrix are computed once per dataset and
+cached as .npz in TRAINING_CACHE_DIR; workers load it once per process.
+"""
+
+import argparse
+import hashlib
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+import xgboost as xgb
+
+# ============ CONFIGURATION ============
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Half the CPUs by default: the service keeps serving /score/compute during a training
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+TRAINING_CACHE_DIR = os.getenv("TRAINING_CACHE_DIR", os.path.join(BASE_DIR, 'models', 'cache'))
+CV_FOLDS = int(os.getenv("TRAINING_CV_FOLDS", "5"))
+
+STRATEGIES = ("grid", "random", "halving")
+
+# Fixed parameters of each family (searched values override them)
+FAMILY_DEFAULTS = {
+    'RandomForest': {'class_weight': 'balanced', 'random_state': 42},
+    'XGBoost': {'objective': 'multi:softprob', 'num_class': 5, 'eval_metric': 'mlogloss', 'random_state': 42},
+}
+
+# The production configuration: "grid" on this space trains the two models of
+# the previous sequential trainer, with the same CV folds and scores
+DEFAULT_SPACE = {
+    'RandomForest': {
+        'n_estimators': [200], 'max_depth': [15], 'min_samples_split': [5], 'min_samples_leaf': [2],
+    },
+    'XGBoost': {
+        'n_estimators': [200], 'max_depth': [8], 'learning_rate': [0.1], 'subsample': [0.8],
+        'colsample_bytree': [0.8], 'min_child_weight': [3], 'gamma': [0.1], 'reg_alpha': [0.1],
+        'reg_lambda': [1.0],
+    },
+}
+
+# Explored by "random" and "halving" when no space is given
+SEARCH_SPACE = {
+    'RandomForest': {
+        'n_estimators': [200], 'max_depth': [8, 15, None], 'min_samples_split': [2, 5, 10],
+        'min_samples_leaf': [1, 2, 4],
+    },
+    'XGBoost': {
+        'n_estimators': [200], 'max_depth': [4, 6, 8], 'learning_rate': [0.05, 0.1, 0.2],
+        'subsample': [0.8, 1.0], 'colsample_bytree': [0.8, 1.0], 'min_child_weight': [1, 3],
+        'gamma': [0.1], 'reg_alpha': [0.1], 'reg_lambda': [1.0],
+    },
+}
+
+
+def build_model(family: str, params: dict, n_jobs: int = 1):
+    """Unfitted model; one thread each, the pool provides the parallelism"""
+    params = {**FAMILY_DEFAULTS[family], **params}
+    if family == 'RandomForest':
+        return RandomForestClassifier(**params, n_jobs=n_jobs)
+    return xgb.XGBClassifier(**params, n_jobs=n_jobs)
+
+
+def validate_space(space: Dict[str, Dict[str, list]]):
+    """ValueError for unknown families or empty value lists"""
+    if not space:
+        raise ValueError("Empty search space")
+    for family, grid in space.items():
+        if family not in FAMILY_DEFAULTS:
+            raise ValueError(f"Unknown model family '{family}' (expected one of {', '.join(FAMILY_DEFAULTS)})")
+        for name, values in grid.items():
+            if not isinstance(values, list) or not values:
+                raise ValueError(f"{family}.{name}: expected a non-empty list of values")
+
+
+def grid_candidates(space: dict) -> List[dict]:
+    candidates = []
+    for family, grid in space.items():
+        names = list(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            candidates.append({'family': family, 'params': dict(zip(names, values))})
+    return candidates
+
+
+def random_candidates(space: dict, n_iter: int, seed: int) -> List[dict]:
+    """Up to n_iter distinct combinations per family, reproducible for a seed"""
+    rng = random.Random(seed)
+    candidates = []
+    for family, grid in space.items():
+        combinations = grid_candidates({family: grid})
+        candidates.extend(rng.sample(combinations, min(n_iter, len(combinations))))
+    return candidates
+
+
+# ============ DATASET CACHE ============
+
+class DatasetCache:
+    """Hold-out split and CV folds of a dataset, stored once as .npz"""
+
+    def __init__(self, cache_dir: str = TRAINING_CACHE_DIR, n_splits: int = CV_FOLDS):
+        self.cache_dir = cache_dir
+        self.n_splits = n_splits
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, X: np.ndarray, y: np.ndarray) -> str:
+        digest = hashlib.sha1(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(y).tobytes())
+        return os.path.join(self.cache_dir, f"scoring-{digest.hexdigest()[:16]}-cv{self.n_splits}.npz")
+
+    def prepare(self, X: np.ndarray, y: np.ndarray) -> str:
+        path = self.path(X, y)
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+        arrays = {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}
+        for fold, (train, val) in enumerate(StratifiedKFold(n_splits=self.n_splits).split(X_train, y_train)):
+            arrays[f'fold{fold}_train'] = train
+            arrays[f'fold{fold}_val'] = val
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written aside then renamed: concurrent jobs never read a partial file
+        partial = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(partial, **arrays)
+        os.replace(partial, path)
+        return path
+
+
+# Per-process copy of the cached datasets (workers load each file once)
+_DATASETS = {}
+
+
+def load_dataset(path: str) -> Dict[str, np.ndarray]:
+    if path not in _DATASETS:
+        with np.load(path) as data:
+            _DATASETS[path] = {name: data[name] for name in data.files}
+    return _DATASETS[path]
+
+
+def fit_fold(path: str, family: str, params: dict, fold: int) -> float:
+    """Worker task: accuracy of one candidate on one CV fold"""
+    data = load_dataset(path)
+    train, val = data[f'fold{fold}_train'], data[f'fold{fold}_val']
+    X, y = data['X_train'], data['y_train']
+    model = build_model(family, params).fit(X[train], y[train])
+    return float(accuracy_score(y[val], model.predict(X[val])))
+
+
+def fit_final(path: str, family: str, params: dict):
+    """Worker task: candidate refit on the whole training split, with its test accuracy"""
+    data = load_dataset(path)
+    model = build_model(family, params).fit(data['X_train'], data['y_train'])
+    return model, float(accuracy_score(data['y_test'], model.predict(data['X_test'])))
+
+
+class InlineExecutor:
+    """Runs the tasks in the calling thread (TRAINING_WORKERS=1)"""
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# ============ ENGINE ============
+
+class TrainingEngine:
+    """Cross-validates candidates in parallel and refits the best one of each family"""
+
+    def __init__(self, workers: int = TRAINING_WORKERS, cache: Optional[DatasetCache] = None,
+                 progress: Optional[Callable[[dict], None]] = None):
+        self.workers = max(1, workers)
+        self.cache = cache or DatasetCache()
+        self.progress = progress or (lambda state: None)
+        self.fits = 0
+
+    def executor(self):
+        if self.workers == 1:
+            return InlineExecutor()
+        # spawn: forking a process that already runs OpenMP (XGBoost) or threads can deadlock
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def evaluate(self, pool, path: str, candidates: List[dict], phase: str) -> List[dict]:
+        """CV scores of every candidate, all folds of all candidates submitted at once"""
+        futures = [
+            pool.submit(fit_fold, path, candidate['family'], candidate['params'], fold)
+            for candidate in candidates for fold in range(self.cache.n_splits)
+        ]
+        self.progress({'phase': phase, 'done': 0, 'total': len(futures)})
+        for done, _ in enumerate(as_completed(futures), 1):
+            self.progress({'phase': phase, 'done': done, 'total': len(futures)})
+        scores = [future.result() for future in futures]
+        self.fits += len(futures)
+        results = []
+        for i, candidate in enumerate(candidates):
+            folds = scores[i * self.cache.n_splits:(i + 1) * self.cache.n_splits]
+            results.append({**candidate, 'cv_accuracy_mean': float(np.mean(folds)),
+                            'cv_accuracy_std': float(np.std(folds)), 'fold_scores': folds})
+        return results
+
+    def halving(self, pool, path: str, candidates: List[dict], eta: int) -> List[dict]:
+        """Successive halving on n_estimators, within each family; results of the last round"""
+        families = list(dict.fromkeys(candidate['family'] for candidate in candidates))
+        max_trees = {family: max(c['params'].get('n_estimators', 100) for c in candidates if c['family'] == family)
+                     for family in families}
+        largest = max(sum(c['family'] == family for c in candidates) for family in families)
+        rounds = 1 + int(math.floor(math.log(largest, eta)))
+
+        survivors = candidates
+        for round_index in range(rounds):
+            # eta times fewer trees per round left, full size in the last one
+            shrink = eta ** (rounds - 1 - round_index)
+            sized = [
+                {'family': c['family'], 'params': {**c['params'], 'n_estimators': max(10, max_trees[c['family']] // shrink)}}
+                for c in survivors
+            ]
+            results = self.evaluate(pool, path, sized, phase=f"halving round {round_index + 1}/{rounds}")
+            if round_index == rounds - 1:
+                return results
+            kept = []
+            for family in families:
+                ranked = sorted((pair for pair in zip(results, survivors) if pair[1]['family'] == family),
+                                key=lambda pair: -pair[0]['cv_accuracy_mean'])
+                kept.extend(candidate for _, candidate in ranked[:math.ceil(len(ranked) / eta)])
+            survivors = kept
+
+    def search(self, X: np.ndarray, y: np.ndarray, strategy: str = "grid", space: Optional[dict] = None,
+               n_iter: int = 10, eta: int = 3, seed: int = 42) -> dict:
+        """Best candidate per family, refitted on the training split, and the search summary"""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}' (expected one of {', '.join(STRATEGIES)})")
+        space = space or (DEFAULT_SPACE if strategy == "grid" else SEARCH_SPACE)
+        validate_space(space)
+        candidates = random_candidates(space, n_iter, seed) if strategy == "random" else grid_candidates(space)
+
+        started = time.perf_counter()
+        path = self.cache.prepare(X, y)
+        with self.executor() as pool:
+            if strategy == "halving":
+                results = self.halving(pool, path, candidates, eta)
+            else:
+                results = self.evaluate(pool, path, candidates, phase="cross-validation")
+
+            best = {}
+            for result in results:
+                family = result['family']
+                if family not in best or result['cv_accuracy_mean'] > best[family]['cv_accuracy_mean']:
+                    best[family] = result
+            self.progress({'phase': 'refit', 'done': 0, 'total': len(best)})
+            futures = {family: pool.submit(fit_final, path, family, result['params'])
+                       for family, result in best.items()}
+            for family, future in futures.items():
+                model, test_accuracy = future.result()
+                best[family].update(model=model, test_accuracy=test_accuracy)
+            self.fits += len(futures)
+        data = load_dataset(path)
+        return {
+            'best': best,
+            'X_train': data['X_train'], 'X_test': data['X_test'],
+            'y_train': data['y_train'], 'y_test': data['y_test'],
+            'search': {
+                'strategy': strategy,
+                'candidates': len(candidates),
+                'fits': self.fits,
+                'workers': self.workers,
+                'cv_folds': self.cache.n_splits,
+                'duration_s': round(time.perf_counter() - started, 2),
+                'best_params': {family: result['params'] for family, result in best.items()},
+            },
+        }
+
+
+# ============ BACKGROUND JOBS ============
+
+class TrainingJob:
+    """One training run in a background thread, observable through as_dict()"""
+
+    def __init__(self, options: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.options = options
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def update(self, progress: dict):
+        self.progress = progress
+
+    def start(self, target: Callable[["TrainingJob"], dict]):
+        """Run target(job) in a daemon thread; its return value becomes the result"""
+        def run():
+            self.status = "running"
+            self.started_at = datetime.now().isoformat()
+            try:
+                self.result = target(self)
+                self.status = "succeeded"
+            except Exception as e:
+                traceback.print_exc()
+                self.error = str(e)
+                self.status = "failed"
+            finally:
+                self.finished_at = datetime.now().isoformat()
+
+        self.thread = threading.Thread(target=run, name=f"training-{self.id}", daemon=True)
+        self.thread.start()
+
+    def as_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'options': self.options,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def main(argv=None):
+    from app.ml_trainer import train_models
+
+    parser = argparse.ArgumentParser(prog="python -m app.training", description="Train the scoring model")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="grid",
+                        help="grid on the production space by default; random/halving explore SEARCH_SPACE")
+    parser.add_argument("--n-iter", type=int, default=10, help="candidates per family (random)")
+    parser.add_argument("--eta", type=int, default=3, help="halving factor (halving)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=TRAINING_WORKERS)
+    args = parser.parse_args(argv)
+
+    _, metrics = train_models(verbose=True, strategy=args.strategy, n_iter=args.n_iter, eta=args.eta,
+                              seed=args.seed, workers=args.workers)
+    print(f"✓ {metrics['search']['fits']} fits in {metrics['search']['duration_s']}s "
+          f"with {metrics['search']['workers']} workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Fixtures partagées des tests du microservice Scoring
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sqlite_sessions(tmp_path):
+    """Sessions sur une base SQLite temporaire avec le schéma du service"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.models import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'scores.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_db(sqlite_sessions):
+    """Les endpoints de l'application utilisent la base SQLite temporaire (get_db remplacé)"""
+    from app.main import app, get_db
+
+    def override_get_db():
+        db = sqlite_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield sqlite_sessions
+    app.dependency_overrides.pop(get_db, None)
@@ -8,6 +8,8 @@ import sys
 import os
 import json
 
+import numpy as np
+
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -31,6 +33,14 @@ class TestScoringAPI:
         assert data["status"] == "healthy"
         assert "model_loaded" in data
     
+    def test_metrics_endpoint(self):
+        """Test de l'exposition Prometheus sur /metrics"""
+        self.client.get("/health")
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        assert 'http_requests_total{method="GET",route="/health",status="200"}' in response.text
+        assert "db_pool_connections" in response.text
+    
     def test_compute_score_valid_input(self):
         """Test du calcul de score avec des entrées valides"""
         payload = {
@@ -149,6 +159,23 @@ class TestMLTrainer:
         assert 0 <= result["confidence"] <= 1
         assert "probabilities" in result
     
+    def test_encoding_tables(self):
+        """Test des tables d'encodage du bundle (identiques au LabelEncoder, inconnu -> 0)"""
+        from app.ml_trainer import UNKNOWN_CATEGORY, load_model, predict
+        bundle = load_model()
+        
+        for encoder, codes in ((bundle['packaging_encoder'], bundle['packaging_codes']),
+                               (bundle['category_encoder'], bundle['category_codes'])):
+            for value in encoder.classes_:
+                assert codes[value] == encoder.transform([value])[0]
+            assert codes[UNKNOWN_CATEGORY] == 0
+        
+        features = dict(co2_kg=1.0, water_l=40.0, energy_mj=2.5, model_bundle=bundle)
+        first_packaging = bundle['packaging_encoder'].classes_[0]
+        first_category = bundle['category_encoder'].classes_[0]
+        assert predict(packaging_type="bois", category="inconnue", **features) == \
+            predict(packaging_type=first_packaging, category=first_category, **features)
+    
     def test_label_encoder_classes(self):
         """Test des classes du label encoder"""
         from app.ml_trainer import load_and_prepare_data
@@ -158,6 +185,248 @@ class TestMLTrainer:
         assert list(label_encoder.classes_) == expected_classes
 
 
+class TestPredictionCache:
+    """Tests du cache LRU des prédictions"""
+    
+    FEATURES = dict(co2_kg=1.0, water_l=40.0, energy_mj=2.5, packaging_type="glass", category="sauce")
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        from app.ml_trainer import load_model
+        self.bundle = load_model()
+    
+    def test_repeated_inputs_hit(self):
+        from app.ml_trainer import predict
+        from app.prediction_cache import PredictionCache
+        cache = PredictionCache(max_size=10)
+        
+        first = predict(**self.FEATURES, model_bundle=self.bundle, cache=cache)
+        first["probabilities"]["A"] = -1  # callers' changes do not leak into the cache
+        second = predict(**self.FEATURES, model_bundle=self.bundle, cache=cache)
+        
+        assert second == predict(**self.FEATURES, model_bundle=self.bundle)
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    
+    def test_model_version_is_part_of_the_key(self):
+        from app.ml_trainer import predict
+        from app.prediction_cache import PredictionCache
+        cache = PredictionCache(max_size=10)
+        
+        predict(**self.FEATURES, model_bundle=self.bundle, cache=cache)
+        predict(**self.FEATURES, model_bundle={**self.bundle, "version": "retrained"}, cache=cache)
+        
+        assert cache.stats()["hits"] == 0 and cache.stats()["size"] == 2
+    
+    def test_quantization_shares_entries(self):
+        from app.ml_trainer import predict
+        from app.prediction_cache import PredictionCache
+        cache = PredictionCache(max_size=10, precision=2)
+        
+        result = predict(**{**self.FEATURES, "co2_kg": 1.0001}, model_bundle=self.bundle, cache=cache)
+        
+        assert predict(**{**self.FEATURES, "co2_kg": 0.9999}, model_bundle=self.bundle, cache=cache) == result
+        assert cache.stats()["hits"] == 1
+        # Cached value = prediction on the quantized features
+        assert result == predict(**self.FEATURES, model_bundle=self.bundle)
+    
+    def test_lru_eviction(self):
+        from app.prediction_cache import PredictionCache
+        cache = PredictionCache(max_size=2)
+        cache.put(("v", 1.0), {"grade": "A"})
+        cache.put(("v", 2.0), {"grade": "B"})
+        cache.get(("v", 1.0))
+        cache.put(("v", 3.0), {"grade": "C"})
+        
+        assert cache.get(("v", 2.0)) is None
+        assert cache.get(("v", 1.0)) == {"grade": "A"}
+
+
+@pytest.fixture(scope="module")
+def split_data():
+    from sklearn.model_selection import train_test_split
+    from app.ml_trainer import load_and_prepare_data
+    X, y, *_ = load_and_prepare_data()
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+
+class TestCompiledModel:
+    """Tests de l'évaluateur compilé (parité avec predict_proba)"""
+    
+    def check_parity(self, model, X):
+        from app.compiled_model import compile_model
+        compiled = compile_model(model, X.shape[1])
+        expected = model.predict_proba(X)
+        
+        np.testing.assert_allclose(compiled.predict_proba(X), expected, rtol=0, atol=1e-6)
+        np.testing.assert_allclose(compiled.predict_one(X[0]), expected[0], rtol=0, atol=1e-6)
+        assert (compiled.predict_proba(X).argmax(axis=1) == model.predict(X)).all()
+    
+    def test_random_forest_parity(self, split_data):
+        from sklearn.ensemble import RandomForestClassifier
+        X_train, X_test, y_train, _ = split_data
+        model = RandomForestClassifier(n_estimators=50, max_depth=15, min_samples_leaf=2,
+                                       class_weight='balanced', random_state=42).fit(X_train, y_train)
+        self.check_parity(model, X_test)
+    
+    def test_xgboost_parity(self, split_data):
+        import xgboost as xgb
+        X_train, X_test, y_train, _ = split_data
+        model = xgb.XGBClassifier(n_estimators=50, max_depth=8, learning_rate=0.1, subsample=0.8,
+                                  objective='multi:softprob', random_state=42).fit(X_train, y_train)
+        self.check_parity(model, X_test)
+    
+    def test_predict_uses_given_bundle(self):
+        """Test que predict utilise le bundle fourni (pas de rechargement)"""
+        from app.ml_trainer import load_model, predict
+        bundle = load_model()
+        features = dict(co2_kg=1.0, water_l=40.0, energy_mj=2.5, packaging_type="glass", category="sauce")
+        
+        result = predict(**features, model_bundle=bundle)
+        
+        assert result == predict(**features)
+        assert result["grade"] == max(result["probabilities"], key=result["probabilities"].get)
+
+
+class TestTrainingEngine:
+    """Tests du moteur d'entraînement parallèle (recherche d'hyper-paramètres)"""
+    
+    SMALL_SPACE = {
+        'RandomForest': {'n_estimators': [20], 'max_depth': [5]},
+        'XGBoost': {'n_estimators': [20], 'max_depth': [3]},
+    }
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        from app.ml_trainer import load_and_prepare_data
+        from app.training import DatasetCache
+        self.X, self.y, *_ = load_and_prepare_data()
+        self.cache = DatasetCache(cache_dir=str(tmp_path))
+    
+    def test_grid_matches_cross_val_score(self, split_data):
+        """Test que le pool de processus donne les scores de cross_val_score"""
+        from sklearn.model_selection import cross_val_score
+        from app.training import TrainingEngine, build_model
+        X_train, _, y_train, _ = split_data
+        
+        result = TrainingEngine(workers=2, cache=self.cache).search(self.X, self.y, space=self.SMALL_SPACE)
+        
+        for family, best in result['best'].items():
+            expected = cross_val_score(build_model(family, best['params']), X_train, y_train, cv=5)
+            assert best['cv_accuracy_mean'] == pytest.approx(expected.mean())
+            assert best['test_accuracy'] > 0.8
+        assert result['search']['fits'] == 2 * 5 + 2
+    
+    def test_successive_halving(self):
+        from app.training import TrainingEngine
+        space = {'RandomForest': {'n_estimators': [30], 'max_depth': [2, 4, 8], 'min_samples_leaf': [1, 2, 4]}}
+        phases = []
+        engine = TrainingEngine(workers=1, cache=self.cache, progress=lambda state: phases.append(state['phase']))
+        
+        result = engine.search(self.X, self.y, strategy="halving", space=space, eta=3)
+        
+        # 9 candidates with 10 trees, the best 3 with 10, the best one with 30, then the refit
+        assert result['search']['fits'] == 9 * 5 + 3 * 5 + 1 * 5 + 1
+        assert result['best']['RandomForest']['params']['n_estimators'] == 30
+        assert "halving round 3/3" in phases
+    
+    def test_random_search_is_reproducible(self):
+        from app.training import SEARCH_SPACE, random_candidates
+        candidates = random_candidates(SEARCH_SPACE, n_iter=3, seed=1)
+        
+        assert candidates == random_candidates(SEARCH_SPACE, n_iter=3, seed=1)
+        assert [c['family'] for c in candidates] == ['RandomForest'] * 3 + ['XGBoost'] * 3
+        assert len({json.dumps(c, sort_keys=True) for c in candidates}) == 6
+    
+    def test_dataset_cache_is_reused(self):
+        from app.training import load_dataset
+        path = self.cache.prepare(self.X, self.y)
+        
+        assert self.cache.prepare(self.X, self.y) == path
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        data = load_dataset(path)
+        assert len(data['X_train']) + len(data['X_test']) == len(self.X)
+        assert sorted(np.concatenate([data[f'fold{i}_val'] for i in range(5)])) == list(range(len(data['X_train'])))
+    
+    def test_unknown_family_is_rejected(self):
+        from app.main import app
+        response = TestClient(app).post("/score/train", json={"space": {"SVM": {"C": [1.0]}}})
+        assert response.status_code == 422
+
+
+class TestTrainingJobs:
+    """Tests de l'entraînement en tâche de fond (/score/train)"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        import threading
+        from app import main
+        from app.ml_trainer import load_model
+        self.main = main
+        self.release = threading.Event()
+        self.bundle = {**load_model(), 'version': 'job-test'}
+        
+        def fake_train_models(verbose, progress, **options):
+            progress({'phase': 'cross-validation', 'done': 0, 'total': 10})
+            self.release.wait(5)
+            return self.bundle, {'best_model': 'RandomForest', 'search': {'strategy': options['strategy']}}
+        
+        monkeypatch.setattr(main, "train_models", fake_train_models)
+        monkeypatch.setattr(main, "training_jobs", {})
+        monkeypatch.setattr(main, "ml_model_bundle", main.ml_model_bundle)
+        monkeypatch.setattr(main, "training_metrics", main.training_metrics)
+        self.client = TestClient(main.app)
+        yield
+        self.release.set()
+    
+    def wait_for(self, job_id, timeout=5.0):
+        import time
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.client.get(f"/score/train/{job_id}").json()
+            if job["status"] in ("succeeded", "failed"):
+                return job
+            time.sleep(0.02)
+        raise AssertionError(f"job {job_id} still {job['status']}")
+    
+    def test_training_runs_in_background(self):
+        response = self.client.post("/score/train", json={"strategy": "halving"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        
+        assert self.client.get(f"/score/train/{job_id}").json()["status"] in ("queued", "running")
+        assert self.client.post("/score/train").status_code == 409
+        
+        self.release.set()
+        job = self.wait_for(job_id)
+        assert job["status"] == "succeeded"
+        assert job["options"]["strategy"] == "halving"
+        assert job["result"]["search"] == {"strategy": "halving"}
+        assert self.main.ml_model_bundle is self.bundle
+    
+    def test_wait_returns_metrics(self):
+        """Test de ?wait=true : réponse synchrone 200 avec les métriques, comme avant les jobs"""
+        self.release.set()
+        response = self.client.post("/score/train?wait=true")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "success"
+        assert data["best_model"] == "RandomForest"
+        assert self.client.get(f"/score/train/{data['job_id']}").json()["status"] == "succeeded"
+        assert self.main.ml_model_bundle is self.bundle
+    
+    def test_wait_reports_failure(self, monkeypatch):
+        def failing_train_models(verbose, progress, **options):
+            raise RuntimeError("no data")
+        
+        monkeypatch.setattr(self.main, "train_models", failing_train_models)
+        response = self.client.post("/score/train?wait=true")
+        assert response.status_code == 500
+        assert response.json()["detail"] == "Training failed: no data"
+    
+    def test_unknown_job(self):
+        assert self.client.get("/score/train/nope").status_code == 404
+
+
 class TestScoringGrades:
     """Tests pour la logique de scoring"""
     
@@ -189,5 +458,181 @@ class TestScoringGrades:
         assert data["score_letter"] in expected_grades
 
 
+class TestRuleBasedBatch:
+    """Tests de la formule pondérée vectorisée (identique à rule_based_predict)"""
+    
+    def random_requests(self, n, seed):
+        from app.main import ScoreRequest
+        rng = np.random.default_rng(seed)
+        # Continuous values, plus values on the references and the grade boundaries
+        co2 = np.concatenate([rng.uniform(0, 15, n), [0.0, 4.0, 8.0, 10.0, 12.0]])
+        water = np.concatenate([rng.uniform(0, 700, n), [0.0, 200.0, 400.0, 500.0, 0.0]])
+        energy = np.concatenate([rng.uniform(0, 70, n), [0.0, 20.0, 40.0, 50.0, 0.0]])
+        labels = rng.integers(0, 2, (len(co2), 3))
+        refs = rng.choice([5.0, 10.0, 20.0], len(co2))
+        return [
+            ScoreRequest(product_name=f"P{i}", total_co2=co2[i], total_water=water[i], total_energy=energy[i],
+                         has_bio_label=labels[i, 0], has_recyclable=labels[i, 1], has_local_label=labels[i, 2],
+                         max_co2_ref=refs[i] if i % 3 == 0 else 10.0)
+            for i in range(len(co2))
+        ]
+    
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_matches_scalar_version(self, seed):
+        from app.main import rule_based_predict, rule_based_predict_batch
+        requests = self.random_requests(2000, seed)
+        
+        assert rule_based_predict_batch(requests) == [rule_based_predict(r) for r in requests]
+    
+    def test_empty_batch(self):
+        from app.main import rule_based_predict_batch
+        assert rule_based_predict_batch([]) == []
+    
+    def test_batch_endpoint_without_model(self, sqlite_db, monkeypatch):
+        """Test de /score/compute/batch en mode règles (modèle non chargé)"""
+        from app import main
+        from app.models import ProductScore
+        
+        Session = sqlite_db
+        monkeypatch.setattr(main, "ml_model_bundle", None)
+        requests = self.random_requests(20, 3)
+        
+        response = TestClient(main.app).post(
+            "/score/compute/batch", json={"items": [r.model_dump() for r in requests]})
+        
+        assert response.status_code == 200
+        data = response.json()
+        expected = [main.rule_based_predict(r) for r in requests]
+        assert [d["score_letter"] for d in data] == [e["letter"] for e in expected]
+        assert [d["score_numerical"] for d in data] == [e["score"] for e in expected]
+        with Session() as db:
+            assert db.get(ProductScore, data[-1]["score_id"]).product_name == requests[-1].product_name
+    
+    def test_batch_size_is_bounded(self):
+        from app.main import app
+        response = TestClient(app).post("/score/compute/batch", json={"items": []})
+        assert response.status_code == 422
+
+
+class TestLcaLink:
+    """Tests du lien score -> résultat ACV (lca_result_id)"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, sqlite_db):
+        from app.main import app
+        self.Session = sqlite_db
+        self.client = TestClient(app)
+
+    def test_score_stores_lca_result_id(self):
+        from app.models import ProductScore
+        payload = {"product_name": "Sauce Tomate Bio", "total_co2": 0.5,
+                   "total_water": 20.0, "total_energy": 1.5, "lca_result_id": 42}
+        response = self.client.post("/score/compute", json=payload)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["lca_result_id"] == 42
+
+        with self.Session() as db:
+            stored = db.get(ProductScore, data["score_id"])
+            assert stored.lca_result_id == 42
+
+    def test_lca_result_id_is_optional(self):
+        payload = {"product_name": "Chips", "total_co2": 3.0, "total_water": 50.0, "total_energy": 5.0}
+        data = self.client.post("/score/compute", json=payload).json()
+        assert data["lca_result_id"] is None
+        assert data["score_id"] is not None
+
+    def commit_fails(self, monkeypatch, message, constraint=None):
+        """Fait échouer le commit avec une IntegrityError du pilote (diag psycopg2 si constraint)"""
+        from types import SimpleNamespace
+        from sqlalchemy.exc import IntegrityError
+        from sqlalchemy.orm import Session
+
+        orig = Exception(message)
+        if constraint is not None:
+            orig.diag = SimpleNamespace(constraint_name=constraint)
+
+        def commit(session):
+            raise IntegrityError("INSERT INTO product_scores ...", {}, orig)
+
+        monkeypatch.setattr(Session, "commit", commit)
+
+    def test_unknown_lca_result_id(self, monkeypatch):
+        self.commit_fails(monkeypatch, "violates foreign key constraint",
+                          constraint="fk_product_scores_lca_result_id")
+        payload = {"product_name": "Chips", "total_co2": 3.0, "total_water": 50.0,
+                   "total_energy": 5.0, "lca_result_id": 999}
+        response = self.client.post("/score/compute", json=payload)
+        assert response.status_code == 422
+        assert response.json()["detail"] == "Unknown lca_result_id 999"
+
+        response = self.client.post("/score/compute/batch", json={"items": [payload]})
+        assert response.status_code == 422
+
+    def test_fk_violation_matched_by_message(self, monkeypatch):
+        self.commit_fails(monkeypatch, 'insert or update on table "product_scores" violates '
+                                       'foreign key constraint "fk_product_scores_lca_result_id"')
+        payload = {"product_name": "Chips", "total_co2": 3.0, "total_water": 50.0,
+                   "total_energy": 5.0, "lca_result_id": 999}
+        assert self.client.post("/score/compute", json=payload).status_code == 422
+
+    def test_other_integrity_errors_are_raised(self, monkeypatch):
+        from sqlalchemy.exc import IntegrityError
+        self.commit_fails(monkeypatch, "duplicate key value violates unique constraint",
+                          constraint="product_scores_pkey")
+        payload = {"product_name": "Chips", "total_co2": 3.0, "total_water": 50.0,
+                   "total_energy": 5.0, "lca_result_id": 42}
+        with pytest.raises(IntegrityError):
+            self.client.post("/score/compute", json=payload)
+        with pytest.raises(IntegrityError):
+            self.client.post("/score/compute/batch", json={"items": [payload]})
+
+        # Sans lca_result_id, même une violation de la clé étrangère n'est pas une 422
+        self.commit_fails(monkeypatch, "violates foreign key constraint",
+                          constraint="fk_product_scores_lca_result_id")
+        del payload["lca_result_id"]
+        with pytest.raises(IntegrityError):
+            self.client.post("/score/compute", json=payload)
+
+
+class TestEvents:
+    """Tests du mode événementiel : lca.computed -> product.scored"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, sqlite_sessions):
+        self.Session = sqlite_sessions
+
+    EVENT = {
+        "correlation_id": "evt-1", "product_id": 3, "gtin": None, "lca_result_id": None,
+        "product_name": "Sauce Tomate Bio", "total_co2_kg": 0.5, "total_water_l": 20.0,
+        "total_energy_mj": 1.5, "packaging": {"material": "glass", "weight_kg": 0.7},
+        "transport": {"distance_km": 800, "mode": "truck"}, "has_bio_label": 1, "has_recyclable": 1
+    }
+
+    def test_score_event(self):
+        from app.main import score_event
+        from app.models import ProductScore
+        with self.Session() as db:
+            scored = score_event(self.EVENT, db)
+            assert db.get(ProductScore, scored["score_id"]).product_name == "Sauce Tomate Bio"
+        assert scored["correlation_id"] == "evt-1"
+        assert scored["product_id"] == 3
+        assert scored["score_letter"] in ["A", "B", "C", "D", "E"]
+
+    def test_redelivered_event_scored_once(self):
+        """Test qu'un lca.computed livré deux fois ne crée qu'un score et republie le même"""
+        from ecolabel_common.events import run_once, setup_processed_events
+        from app.main import on_lca_computed
+        from app.models import ProductScore
+        setup_processed_events(self.Session.kw["bind"])
+        event = {**self.EVENT, "event_id": "product.parsed/1-0"}
+
+        first = run_once(self.Session, "scoring", on_lca_computed, dict(event))
+        second = run_once(self.Session, "scoring", on_lca_computed, dict(event))
+        assert first == second
+        with self.Session() as db:
+            assert db.query(ProductScore).count() == 1
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
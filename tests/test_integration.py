@@ -9,6 +9,9 @@ Parser → NLP → LCA → Scoring → Provenance
 import pytest
 import requests
 import time
+import os
+import json
+import uuid
 
 # Configuration des URLs des microservices
 SERVICES = {
@@ -17,7 +20,8 @@ SERVICES = {
     "lca": "http://localhost:8003",
     "scoring": "http://localhost:8004",
     "widget": "http://localhost:8005",
-    "provenance": "http://localhost:8007"
+    "provenance": "http://localhost:8007",
+    "orchestrator": "http://localhost:8008"
 }
 
 
@@ -99,7 +103,8 @@ class TestFullPipeline:
                 "packaging_type": "glass",
                 "transport_km": 150,
                 "has_bio_label": 1,
-                "category": "sauce"
+                "category": "sauce",
+                "lca_result_id": lca_data.get("lca_result_id")
             }
             scoring_response = requests.post(
                 f"{SERVICES['scoring']}/score/compute",
@@ -114,6 +119,78 @@ class TestFullPipeline:
             pytest.skip("Scoring service not available")
 
 
+class TestOrchestratedPipeline:
+    """Tests du pipeline exécuté côté serveur par l'orchestrator"""
+    
+    def test_pipeline_run(self):
+        """Test du pipeline complet en un seul appel"""
+        sheet = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_produit.txt")
+        with open(sheet, encoding="utf-8") as f:
+            product_text = f.read()
+        try:
+            response = requests.post(
+                f"{SERVICES['orchestrator']}/pipeline/run",
+                json={"text": product_text},
+                headers={"X-Correlation-ID": "integration-test"},
+                timeout=60
+            )
+        except requests.exceptions.ConnectionError:
+            pytest.skip("Orchestrator service not available")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["correlation_id"] == "integration-test"
+        assert data["score"]["score_letter"] in ["A", "B", "C", "D", "E"]
+        assert data["score"]["lca_result_id"] == data["lca"]["lca_result_id"]
+        assert "total_ms" in data["timings"]
+
+
+class TestEventPipeline:
+    """Tests du pipeline événementiel (EVENTS_ENABLED=true, broker Redis du docker-compose)"""
+
+    @staticmethod
+    def find_event(client, stream, correlation_id, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            for _, fields in client.xrevrange(stream, count=100):
+                event = json.loads(fields["data"])
+                if event.get("correlation_id") == correlation_id:
+                    return event
+            time.sleep(0.5)
+        return None
+
+    def test_parsed_product_is_scored(self):
+        """Test: parsing seul -> événements NLP, ACV puis scoring"""
+        redis = pytest.importorskip("redis")
+        client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        try:
+            client.ping()
+        except redis.exceptions.ConnectionError:
+            pytest.skip("Redis broker not available")
+
+        sheet = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_produit.txt")
+        correlation_id = f"events-{uuid.uuid4()}"
+        try:
+            with open(sheet, "rb") as f:
+                response = requests.post(
+                    f"{SERVICES['parser']}/product/parse",
+                    files={"files": ("test_produit.txt", f, "text/plain")},
+                    headers={"X-Correlation-ID": correlation_id},
+                    timeout=10
+                )
+        except requests.exceptions.ConnectionError:
+            pytest.skip("Parser service not available")
+        assert response.status_code == 200
+        product_id = response.json()[0]["id"]
+
+        if self.find_event(client, "product.parsed", correlation_id, timeout=2) is None:
+            pytest.skip("Event mode disabled (EVENTS_ENABLED=false)")
+        scored = self.find_event(client, "product.scored", correlation_id, timeout=90)
+        assert scored is not None
+        assert scored["product_id"] == product_id
+        assert scored["score_letter"] in ["A", "B", "C", "D", "E"]
+        assert scored["lca_result_id"] is not None
+
+
 class TestScenarios:
     """Tests de scénarios métier"""
     
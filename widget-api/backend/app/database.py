@@ -1,14 +1,22 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from ecolabel_common import build_async_engine, database_url
+from ecolabel_common.replica import AsyncReplicaRouter, replica_url
 
-DB_USER = os.getenv("DB_USER", "eco")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "eco_pass")
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "eco_db")
+# Optional read replica (DB_READ_HOST, DB_MAX_REPLICA_LAG, ...): see ecolabel_common.replica
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Pool tuning: widget-api is read-only and latency bound, so keep a warm pool
+# large enough for the expected concurrency and let bursts overflow briefly
+# (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_COMMAND_TIMEOUT, ... override these, see ecolabel_common)
+POOL_DEFAULTS = {"pool_size": 20, "max_overflow": 30}
+COMMAND_TIMEOUT = 5.0
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def build_engine(url, application_name):
+    return build_async_engine(application_name, url, command_timeout=COMMAND_TIMEOUT, **POOL_DEFAULTS)
+
+
+READ_DATABASE_URL = replica_url("postgresql+asyncpg")
+engine = build_engine(database_url("postgresql+asyncpg"), "widget-api")
+read_engine = build_engine(READ_DATABASE_URL, "widget-api-read") if READ_DATABASE_URL else None
+router = AsyncReplicaRouter(engine, read_engine)
+SessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
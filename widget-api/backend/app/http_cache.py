@@ -0,0 +1,91 @@
+"""
+HTTP caching helpers for the public widget endpoints
+Strong ETags derived from score ids, Last-Modified and Cache-Control headers
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+# ============ CONFIGURATION ============
+CACHE_MAX_AGE = int(os.getenv("WIDGET_CACHE_MAX_AGE", "60"))
+CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("WIDGET_CACHE_SWR", "300"))
+CACHE_PUBLIC = os.getenv("WIDGET_CACHE_PUBLIC", "true").lower() == "true"
+
+
+def cache_control() -> str:
+    """Build the Cache-Control header value from the configuration"""
+    directives = ["public" if CACHE_PUBLIC else "private", f"max-age={CACHE_MAX_AGE}"]
+    if CACHE_STALE_WHILE_REVALIDATE > 0:
+        directives.append(f"stale-while-revalidate={CACHE_STALE_WHILE_REVALIDATE}")
+    return ", ".join(directives)
+
+
+def score_etag(score_id: int) -> str:
+    """Strong ETag for a single score row (scores are immutable once written)"""
+    return f'"score-{score_id}"'
+
+
+def collection_etag(score_ids: Iterable[int]) -> str:
+    """Strong ETag for a list of scores, derived from their ids in order"""
+    digest = hashlib.sha1(",".join(str(i) for i in score_ids).encode("ascii")).hexdigest()
+    return f'"scores-{digest[:20]}"'
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    """Format a naive UTC (or aware) datetime as an HTTP-date"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Check an If-Modified-Since header against the resource timestamp"""
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # A "-0000" zone (RFC 5322: UTC, source zone unknown) parses as naive
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have a one second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    """Validator and freshness headers shared by 200 and 304 responses"""
+    headers = {"ETag": etag, "Cache-Control": cache_control()}
+    formatted = http_date(last_modified)
+    if formatted:
+        headers["Last-Modified"] = formatted
+    return headers
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                    etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluate conditional request headers.
+
+    If-None-Match takes precedence over If-Modified-Since when both are present.
+    """
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    return not_modified_since(if_modified_since, last_modified)
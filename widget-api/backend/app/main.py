@@ -1,12 +1,21 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.database import SessionLocal
-from app.models import ProductScore
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+import os
+from app.database import SessionLocal, engine, router
+from ecolabel_common import instrument
+from ecolabel_common.metrics import record_cache
+from app.queries import latest_score, latest_scores, latest_scores_page, score_payload
+from app.http_cache import cache_headers, collection_etag, is_not_modified, score_etag
 
 app = FastAPI(title="WidgetAPI")
 
+# Upper bound on names per bulk lookup (category pages show 50-100 products)
+LOOKUP_MAX_NAMES = int(os.getenv("WIDGET_LOOKUP_MAX_NAMES", "200"))
+
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -14,37 +23,92 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "Cache-Control"],
 )
 
+instrument(app, "widget-api", {"primary": engine, "replica": router.replica})
+
+@app.on_event("shutdown")
+async def shutdown():
+    await router.dispose()
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "widget-api"}
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_db():
+    # All widget endpoints are read-only: route them to the replica when configured
+    async with router.read_connection() as conn:
+        async with SessionLocal(bind=conn) as db:
+            yield db
+
+class ProductLookupRequest(BaseModel):
+    names: List[str] = Field(..., min_length=1, max_length=LOOKUP_MAX_NAMES)
 
 @app.get("/public/product/{name}")
-def get_product_score(name: str, db: Session = Depends(get_db)):
+async def get_product_score(
+    name: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
     # Get latest score for product
-    score = db.query(ProductScore).filter(ProductScore.product_name == name).order_by(desc(ProductScore.id)).first()
+    score = await latest_score(db, name)
     if not score:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    # Scores are append-only: the latest id fully identifies the representation
+    headers = cache_headers(score_etag(score.id), score.created_at)
+    not_modified = is_not_modified(if_none_match, if_modified_since, headers["ETag"], score.created_at)
+    if if_none_match or if_modified_since:
+        # Client-side cache revalidations: hit = 304
+        record_cache("widget_http", hit=not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
+    return score_payload(score)
+
+@app.post("/public/products/lookup")
+async def lookup_products(request: ProductLookupRequest, db: AsyncSession = Depends(get_db)):
+    """Latest score for many products in one round trip; unknown names are listed apart"""
+    # Preserve request order while dropping duplicates
+    names = list(dict.fromkeys(request.names))
+    found = await latest_scores(db, names)
+    
     return {
-        "product_name": score.product_name,
-        "score_letter": score.score_letter,
-        "score_numerical": score.score_numerical,
-        "confidence": score.confidence_level,
-        "created_at": score.created_at
+        "count": len(found),
+        "products": [score_payload(found[name]) for name in names if name in found],
+        "not_found": [name for name in names if name not in found]
     }
 
 @app.get("/public/products")
-def list_products(db: Session = Depends(get_db)):
-    # List unique products with latest score
-    # Simplified: just return all scores
-    scores = db.query(ProductScore).order_by(desc(ProductScore.id)).limit(10).all()
-    return scores
+async def list_products(
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[int] = Query(default=None, description="next_cursor from the previous page"),
+    grade: Optional[str] = Query(default=None, pattern="^[A-E]$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    # List unique products with their latest score, newest first (keyset pagination)
+    rows = await latest_scores_page(db, limit, cursor=cursor, grade=grade, since=since, until=until)
+    scores = rows[:limit]
+    next_cursor = scores[-1].id if len(rows) > limit else None
+    
+    last_modified = max((s.created_at for s in scores if s.created_at), default=None)
+    headers = cache_headers(collection_etag(s.id for s in scores), last_modified)
+    not_modified = is_not_modified(if_none_match, None, headers["ETag"])
+    if if_none_match:
+        record_cache("widget_http", hit=not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {
+        "count": len(scores),
+        "items": [score_payload(s, include_id=True) for s in scores],
+        "next_cursor": next_cursor
+    }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -13,3 +13,11 @@ class ProductScore(Base):
     score_letter = Column(String(1)) # A, B, C, D, E
     confidence_level = Column(Float)
     created_at = Column(DateTime)
+
+    __table_args__ = (
+        # Keyset pagination over "latest score per product": the anti-join probes
+        # (product_name, id) and grade filters walk (score_letter, id).
+        # Built on PostgreSQL by the scoring migrations, which own product_scores
+        Index("ix_product_scores_name_id", "product_name", "id"),
+        Index("ix_product_scores_letter_id", "score_letter", "id"),
+    )
@@ -0,0 +1,100 @@
+"""
+Read queries for the public widget endpoints
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models import ProductScore
+
+
+def score_payload(score: ProductScore, include_id: bool = False) -> dict:
+    """Public representation of a product score"""
+    payload = {"id": score.id} if include_id else {}
+    payload.update({
+        "product_name": score.product_name,
+        "score_letter": score.score_letter,
+        "score_numerical": score.score_numerical,
+        "confidence": score.confidence_level,
+        "created_at": score.created_at
+    })
+    return payload
+
+
+async def latest_score(db: AsyncSession, name: str) -> Optional[ProductScore]:
+    """Latest score of a single product"""
+    result = await db.execute(
+        select(ProductScore)
+        .where(ProductScore.product_name == name)
+        .order_by(ProductScore.id.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def latest_scores(db: AsyncSession, names: List[str]) -> Dict[str, ProductScore]:
+    """
+    Fetch the latest score of each requested product in a single query.
+
+    Uses ROW_NUMBER() partitioned by product name (equivalent to Postgres
+    DISTINCT ON, but portable) so the index on product_name serves the IN filter.
+    """
+    if not names:
+        return {}
+
+    ranked = (
+        select(
+            ProductScore,
+            func.row_number().over(
+                partition_by=ProductScore.product_name,
+                order_by=ProductScore.id.desc()
+            ).label("rn")
+        )
+        .where(ProductScore.product_name.in_(names))
+        .subquery()
+    )
+    latest = aliased(ProductScore, ranked)
+    result = await db.execute(select(latest).where(ranked.c.rn == 1))
+    return {row.product_name: row for row in result.scalars().all()}
+
+
+def naive_utc(value: datetime) -> datetime:
+    """``value`` as naive UTC, the convention of the created_at columns"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def latest_scores_page(db: AsyncSession, limit: int, cursor: Optional[int] = None,
+                             grade: Optional[str] = None, since: Optional[datetime] = None,
+                             until: Optional[datetime] = None) -> List[ProductScore]:
+    """
+    One keyset page of products with their latest score, newest first.
+
+    A row is the latest of its product when no newer row shares its name
+    (NOT EXISTS probes the (product_name, id) index). Pages are ordered by id,
+    which is unique and stable, and continue strictly below ``cursor`` so no
+    OFFSET scan is needed. Fetches ``limit + 1`` rows to detect a next page.
+    """
+    newer = aliased(ProductScore)
+    stmt = select(ProductScore).where(
+        ~exists().where(and_(
+            newer.product_name == ProductScore.product_name,
+            newer.id > ProductScore.id
+        ))
+    )
+    if cursor is not None:
+        stmt = stmt.where(ProductScore.id < cursor)
+    if grade:
+        stmt = stmt.where(ProductScore.score_letter == grade)
+    if since:
+        stmt = stmt.where(ProductScore.created_at >= naive_utc(since))
+    if until:
+        stmt = stmt.where(ProductScore.created_at < naive_utc(until))
+
+    result = await db.execute(stmt.order_by(ProductScore.id.desc()).limit(limit + 1))
+    return list(result.scalars().all())
@@ -18,7 +18,10 @@ class TestWidgetAPI:
     @pytest.fixture(autouse=True)
     def setup(self):
         from app.main import app
-        self.client = TestClient(app)
+        # Le contexte garde une seule boucle asyncio (pool asyncpg) pendant le test
+        with TestClient(app) as client:
+            self.client = client
+            yield
     
     def test_health_endpoint(self):
         """Test du endpoint /health"""
@@ -50,7 +53,10 @@ class TestWidgetIntegration:
     @pytest.fixture(autouse=True)
     def setup(self):
         from app.main import app
-        self.client = TestClient(app)
+        # Le contexte garde une seule boucle asyncio (pool asyncpg) pendant le test
+        with TestClient(app) as client:
+            self.client = client
+            yield
     
     def test_full_pipeline(self):
         """Test du pipeline complet (si les autres services sont disponibles)"""
@@ -75,7 +81,10 @@ class TestPublicEndpoints:
     @pytest.fixture(autouse=True)
     def setup(self):
         from app.main import app
-        self.client = TestClient(app)
+        # Le contexte garde une seule boucle asyncio (pool asyncpg) pendant le test
+        with TestClient(app) as client:
+            self.client = client
+            yield
     
     def test_public_product_structure(self):
         """Test de la structure d'un produit public"""
@@ -92,5 +101,284 @@ class TestPublicEndpoints:
         assert response.status_code in [404, 200]
 
 
+@pytest.fixture
+def sqlite_client(tmp_path):
+    """Client branché sur une base SQLite temporaire (sans PostgreSQL)"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.main import app, get_db
+    from app.models import Base
+
+    db_path = tmp_path / "widget.db"
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=sync_engine)
+    # Session synchrone pour insérer les données de test
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    AsyncTestingSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with AsyncTestingSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            yield client, TestingSession
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        sync_engine.dispose()
+
+
+def add_score(session_factory, name, letter="B", score=72.5, created_at=None):
+    """Insère un score de test et retourne son id"""
+    from datetime import datetime
+    from app.models import ProductScore
+
+    db = session_factory()
+    row = ProductScore(
+        product_name=name,
+        score_numerical=score,
+        score_letter=letter,
+        confidence_level=0.9,
+        created_at=created_at or datetime(2025, 12, 1, 10, 30, 0),
+    )
+    db.add(row)
+    db.commit()
+    score_id = row.id
+    db.close()
+    return score_id
+
+
+class TestHttpCaching:
+    """Tests des en-têtes de cache HTTP (ETag / Last-Modified / Cache-Control)"""
+
+    def test_product_has_validators(self, sqlite_client):
+        """Test que la réponse porte un ETag fort et un Cache-Control"""
+        client, session_factory = sqlite_client
+        score_id = add_score(session_factory, "Sauce Tomate Bio")
+
+        response = client.get("/public/product/Sauce Tomate Bio")
+        assert response.status_code == 200
+        assert response.headers["etag"] == f'"score-{score_id}"'
+        assert "max-age=" in response.headers["cache-control"]
+        assert response.headers["last-modified"] == "Mon, 01 Dec 2025 10:30:00 GMT"
+
+    def test_if_none_match_returns_304(self, sqlite_client):
+        """Test qu'un ETag correspondant renvoie 304 sans corps"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Pizza Margherita")
+
+        etag = client.get("/public/product/Pizza Margherita").headers["etag"]
+        response = client.get("/public/product/Pizza Margherita", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    def test_new_score_invalidates_etag(self, sqlite_client):
+        """Test qu'un nouveau score change l'ETag"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Yaourt Nature")
+        etag = client.get("/public/product/Yaourt Nature").headers["etag"]
+
+        add_score(session_factory, "Yaourt Nature", letter="A", score=88.0)
+        response = client.get("/public/product/Yaourt Nature", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["score_letter"] == "A"
+
+    def test_if_modified_since(self, sqlite_client):
+        """Test de la validation par date"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Lait Demi-Ecreme")
+
+        response = client.get(
+            "/public/product/Lait Demi-Ecreme",
+            headers={"If-Modified-Since": "Mon, 01 Dec 2025 10:30:00 GMT"},
+        )
+        assert response.status_code == 304
+
+    def test_if_modified_since_without_zone(self, sqlite_client):
+        """Test d'une date If-Modified-Since en "-0000" (UTC sans fuseau d'origine)"""
+        from datetime import datetime
+        from app.http_cache import not_modified_since
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Beurre Doux")
+
+        response = client.get(
+            "/public/product/Beurre Doux",
+            headers={"If-Modified-Since": "Mon, 01 Dec 2025 10:30:00 -0000"},
+        )
+        assert response.status_code == 304
+        assert not not_modified_since("Mon, 01 Dec 2025 10:29:59 -0000", datetime(2025, 12, 1, 10, 30))
+
+    def test_products_list_etag(self, sqlite_client):
+        """Test de l'ETag sur la liste des produits"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Produit A")
+
+        etag = client.get("/public/products").headers["etag"]
+        response = client.get("/public/products", headers={"If-None-Match": f'W/{etag}'})
+        assert response.status_code == 304
+
+
+class TestBulkLookup:
+    """Tests du endpoint POST /public/products/lookup"""
+
+    def test_lookup_returns_latest_scores(self, sqlite_client):
+        """Test que seul le dernier score de chaque produit est retourné"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Sauce Tomate", letter="C", score=50.0)
+        add_score(session_factory, "Sauce Tomate", letter="B", score=70.0)
+        add_score(session_factory, "Pesto", letter="D", score=30.0)
+
+        response = client.post("/public/products/lookup", json={"names": ["Pesto", "Sauce Tomate"]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 2
+        assert [p["product_name"] for p in data["products"]] == ["Pesto", "Sauce Tomate"]
+        assert data["products"][1]["score_letter"] == "B"
+        assert data["not_found"] == []
+
+    def test_lookup_partial_results(self, sqlite_client):
+        """Test des résultats partiels pour les noms inconnus"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Riz Complet", letter="A", score=90.0)
+
+        response = client.post(
+            "/public/products/lookup",
+            json={"names": ["Inconnu", "Riz Complet", "Inconnu"]},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 1
+        assert data["not_found"] == ["Inconnu"]
+
+    def test_lookup_rejects_empty_list(self, sqlite_client):
+        """Test qu'une liste vide est refusée"""
+        client, _ = sqlite_client
+        response = client.post("/public/products/lookup", json={"names": []})
+        assert response.status_code == 422
+
+
+class TestProductsPagination:
+    """Tests de la pagination par curseur de /public/products"""
+
+    def test_one_entry_per_product(self, sqlite_client):
+        """Test que chaque produit n'apparaît qu'une fois avec son dernier score"""
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Chips", letter="D", score=30.0)
+        add_score(session_factory, "Compote", letter="A", score=85.0)
+        add_score(session_factory, "Chips", letter="C", score=45.0)
+
+        data = client.get("/public/products").json()
+        assert data["count"] == 2
+        assert [p["product_name"] for p in data["items"]] == ["Chips", "Compote"]
+        assert data["items"][0]["score_letter"] == "C"
+        assert data["next_cursor"] is None
+
+    def test_cursor_walks_all_pages(self, sqlite_client):
+        """Test que le curseur parcourt tous les produits sans doublon"""
+        client, session_factory = sqlite_client
+        for i in range(7):
+            add_score(session_factory, f"Produit {i}")
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3}
+            if cursor is not None:
+                params["cursor"] = cursor
+            data = client.get("/public/products", params=params).json()
+            seen.extend(p["product_name"] for p in data["items"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == [f"Produit {i}" for i in reversed(range(7))]
+
+    def test_grade_and_date_filters(self, sqlite_client):
+        """Test des filtres par grade et par date"""
+        from datetime import datetime
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Ancien", letter="A", created_at=datetime(2024, 1, 1))
+        add_score(session_factory, "Recent A", letter="A", created_at=datetime(2025, 6, 1))
+        add_score(session_factory, "Recent E", letter="E", created_at=datetime(2025, 6, 2))
+
+        data = client.get("/public/products", params={"grade": "A", "since": "2025-01-01T00:00:00"}).json()
+        assert [p["product_name"] for p in data["items"]] == ["Recent A"]
+
+    def test_date_filters_with_time_zone(self, sqlite_client):
+        """Test que since/until avec fuseau (Z, +02:00) sont comparés en UTC"""
+        from datetime import datetime
+        client, session_factory = sqlite_client
+        add_score(session_factory, "Minuit", created_at=datetime(2026, 1, 1, 0, 30))
+        add_score(session_factory, "Veille", created_at=datetime(2025, 12, 31, 23, 30))
+
+        response = client.get("/public/products", params={"since": "2026-01-01T00:00:00Z"})
+        assert response.status_code == 200
+        assert [p["product_name"] for p in response.json()["items"]] == ["Minuit"]
+
+        data = client.get("/public/products", params={"until": "2026-01-01T02:00:00+02:00"}).json()
+        assert [p["product_name"] for p in data["items"]] == ["Veille"]
+
+    def test_invalid_grade_rejected(self, sqlite_client):
+        """Test qu'un grade invalide est refusé"""
+        client, _ = sqlite_client
+        assert client.get("/public/products", params={"grade": "Z"}).status_code == 422
+
+
+class TestReplicaRouting:
+    """Tests du routage des lectures vers le réplica"""
+
+    @staticmethod
+    def make_router(tmp_path, lag=0.0, **kwargs):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from ecolabel_common.replica import AsyncReplicaRouter
+
+        class FixedLagRouter(AsyncReplicaRouter):
+            async def measure_lag(self, conn):
+                return lag
+
+        primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+        replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+        return FixedLagRouter(primary, replica, **kwargs)
+
+    @staticmethod
+    def read_target(router):
+        """Retourne 'primary' ou 'replica' selon la connexion choisie"""
+        import asyncio
+
+        async def run():
+            async with router.read_connection() as conn:
+                target = "replica" if conn.engine is router.replica else "primary"
+            await router.dispose()
+            return target
+
+        return asyncio.run(run())
+
+    def test_reads_use_replica(self, tmp_path):
+        router = self.make_router(tmp_path)
+        assert self.read_target(router) == "replica"
+
+    def test_no_replica_uses_primary(self, tmp_path):
+        router = self.make_router(tmp_path)
+        router.replica = None
+        assert self.read_target(router) == "primary"
+
+    def test_replica_marked_down_falls_back(self, tmp_path):
+        router = self.make_router(tmp_path, retry_after=60)
+        router.mark_down()
+        assert self.read_target(router) == "primary"
+
+    def test_stale_replica_falls_back(self, tmp_path):
+        """Test de la borne de fraîcheur (lag > max_lag)"""
+        router = self.make_router(tmp_path, lag=12.0, max_lag=5.0)
+        assert self.read_target(router) == "primary"
+
+    def test_fresh_replica_within_bound(self, tmp_path):
+        router = self.make_router(tmp_path, lag=1.0, max_lag=5.0)
+        assert self.read_target(router) == "replica"
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -15,7 +15,7 @@ function App() {
   const fetchHistory = () => {
     fetch('http://localhost:8005/public/products')
       .then(res => res.json())
-      .then(data => setProducts(data))
+      .then(data => setProducts(data.items))
       .catch(err => console.error(err))
   }
 